@@ -0,0 +1,241 @@
+"""Stand-ins for Discord used by the offline benchmarks (storage uses src.backends.memory).
+
+The fakes implement only what the bot's handlers touch. Anything that would be a Discord
+REST call goes through FakeRest, which applies per-route rate limits and a fixed latency.
+Bucket sizes are configurable and approximate; they are not Discord's published limits.
+Timings use a ReplayClock, so a burst can be replayed faster than real time.
+"""
+import asyncio
+import time
+from collections import Counter
+from datetime import timedelta
+from types import SimpleNamespace
+
+class ReplayClock:
+    """Virtual wall clock starting at `base` and running `speed` times faster than real time"""
+
+    def __init__(self, base, speed=1.0):
+        self.base = base
+        self.speed = speed
+        self._started = None
+
+    def start(self):
+        self._started = time.perf_counter()
+
+    def elapsed(self):
+        """Virtual seconds since start()"""
+        return (time.perf_counter() - self._started) * self.speed if self._started is not None else 0.0
+
+    def now(self):
+        return self.base + timedelta(seconds=self.elapsed())
+
+    async def sleep(self, seconds):
+        """Sleep for `seconds` of virtual time"""
+        if seconds > 0:
+            await asyncio.sleep(seconds / self.speed)
+
+    async def sleep_until(self, offset):
+        """Sleep until `offset` virtual seconds after start()"""
+        await self.sleep(offset - self.elapsed())
+
+    def timestamp(self):
+        """Epoch seconds of now(), to swap in for src.wish_clock.wall_time"""
+        return self.now().timestamp()
+
+class RateLimitBucket:
+    """`limit` requests per `per` seconds; callers wait for the window to reset, as discord.py does"""
+
+    def __init__(self, limit, per):
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset_at = None
+        self.lock = asyncio.Lock()
+
+class FakeRest:
+    """Counts Discord REST calls by route and makes them wait on rate-limit buckets and latency"""
+
+    def __init__(self, clock, latency=0.08, role_limit=(10, 10.0), message_limit=(5, 5.0), global_limit=(50, 1.0)):
+        self.clock = clock
+        self.latency = latency
+        self.limits = {"roles": role_limit, "messages": message_limit}
+        self.global_bucket = RateLimitBucket(*global_limit)
+        self.buckets = {}
+        self.calls = Counter()
+        self.rate_limited = 0
+        self.rate_limit_wait = 0.0
+
+    async def _acquire(self, bucket):
+        async with bucket.lock:
+            now = self.clock.elapsed()
+            if bucket.reset_at is None or now >= bucket.reset_at:
+                bucket.remaining = bucket.limit
+                bucket.reset_at = now + bucket.per
+            if bucket.remaining == 0:
+                wait = bucket.reset_at - now
+                self.rate_limited += 1
+                self.rate_limit_wait += wait
+                await self.clock.sleep(wait)
+                bucket.remaining = bucket.limit
+                bucket.reset_at = self.clock.elapsed() + bucket.per
+            bucket.remaining -= 1
+
+    async def request(self, route, kind, major_id):
+        """One REST call on `route`, sharing the rate-limit bucket of (kind, major_id)"""
+        self.calls[route] += 1
+        key = (kind, major_id)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = RateLimitBucket(*self.limits[kind])
+        await self._acquire(self.global_bucket)
+        await self._acquire(bucket)
+        await self.clock.sleep(self.latency)
+
+class FakeRole:
+    def __init__(self, guild, role_id, name, position):
+        self.guild = guild
+        self.id = role_id
+        self.name = name
+        self.position = position
+        self.permissions = SimpleNamespace()
+        self.colour = 0
+        self.hoist = False
+        self.mentionable = False
+
+    @property
+    def members(self):
+        return [member for member in self.guild.members.values() if self in member.roles]
+
+    async def edit(self, position=None, reason=None):
+        await self.guild.rest.request("PATCH /guilds/{guild_id}/roles", "roles", self.guild.id)
+        if position is not None:
+            self.position = position
+
+    async def delete(self, reason=None):
+        await self.guild.rest.request("DELETE /guilds/{guild_id}/roles/{role_id}", "roles", self.guild.id)
+        self.guild.roles.pop(self.id, None)
+        for member in self.guild.members.values():
+            if self in member.roles:
+                member.roles.remove(self)
+
+class FakeMember:
+    def __init__(self, guild, user_id, name, bot=False):
+        self.guild = guild
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.bot = bot
+        self.roles = []
+        self.mention = f"<@{user_id}>"
+        self.guild_permissions = SimpleNamespace(manage_roles=True)
+
+    @property
+    def top_role(self):
+        return max(self.roles, key=lambda role: role.position)
+
+    async def add_roles(self, role, reason=None):
+        await self.guild.rest.request("PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}", "roles", self.guild.id)
+        if role not in self.roles:
+            self.roles.append(role)
+
+    async def remove_roles(self, role, reason=None):
+        await self.guild.rest.request("DELETE /guilds/{guild_id}/members/{user_id}/roles/{role_id}", "roles", self.guild.id)
+        if role in self.roles:
+            self.roles.remove(role)
+
+class FakeChannel:
+    def __init__(self, guild, channel_id, name):
+        self.guild = guild
+        self.id = channel_id
+        self.name = name
+        self.sent = []
+        self.history = {}  # message ID -> FakeMessage, for fetch_message
+
+    async def send(self, content=None, embed=None):
+        await self.guild.rest.request("POST /channels/{channel_id}/messages", "messages", self.id)
+        self.sent.append(content if content is not None else embed.description)
+
+    async def fetch_message(self, message_id):
+        await self.guild.rest.request("GET /channels/{channel_id}/messages/{message_id}", "messages", self.id)
+        return self.history[message_id]
+
+class FakeGuild:
+    def __init__(self, guild_id, name, rest):
+        self.id = guild_id
+        self.name = name
+        self.rest = rest
+        self.roles = {}
+        self.members = {}
+        self.channels = {}
+        self._next_id = guild_id * 1000
+
+    def next_id(self):
+        self._next_id += 1
+        return self._next_id
+
+    def get_role(self, role_id):
+        return self.roles.get(role_id)
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    def get_channel_or_thread(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    @property
+    def text_channels(self):
+        return list(self.channels.values())
+
+    def add_role(self, name, position):
+        role = FakeRole(self, self.next_id(), name, position)
+        self.roles[role.id] = role
+        return role
+
+    def add_member(self, user_id, name, bot=False):
+        member = self.members[user_id] = FakeMember(self, user_id, name, bot)
+        return member
+
+    def add_channel(self, name):
+        channel = FakeChannel(self, self.next_id(), name)
+        self.channels[channel.id] = channel
+        return channel
+
+    async def create_role(self, name, permissions=None, colour=None, hoist=False, mentionable=False, reason=None):
+        await self.rest.request("POST /guilds/{guild_id}/roles", "roles", self.id)
+        # New roles are created just above @everyone
+        return self.add_role(name, 1)
+
+class FakeMessage:
+    def __init__(self, message_id, guild, channel, author, content, created_at, mentions=()):
+        self.id = message_id
+        self.guild = guild
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.created_at = created_at
+        self.mentions = list(mentions)
+        self.reference = None
+        channel.history[message_id] = self
+
+class FakeRawReaction:
+    """The payload of on_raw_reaction_add for a guild message"""
+    def __init__(self, emoji, message, member):
+        self.emoji = emoji
+        self.message_id = message.id
+        self.channel_id = message.channel.id
+        self.guild_id = message.guild.id
+        self.user_id = member.id
+        self.member = member
+
+class FakeBotUser:
+    def __init__(self, user_id, name="Dr. Shamer"):
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.bot = True
+
+    def mentioned_in(self, message):
+        return any(user.id == self.id for user in message.mentions)
@@ -0,0 +1,75 @@
+"""Measure event-loop stall while a burst of record_user calls is in flight.
+
+Simulates the 11:11 burst: 500 record_user calls fired as background tasks,
+where every storage write is a round-trip to the in-memory backend that
+blocks its thread for --latency ms. A ticker task measures how late the loop wakes it up. Compares
+the write-behind executor path in src.firestore_db (including the final flush)
+with the old behaviour of writing each record inline.
+
+    python -m benchmarks.firestore_loop_stall [--calls 500] [--latency 20]
+"""
+import argparse
+import asyncio
+import time
+
+from src import firestore_db
+from src.backends.memory import MemoryBackend
+
+TICK_INTERVAL = 0.005
+
+async def measure_lag(stop, lags):
+    """Record how late each tick fires compared to when it was scheduled"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + TICK_INTERVAL
+        await asyncio.sleep(TICK_INTERVAL)
+        lags.append(max(0.0, loop.time() - expected))
+
+async def run_burst(record, calls, flush=None):
+    stop = asyncio.Event()
+    lags = []
+    ticker = asyncio.create_task(measure_lag(stop, lags))
+    await asyncio.sleep(TICK_INTERVAL * 2)
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(record(1234, user_id, on_time=True)) for user_id in range(calls)]
+    results = await asyncio.gather(*tasks)
+    if flush:
+        await flush()
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await ticker
+    return elapsed, sorted(lags), sum(1 for ok in results if ok)
+
+def inline_record_user(commit):
+    """The old data path: async signature, one blocking write per record on the event loop"""
+    async def record(guild_id, user_id, on_time=True):
+        field = "wished" if on_time else "shamed"
+        commit(guild_id, firestore_db.get_today_date(), {field: {str(user_id)}})
+        return True
+    return record
+
+def report(name, elapsed, lags, ok, calls, writes):
+    p99 = lags[int(len(lags) * 0.99) - 1] if lags else 0.0
+    worst = lags[-1] if lags else 0.0
+    print(f"{name:>9}: {ok}/{calls} recorded in {elapsed:.2f}s | loop lag p99 {p99 * 1000:.1f}ms, max {worst * 1000:.1f}ms over {len(lags)} ticks | {writes} writes")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=20, help="simulated Firestore latency in ms")
+    args = parser.parse_args()
+
+    # latency makes each call block its thread like a gRPC round-trip
+    inline_backend = MemoryBackend(latency=args.latency / 1000)
+    elapsed, lags, ok = await run_burst(inline_record_user(inline_backend.commit_records), args.calls)
+    report("inline", elapsed, lags, ok, args.calls, inline_backend.calls)
+
+    backend = MemoryBackend(latency=args.latency / 1000)
+    await firestore_db.init_firestore(backend)
+    elapsed, lags, ok = await run_burst(firestore_db.record_user, args.calls, flush=firestore_db.flush_pending_records)
+    report("executor", elapsed, lags, ok, args.calls, backend.calls)
+
+if __name__ == "__main__":
+    asyncio.run(main())
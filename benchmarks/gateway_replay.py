@@ -0,0 +1,277 @@
+"""Replay an 11:11 burst of gateway events through the real handlers, offline.
+
+Builds fake guilds (members, a shame role, some of it still held from yesterday), then feeds
+messages and 🌠 reactions to src.main.on_message / on_raw_reaction_add at their recorded offsets.
+Discord REST calls go through a rate-limited fake (benchmarks/fakes.py) and record flushes go
+to the in-memory storage backend, so the run needs no network. Reports handler latency percentiles,
+REST calls by route, rate-limit waits and storage writes.
+
+    python -m benchmarks.gateway_replay [--guilds 50] [--messages 2000] [--reactions 5000] [--duration 75]
+    python -m benchmarks.gateway_replay --speed 10                # compress the burst 10x
+    python -m benchmarks.gateway_replay --save burst.jsonl        # write the generated events
+    python -m benchmarks.gateway_replay --replay burst.jsonl      # replay a saved or recorded burst
+    python -m benchmarks.gateway_replay --max-p99-ms 500          # exit 1 if any handler's p99 is above
+
+Event files are JSON lines: a {"type": "scenario", ...} header with the guild setup, then
+{"t": seconds, "type": "message", "id", "guild", "author", "content"} and
+{"t": seconds, "type": "reaction", "message", "user", "emoji"} in time order.
+
+Latencies are real time. With --speed above 1 REST latency and rate-limit windows shrink by
+the same factor, so compare runs made at the same speed.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from src import main, firestore_db, wish_clock
+from src.config import config, LONDON_TZ, SHAME_ROLE_CONFIG, DEBUG_MODE_CONFIG, SHAME_ROLE_MODE_CONFIG
+from src.metrics import EVENTS_HANDLED, SINGLE_FLIGHT_CALLS
+from src.role_queue import role_queues
+from src.backends.memory import MemoryBackend
+from src.startup import warm_up
+from benchmarks.fakes import ReplayClock, FakeRest, FakeGuild, FakeMessage, FakeRawReaction, FakeBotUser
+
+BOT_USER_ID = 1
+GUILD_ID_BASE = 10_000
+USER_ID_BASE = 1_000_000
+
+CHAT_MESSAGES = ["morning all", "anyone up for lunch?", "lol", "did you see the match last night", "brb", "that's a wish-list item for sure"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--members", type=int, default=60, help="members per guild")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--reactions", type=int, default=5000)
+    parser.add_argument("--duration", type=float, default=75.0, help="burst length in seconds, starting 15s before the wish time")
+    parser.add_argument("--shamed", type=float, default=0.3, help="fraction of members still holding yesterday's shame role")
+    parser.add_argument("--role-mode", choices=["remove", "rotate"], default="remove")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay this many times faster than real time")
+    parser.add_argument("--rest-latency", type=float, default=0.08, help="seconds per fake REST call")
+    parser.add_argument("--storage-latency", type=float, default=0.05, help="seconds per storage backend call")
+    parser.add_argument("--unseen", type=float, default=0.0, help="fraction of messages the bot never sees (e.g. sent before a restart); their reactions fetch them")
+    parser.add_argument("--seed", type=int, default=1111)
+    parser.add_argument("--save", help="write the generated events to this JSONL file")
+    parser.add_argument("--replay", help="replay events from this JSONL file instead of generating them")
+    parser.add_argument("--json", help="write the report as JSON to this file")
+    parser.add_argument("--max-p99-ms", type=float, help="fail if any handler's p99 latency exceeds this")
+    return parser.parse_args()
+
+def generate_events(args):
+    """A synthetic burst: mostly wishes in the first seconds of the wish minute, reactions trailing them"""
+    rng = random.Random(args.seed)
+    lead = 15.0  # seconds before the wish time - early wishes get shamed
+    events = []
+    wishes_by_guild = {}
+    for message_id in range(1, args.messages + 1):
+        guild = rng.randrange(args.guilds)
+        t = min(max(0.0, rng.gauss(lead + 6, 6)), args.duration)
+        roll = rng.random()
+        if roll < 0.55:
+            content = rng.choice(["make a wish", "Make a wish 🌠", "🌠 wish time", f"make a wish {config.WISH_TIME}"])
+        elif roll < 0.65:
+            content = "make a wish 11:12"
+        else:
+            content = rng.choice(CHAT_MESSAGES)
+        events.append({"t": round(t, 3), "type": "message", "id": message_id, "guild": guild, "author": rng.randrange(args.members), "content": content})
+        if roll < 0.55:
+            wishes_by_guild.setdefault(guild, []).append(events[-1])
+
+    guilds_with_wishes = list(wishes_by_guild)
+    for _ in range(args.reactions if guilds_with_wishes else 0):
+        target = rng.choice(wishes_by_guild[rng.choice(guilds_with_wishes)])
+        t = min(target["t"] + rng.expovariate(1 / 8), args.duration)
+        emoji = "🌠" if rng.random() < 0.9 else "👍"
+        events.append({"t": round(t, 3), "type": "reaction", "message": target["id"], "user": rng.randrange(args.members), "emoji": emoji})
+
+    events.sort(key=lambda event: event["t"])
+    header = {"type": "scenario", "guilds": args.guilds, "members": args.members, "shamed": args.shamed, "lead": lead, "seed": args.seed}
+    return header, events
+
+def load_events(path):
+    with open(path) as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    return lines[0], lines[1:]
+
+def save_events(path, header, events):
+    with open(path, "w") as f:
+        for line in [header] + events:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+def build_world(header, rest, role_mode, rng):
+    """Fake guilds with a bot member above the shame role and some members still shamed"""
+    guilds = []
+    for index in range(header["guilds"]):
+        guild = FakeGuild(GUILD_ID_BASE + index, f"Guild {index}", rest)
+        shame_role = guild.add_role("dunce", 2)
+        bot_role = guild.add_role("Dr. Shamer", 10)
+        guild.add_member(BOT_USER_ID, "Dr. Shamer", bot=True).roles.append(bot_role)
+        guild.add_channel("general")
+        for user in range(header["members"]):
+            member = guild.add_member(USER_ID_BASE + user, f"user{user}")
+            if rng.random() < header["shamed"]:
+                member.roles.append(shame_role)
+        SHAME_ROLE_CONFIG[guild.id] = shame_role.id
+        SHAME_ROLE_MODE_CONFIG[guild.id] = role_mode
+        DEBUG_MODE_CONFIG[guild.id] = False
+        guilds.append(guild)
+    return guilds
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+class ErrorCounter(logging.Handler):
+    """Count errors logged by the bot during the run, keeping the first few"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+        self.first = []
+
+    def emit(self, record):
+        self.count += 1
+        if len(self.first) < 5:
+            self.first.append(record.getMessage())
+
+async def replay(args, header, events):
+    rng = random.Random(header.get("seed", 0))
+    wish_hour, wish_minute = map(int, config.WISH_TIME.split(":"))
+    wish_at = LONDON_TZ.localize(datetime.now(LONDON_TZ).replace(hour=wish_hour, minute=wish_minute, second=0, microsecond=0, tzinfo=None))
+    clock = ReplayClock(wish_at - timedelta(seconds=header.get("lead", 15.0)), args.speed)
+    rest = FakeRest(clock, latency=args.rest_latency)
+    store = MemoryBackend(latency=args.storage_latency)
+    guilds = build_world(header, rest, args.role_mode, rng)
+    initially_shamed = sum(len(guild.get_role(SHAME_ROLE_CONFIG[guild.id]).members) for guild in guilds)
+
+    # Point the bot at the fakes: its own user, the clock, in-memory storage and a short summary delay
+    main.bot._connection.user = FakeBotUser(BOT_USER_ID)
+
+    async def process_commands(message):
+        pass  # No prefix commands in the replay; discord.py's command parser needs a live connection
+
+    main.bot.process_commands = process_commands
+    guilds_by_id = {guild.id: guild for guild in guilds}
+    main.bot.get_guild = guilds_by_id.get
+    wish_clock.wall_time = clock.timestamp
+    await firestore_db.init_firestore(store)
+    # Warm today's logs like on_ready does - the handlers hold events until start-up is done
+    await warm_up([firestore_db.get_day_logs([guild.id for guild in guilds])])
+    firestore_db.RECORD_FLUSH_INTERVAL /= args.speed
+    config.WISH_SUMMARY_DELAY = 5 / args.speed
+
+    messages = {}
+    durations = {"on_message": [], "on_raw_reaction_add": []}
+
+    async def dispatch(name, handler, *handler_args):
+        started = time.perf_counter()
+        await handler(*handler_args)
+        durations[name].append(time.perf_counter() - started)
+
+    tasks = []
+    clock.start()
+    for event in events:
+        await clock.sleep_until(event["t"])
+        if event["type"] == "message":
+            guild = guilds[event["guild"]]
+            author = guild.get_member(USER_ID_BASE + event["author"])
+            message = FakeMessage(event["id"], guild, guild.channels[next(iter(guild.channels))], author, event["content"], clock.base + timedelta(seconds=event["t"]))
+            messages[event["id"]] = message
+            if rng.random() >= args.unseen:
+                tasks.append(asyncio.create_task(dispatch("on_message", main.on_message, message)))
+        else:
+            message = messages.get(event["message"])
+            if message is None:
+                continue  # Reaction to a message that is not in the burst
+            user = message.guild.get_member(USER_ID_BASE + event["user"])
+            tasks.append(asyncio.create_task(dispatch("on_raw_reaction_add", main.on_raw_reaction_add, FakeRawReaction(event["emoji"], message, user))))
+    replayed_at = time.perf_counter()
+
+    await asyncio.gather(*tasks)
+    for queue in list(role_queues.values()):
+        await queue.wait_drained()
+    await asyncio.sleep(config.WISH_SUMMARY_DELAY)
+    await firestore_db.flush_pending_records()
+
+    role_stats = {}
+    for queue in role_queues.values():
+        for key, value in queue.stats.items():
+            role_stats[key] = role_stats.get(key, 0) + value
+
+    handlers = {}
+    for name, values in durations.items():
+        ordered = sorted(values)
+        handlers[name] = {
+            "calls": len(ordered),
+            "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+            "max_ms": round((ordered[-1] if ordered else 0) * 1000, 2),
+        }
+
+    return {
+        "events": {"messages": sum(1 for e in events if e["type"] == "message"), "reactions": sum(1 for e in events if e["type"] == "reaction"), "guilds": len(guilds)},
+        "speed": args.speed,
+        "replay_seconds": round(replayed_at - clock._started, 2),
+        "settle_seconds": round(time.perf_counter() - replayed_at, 2),
+        "handlers": handlers,
+        "outcomes": {f"{event}/{outcome}": count for (event, outcome), count in sorted(EVENTS_HANDLED._values.items())},
+        "rest": {"calls": sum(rest.calls.values()), "by_route": dict(rest.calls.most_common()), "rate_limited": rest.rate_limited, "rate_limit_wait_s": round(rest.rate_limit_wait, 2)},
+        "storage": {"calls": store.calls, **firestore_db.record_stats},
+        "single_flight": {f"{action}/{result}": count for (action, result), count in sorted(SINGLE_FLIGHT_CALLS._values.items())},
+        "roles": {"initially_shamed": initially_shamed, "shamed_now": sum(len(guild.get_role(SHAME_ROLE_CONFIG[guild.id]).members) for guild in guilds), **role_stats},
+    }
+
+def print_report(report):
+    events = report["events"]
+    print(f"Replayed {events['messages']} messages and {events['reactions']} reactions across {events['guilds']} guilds "
+          f"in {report['replay_seconds']}s (speed {report['speed']}x), settled in {report['settle_seconds']}s")
+    for name, stats in report["handlers"].items():
+        print(f"  {name:20} {stats['calls']:6} calls   p50 {stats['p50_ms']:8.2f}ms   p99 {stats['p99_ms']:8.2f}ms   max {stats['max_ms']:8.2f}ms")
+    print("Outcomes: " + ", ".join(f"{key} {count}" for key, count in report["outcomes"].items()))
+    rest = report["rest"]
+    print(f"REST: {rest['calls']} calls, {rest['rate_limited']} rate-limit waits ({rest['rate_limit_wait_s']}s virtual)")
+    for route, count in rest["by_route"].items():
+        print(f"  {count:6}  {route}")
+    storage = report["storage"]
+    print(f"Storage: {storage['recorded']} records, {storage['calls']} backend calls ({storage['coalesced']} saved by coalescing, {storage['failed_writes']} failed)")
+    print("Single-flight: " + (", ".join(f"{key} {count}" for key, count in report["single_flight"].items()) or "nothing coalesced"))
+    roles = report["roles"]
+    print(f"Shame role: {roles['initially_shamed']} held before the burst, {roles['shamed_now']} after; "
+          f"queue applied {roles.get('applied', 0)}, joined {roles.get('joined', 0)}, skipped {roles.get('skipped', 0)}, dropped {roles.get('dropped', 0)}, failed {roles.get('failed', 0)}")
+
+async def run(args):
+    if args.replay:
+        header, events = load_events(args.replay)
+    else:
+        header, events = generate_events(args)
+    if args.save:
+        save_events(args.save, header, events)
+        print(f"Saved {len(events)} events to {args.save}")
+
+    errors = ErrorCounter()
+    logging.getLogger().addHandler(errors)
+    logging.getLogger().setLevel(logging.WARNING)
+    report = await replay(args, header, events)
+    report["errors"] = {"count": errors.count, "first": errors.first}
+
+    print_report(report)
+    if errors.count:
+        print(f"⚠️ {errors.count} errors logged, first: {errors.first}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.max_p99_ms is not None:
+        over = {name: stats["p99_ms"] for name, stats in report["handlers"].items() if stats["p99_ms"] > args.max_p99_ms}
+        if over:
+            print(f"❌ p99 over budget of {args.max_p99_ms}ms: {over}")
+            return 1
+        print(f"✅ All handler p99 latencies within {args.max_p99_ms}ms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
@@ -0,0 +1,70 @@
+"""Measure journal append cost and recovery time against history length.
+
+Writes --events events per history length through src.journal, the way the bot does at 11:11.
+Each burst is a few wishes, shames and a role clean-up per guild, followed by the ack a storage
+flush writes. It then recovers the journal in a fresh state, once with compaction every
+JOURNAL_COMPACT_EVENTS events and once without, where the whole history is replayed.
+
+    python -m benchmarks.journal_recovery [--events 10000 100000] [--guilds 50] [--compact-every 1000]
+"""
+import argparse
+import logging
+import random
+import shutil
+import tempfile
+import time
+
+from src import journal
+
+def write_history(directory, events, guilds, compact_every):
+    """Append `events` events like daily 11:11 bursts; returns microseconds per append"""
+    rng = random.Random(42)
+    journal.JOURNAL_COMPACT_EVENTS = compact_every
+    journal.recover_journal(directory)
+    written = 0
+    started = time.perf_counter()
+    while written < events:
+        for guild_id in range(1, guilds + 1):
+            for _ in range(rng.randint(1, 6)):
+                user_id = rng.randrange(10000)
+                journal.append("wish", guild_id=guild_id, channel_id=guild_id * 10, user_id=user_id, date="2026-01-01")
+                journal.append("record", guild_id=guild_id, date="2026-01-01", field="wished", user_id=str(user_id))
+            journal.append("record", guild_id=guild_id, date="2026-01-01", field="shamed", user_id=str(rng.randrange(10000)))
+            journal.append("roles_cleared", guild_id=guild_id, mode="remove", count=1)
+            journal.append("window_closed", guild_id=guild_id, outcome="sent")
+        journal.ack(journal.journal_seq())
+        written = journal.journal_seq()
+    per_append_us = (time.perf_counter() - started) * 1e6 / written
+    journal._file.close()  # Stop without the final compaction, like a crash
+    journal._file = journal._directory = None
+    return per_append_us
+
+def recover(directory):
+    started = time.perf_counter()
+    state = journal.recover_journal(directory)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    journal.close_journal()
+    return elapsed_ms, state
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--compact-every", type=int, default=1000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    print(f"{'history':>8} | {'compaction':>14} | {'append':>8} | {'recovery':>9} | {'open windows':>12} | {'un-stored':>9}")
+    for events in args.events:
+        for compact_every in (args.compact_every, 10 ** 12):
+            directory = tempfile.mkdtemp(prefix="journal-")
+            try:
+                per_append_us = write_history(directory, events, args.guilds, compact_every)
+                elapsed_ms, state = recover(directory)
+            finally:
+                shutil.rmtree(directory)
+            label = f"every {compact_every}" if compact_every < 10 ** 12 else "never"
+            print(f"{events:>8} | {label:>14} | {per_append_us:6.1f}us | {elapsed_ms:7.1f}ms | {len(state['windows']):>12} | {len(state['records']):>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Measure the member cache memory with discord.py's default policy and the lean member cache.
+
+Builds real discord.py Guild/Member objects for guilds of --members members. The default
+policy caches every member, the way chunking at startup fills the cache. The lean mode caches only
+the shame role holders (--holders of them, the bot adds them itself). It then reports
+the traced memory and how long role.members takes, since role.members scans the member cache.
+
+    python -m benchmarks.member_cache_footprint [--members 10000 100000] [--holders 100]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+import discord
+
+ROLE_ID = 42
+
+def make_guild(guild_id):
+    client = discord.Client(intents=discord.Intents.default(), member_cache_flags=discord.MemberCacheFlags.none())
+    state = client._connection
+    guild = discord.Guild(data={
+        "id": guild_id, "name": "Benchmark", "owner_id": 1,
+        "roles": [{"id": guild_id, "name": "@everyone", "permissions": "0"}, {"id": ROLE_ID, "name": "Shamed", "permissions": "0"}],
+    }, state=state)
+    return guild, state
+
+def member_data(user_id, shamed):
+    return {
+        "user": {"id": user_id, "username": f"user{user_id}", "discriminator": "0", "global_name": f"User {user_id}", "avatar": None},
+        "roles": [ROLE_ID] if shamed else [], "flags": 0, "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False,
+    }
+
+def fill_cache(members, holders, lean):
+    """Cache all members (default) or only the holders (lean); returns (guild, traced bytes)"""
+    gc.collect()
+    tracemalloc.start()
+    guild, state = make_guild(1000)
+    shamed_every = max(members // holders, 1)
+    for user_id in range(1, members + 1):
+        shamed = user_id % shamed_every == 0
+        if lean and not shamed:
+            continue
+        guild._add_member(discord.Member(data=member_data(user_id, shamed), guild=guild, state=state))
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return guild, size
+
+def time_role_members(guild, repeat=20):
+    role = guild.get_role(ROLE_ID)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        found = len(role.members)
+    return (time.perf_counter() - started) * 1000 / repeat, found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--holders", type=int, default=100, help="shame role holders per guild")
+    args = parser.parse_args()
+
+    print(f"{'members':>8} | {'mode':>7} | {'cached':>7} | {'memory':>9} | {'role.members':>12}")
+    for members in args.members:
+        for lean in (False, True):
+            guild, size = fill_cache(members, args.holders, lean)
+            ms, found = time_role_members(guild)
+            print(f"{members:>8} | {'lean' if lean else 'default':>7} | {len(guild._members):>7} | {size / 2**20:7.1f}Mi | {ms:8.2f}ms ({found})")
+            del guild
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Measure the import cost of src.main with `python -X importtime` and fail over a budget.
+
+Each run imports src.main in a fresh interpreter (with the default Firestore storage backend
+selected, no token) and reads the import times. With --cold, each run gets an empty bytecode
+cache, like a container whose image was built without compiled .pyc files. The run fails
+(exit 1) when the median import time is over --budget-ms, or when a module that should only
+load on first use (the Firestore/gRPC stack) was imported.
+
+    python -m benchmarks.startup_imports [--runs 5] [--budget-ms 1500] [--cold] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Loaded by the storage backend when it connects, never by importing src.main
+LAZY_MODULES = ("google.cloud.firestore", "grpc", "google.protobuf", "sqlite3")
+
+def import_times(cold):
+    """Import src.main once -> {module: (self_us, cumulative_us)} in import order"""
+    args = [sys.executable, "-X", "importtime"]
+    with tempfile.TemporaryDirectory() as pycache:
+        if cold:
+            args += ["-X", f"pycache_prefix={pycache}"]
+        env = dict(os.environ, STORAGE_BACKEND="firestore")
+        env.pop("DISCORD_BOT_TOKEN", None)
+        result = subprocess.run(args + ["-c", "import src.main"], capture_output=True, text=True, env=env, check=True)
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500, help="fail when the median src.main import takes longer")
+    parser.add_argument("--cold", action="store_true", help="start every run with an empty bytecode cache")
+    parser.add_argument("--top", type=int, default=15, help="slowest packages to list")
+    args = parser.parse_args()
+
+    runs = [import_times(args.cold) for _ in range(args.runs)]
+    totals = [modules["src.main"][1] / 1000 for modules in runs]
+    median = statistics.median(totals)
+
+    # Self time per top-level package, from the median run
+    modules = runs[totals.index(sorted(totals)[len(totals) // 2])]
+    packages = {}
+    for name, (self_us, _) in modules.items():
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    print(f"{'package':>24} | {'self ms':>8}")
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:>24} | {self_us / 1000:8.1f}")
+
+    print(f"\nimport src.main ({'cold' if args.cold else 'warm'} bytecode cache, {args.runs} runs): "
+          f"median {median:.0f}ms, min {min(totals):.0f}ms, max {max(totals):.0f}ms, {len(modules)} modules - budget {args.budget_ms:.0f}ms")
+
+    failures = []
+    eager = sorted({name for modules in runs for name in modules if name.startswith(LAZY_MODULES)})
+    if eager:
+        failures.append(f"imported modules that should load lazily: {', '.join(eager[:5])}{' ...' if len(eager) > 5 else ''}")
+    if median > args.budget_ms:
+        failures.append(f"median import time {median:.0f}ms is over the {args.budget_ms:.0f}ms budget")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
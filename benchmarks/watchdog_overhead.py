@@ -0,0 +1,87 @@
+"""Measure the cost of the watchdog and check that it catches stalls.
+
+Times a trivial async handler with and without the watchdog's @timed wrapper
+(per-call overhead), then blocks the loop with time.sleep and awaits a slow
+coroutine inside a timed handler to confirm both a "loop blocked" and a
+"slow handler" stack are captured.
+
+    python -m benchmarks.watchdog_overhead [--calls 100000] [--threshold 0.2]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=100_000, help="handler calls per variant")
+    parser.add_argument("--threshold", type=float, default=0.2, help="WATCHDOG_SLOW_THRESHOLD in seconds")
+    return parser.parse_args()
+
+args = parse_args()
+# The watchdog reads its settings at import time
+os.environ["WATCHDOG_ENABLED"] = "1"
+os.environ["WATCHDOG_SLOW_THRESHOLD"] = str(args.threshold)
+
+from src import watchdog
+from src.metrics import SLOW_CALLBACKS
+
+class CaptureHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+    
+    def emit(self, record):
+        self.events.append((getattr(record, "event", None), record.getMessage()))
+
+async def handler(value):
+    return value + 1
+
+timed_handler = watchdog.timed("bench_handler")(handler)
+
+async def per_call_cost(func, calls):
+    started = time.perf_counter()
+    for i in range(calls):
+        await func(i)
+    return (time.perf_counter() - started) / calls
+
+@watchdog.timed("slow_handler")
+async def slow_handler():
+    await asyncio.sleep(args.threshold * 3)
+
+async def main():
+    capture = CaptureHandler()
+    logging.getLogger("src.watchdog").addHandler(capture)
+    logging.getLogger("src.watchdog").setLevel(logging.INFO)
+    
+    bare = await per_call_cost(handler, args.calls)
+    wrapped = await per_call_cost(timed_handler, args.calls)
+    print(f"Per call: bare {bare * 1e6:.2f}us, @timed {wrapped * 1e6:.2f}us, overhead {(wrapped - bare) * 1e6:.2f}us")
+    stats = watchdog.get_handler_stats()["handlers"]["bench_handler"]
+    print(f"bench_handler: {stats['calls']} calls, p50 {stats['p50_ms']}ms, p99 {stats['p99_ms']}ms")
+    
+    heartbeat = watchdog.start_watchdog()
+    await asyncio.sleep(watchdog.LOOP_PROBE_INTERVAL * 3)
+    
+    time.sleep(args.threshold * 4)  # Blocks the loop - the stall thread should dump this line
+    await asyncio.sleep(watchdog.LOOP_PROBE_INTERVAL * 2)
+    await slow_handler()
+    
+    heartbeat.cancel()
+    watchdog.stop_watchdog()
+    
+    events = [event for event, _ in capture.events]
+    blocked = [message for event, message in capture.events if event == "loop_blocked"]
+    slow = [message for event, message in capture.events if event == "slow_handler"]
+    print(f"Loop stalls reported: {len(blocked)}, slow handlers reported: {len(slow)}, max loop lag {watchdog.loop_state['max_lag'] * 1000:.0f}ms")
+    print(f"slow_callbacks_total: loop_blocked={SLOW_CALLBACKS.value(kind='loop_blocked', name='')}, slow_handler={SLOW_CALLBACKS.value(kind='handler', name='slow_handler')}")
+    ok = len(blocked) == 1 and "time.sleep(args.threshold * 4)" in blocked[0] and len(slow) == 1 and "slow_handler" in slow[0]
+    if not ok:
+        print(f"❌ Expected one loop stall pointing at time.sleep and one slow handler report, got events {events}")
+        sys.exit(1)
+    print("✅ Stall and slow handler stacks captured")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""Count the daily logs read by windowed leaderboards with and without monthly rollups.
+
+Seeds the in-memory backend with --years of history for one guild, then runs
+`rank week/month/year/YYYY-MM` through src.firestore_db twice: the first call
+folds closed days into monthly rollups, the second is the steady state. The
+baseline counts the same window straight from the daily logs. Every backend
+call blocks for --latency ms, like a Firestore round-trip.
+
+    python -m benchmarks.window_leaderboard [--years 3] [--users 50] [--latency 5]
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import date, timedelta
+
+from src import firestore_db
+from src.backends.memory import MemoryBackend
+from src.cmds import parse_leaderboard_window
+
+GUILD_ID = 1234
+
+class CountingBackend(MemoryBackend):
+    """MemoryBackend that counts the daily logs it hands out"""
+
+    def __init__(self, latency):
+        super().__init__(latency)
+        self.days_read = 0
+
+    def get_day_range(self, guild_id, start_date, end_date):
+        days = super().get_day_range(guild_id, start_date, end_date)
+        self.days_read += len(days)
+        return days
+
+def seed(backend, today, years, users):
+    rng = random.Random(42)
+    latency, backend.latency = backend.latency, 0
+    day = date.fromisoformat(today) - timedelta(days=365 * years)
+    while day.isoformat() <= today:
+        backend.commit_records(GUILD_ID, day.isoformat(), {
+            "wished": {str(rng.randrange(users)) for _ in range(users // 3)},
+            "shamed": {str(rng.randrange(users)) for _ in range(users // 10)},
+        })
+        day += timedelta(days=1)
+    backend.latency = latency
+
+async def measure(backend, query):
+    days_before, calls_before = backend.days_read, backend.calls
+    started = time.perf_counter()
+    await query()
+    return (time.perf_counter() - started) * 1000, backend.days_read - days_before, backend.calls - calls_before
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=5, help="simulated storage latency in ms")
+    args = parser.parse_args()
+
+    today = firestore_db.get_today_date()
+    backend = CountingBackend(args.latency / 1000)
+    seed(backend, today, args.years, args.users)
+    await firestore_db.init_firestore(backend)
+
+    last_month = (date.fromisoformat(today).replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+    print(f"{'window':>8} | {'daily scan':>22} | {'rollups (first call)':>22} | {'rollups (steady)':>22}")
+    for window in ("week", "month", "year", last_month):
+        _, start_date, end_date = parse_leaderboard_window(window, today)
+        scan = await measure(backend, lambda: asyncio.to_thread(backend.count_range, GUILD_ID, start_date, end_date))
+        first = await measure(backend, lambda: firestore_db.get_leaderboard(GUILD_ID, start_date, end_date))
+        steady = await measure(backend, lambda: firestore_db.get_leaderboard(GUILD_ID, start_date, end_date))
+        cells = [f"{ms:6.1f}ms {days:4d} days {calls:2d} calls" for ms, days, calls in (scan, first, steady)]
+        print(f"{window:>8} | " + " | ".join(cells))
+
+if __name__ == "__main__":
+    asyncio.run(main())
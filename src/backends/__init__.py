@@ -0,0 +1,18 @@
+import importlib
+from .base import StorageBackend, EMPTY_DAY, advance_streak
+
+# STORAGE_BACKEND value -> (module in this package, class). Modules are imported only when
+# selected, so e.g. the memory backend never loads the Firestore client.
+BACKENDS = {
+    "firestore": ("firestore", "FirestoreBackend"),
+    "memory": ("memory", "MemoryBackend"),
+    "sqlite": ("sqlite", "SQLiteBackend"),
+}
+
+def create_backend(name):
+    """Instantiate the storage backend registered under `name`"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{name}' (expected one of: {', '.join(BACKENDS)})")
+    module_name, class_name = BACKENDS[name]
+    module = importlib.import_module(f".{module_name}", __name__)
+    return getattr(module, class_name)()
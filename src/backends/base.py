@@ -0,0 +1,109 @@
+from datetime import date, timedelta
+
+EMPTY_DAY = {"wished": [], "shamed": []}
+
+def advance_streak(streak, date_str):
+    """Streak state after a record on date_str: {"last": date_str, "current": run length, "best": longest run}"""
+    if streak is None:
+        return {"last": date_str, "current": 1, "best": 1}
+    if date_str <= streak["last"]:
+        return streak  # Same day, or a late record for an earlier day (a streak rebuild picks it up)
+    previous_day = (date.fromisoformat(date_str) - timedelta(days=1)).isoformat()
+    current = streak["current"] + 1 if streak["last"] == previous_day else 1
+    return {"last": date_str, "current": current, "best": max(streak["best"], current)}
+
+class StorageBackend:
+    """Synchronous storage interface behind src.firestore_db.
+
+    firestore_db owns buffering, timeouts and error handling and calls these methods on its
+    executor when `blocking` is True (or inline when False), so implementations may block but
+    must be thread-safe. Guild IDs are ints, user IDs are strings, dates are "YYYY-MM-DD" in
+    London time. A day log is {"wished": [user_id, ...], "shamed": [user_id, ...]} and
+    aggregate counts are {"wished": {user_id: days}, "shamed": {user_id: days}}. A monthly
+    rollup is aggregate counts for one "YYYY-MM" month plus "through", the last day folded in.
+    Streaks are {"wished": {user_id: streak}, "shamed": {...}} with advance_streak's state.
+    """
+    name = "base"
+    blocking = True
+
+    def connect(self):
+        """Open clients/files; raise if the backend cannot be used"""
+
+    def close(self):
+        """Release clients/files"""
+
+    def commit_records(self, guild_id, date_str, field_users):
+        """Add users to a day's log, bump aggregate counts and advance streaks for users new to that day.
+
+        field_users is {"wished"|"shamed": iterable of user IDs}; returns {field: sorted new
+        user IDs} for the users that were actually added. Aggregate counts are only bumped once
+        the guild has been seeded with set_aggregates, and streaks once it has been seeded with
+        set_streaks. Must be atomic per call.
+        """
+        raise NotImplementedError
+
+    def get_day_logs(self, guild_ids, date_str):
+        """{guild_id: day log} for one day, with EMPTY_DAY-shaped logs for guilds without one"""
+        raise NotImplementedError
+
+    def get_day_range(self, guild_id, start_date, end_date):
+        """{date_str: day log} for the guild's days with records between the two dates, inclusive"""
+        raise NotImplementedError
+
+    def count_history(self, guild_id):
+        """Aggregate counts computed from every day log (slow on document stores)"""
+        raise NotImplementedError
+
+    def count_range(self, guild_id, start_date, end_date):
+        """Aggregate counts over the days between two dates, inclusive"""
+        counts = {"wished": {}, "shamed": {}}
+        for log in self.get_day_range(guild_id, start_date, end_date).values():
+            for field in counts:
+                for user_id in set(log.get(field, [])):
+                    counts[field][user_id] = counts[field].get(user_id, 0) + 1
+        return counts
+
+    def get_user_history(self, guild_id, user_id):
+        """{"wished": [date_str, ...], "shamed": [...]} for one user, oldest first"""
+        history = {"wished": [], "shamed": []}
+        for date_str, log in sorted(self.get_day_range(guild_id, "0000-00-00", "9999-99-99").items()):
+            for field in history:
+                if str(user_id) in log.get(field, []):
+                    history[field].append(date_str)
+        return history
+
+    def get_aggregates(self, guild_id):
+        """Stored aggregate counts, or None if the guild was never seeded"""
+        raise NotImplementedError
+
+    def set_aggregates(self, guild_id, counts):
+        """Replace the stored aggregate counts (recounted from the daily logs) and mark the guild seeded"""
+        raise NotImplementedError
+
+    def get_rollups(self, guild_id, months):
+        """{month: rollup} for the given "YYYY-MM" months that have a stored rollup"""
+        raise NotImplementedError
+
+    def set_rollup(self, guild_id, month, rollup):
+        """Replace a month's stored rollup"""
+        raise NotImplementedError
+
+    def delete_rollup(self, guild_id, month):
+        """Drop a month's rollup so it is recounted from the daily logs"""
+        raise NotImplementedError
+
+    def get_streaks(self, guild_id, user_ids=None):
+        """Stored streaks for every user (or only user_ids), or None if the guild was never seeded"""
+        raise NotImplementedError
+
+    def set_streaks(self, guild_id, streaks):
+        """Replace all of a guild's streaks (recomputed from the daily logs) and mark it seeded"""
+        raise NotImplementedError
+
+    def load_guild_settings(self, guild_ids):
+        """{guild_id: settings dict} for the guilds that have persisted settings"""
+        raise NotImplementedError
+
+    def save_guild_settings(self, guild_id, settings):
+        """Merge settings into the guild's persisted settings"""
+        raise NotImplementedError
@@ -0,0 +1,217 @@
+import logging
+from google.cloud import firestore
+from google.cloud.firestore_v1 import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+from .base import StorageBackend, EMPTY_DAY, advance_streak
+
+logger = logging.getLogger(__name__)
+
+# Layout:
+#   wish_log/<guild_id>/daily/<YYYY-MM-DD>       {"wished": [user_id], "shamed": [user_id]}
+#   wish_log/<guild_id>/stats/leaderboard        {"wished": {user_id: n}, "shamed": {user_id: n}}
+#   wish_log/<guild_id>/stats/aggregates         {"seeded_at": timestamp}, present once the leaderboard was counted from the daily logs
+#   wish_log/<guild_id>/rollups/<YYYY-MM>        {"wished": {user_id: n}, "shamed": {user_id: n}, "through": date}
+#   wish_log/<guild_id>/streaks/<user_id>        {"wished": streak, "shamed": streak}
+#   wish_log/<guild_id>/stats/streaks            {"seeded_at": timestamp}, present once streaks were recomputed
+#   wish_log/<guild_id>/settings/guild           {"shame_role_id": ..., "shame_role_mode": ...}
+
+@firestore.transactional
+def _commit_records_transaction(transaction, day_ref, stats_ref, stats_marker_ref, streak_marker_ref, streaks_ref, field_users):
+    """Add users to the daily log, bump aggregate counts and advance streaks for users new to that day"""
+    snapshot = day_ref.get(transaction=transaction)
+    day_data = (snapshot.to_dict() if snapshot.exists else None) or {}
+
+    day_update = {}
+    stats_update = {}
+    added = {}
+    for field, users in field_users.items():
+        new_users = sorted(set(users) - set(day_data.get(field, [])))
+        if not new_users:
+            continue
+        day_update[field] = firestore.ArrayUnion(new_users)
+        stats_update[field] = {user_id: firestore.Increment(1) for user_id in new_users}
+        added[field] = new_users
+    if not day_update:
+        return added
+
+    # Counts and streaks are only kept up to date once they were seeded from the history; before
+    # that an increment would create a leaderboard holding only the records since the deploy
+    markers = {doc.reference.path for doc in transaction.get_all([stats_marker_ref, streak_marker_ref]) if doc.exists}
+
+    # Only the new users' streak documents are read (all reads must come before the writes)
+    streak_updates = {}
+    if streak_marker_ref.path in markers:
+        user_ids = sorted({user_id for users in added.values() for user_id in users})
+        refs = [streaks_ref.document(user_id) for user_id in user_ids]
+        stored = {doc.id: doc.to_dict() or {} for doc in transaction.get_all(refs) if doc.exists}
+        for field, users in added.items():
+            for user_id in users:
+                streak_updates.setdefault(user_id, {})[field] = advance_streak(stored.get(user_id, {}).get(field), day_ref.id)
+
+    transaction.set(day_ref, day_update, merge=True)
+    if stats_marker_ref.path in markers:
+        transaction.set(stats_ref, stats_update, merge=True)
+    for user_id, update in streak_updates.items():
+        transaction.set(streaks_ref.document(user_id), update, merge=True)
+    return added
+
+class FirestoreBackend(StorageBackend):
+    """Google Cloud Firestore, through the synchronous gRPC client"""
+    name = "firestore"
+
+    def __init__(self):
+        self.db = None
+
+    def connect(self):
+        self.db = firestore.Client()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def guild_log(self, guild_id):
+        """The daily collection for a specific guild"""
+        return self.db.collection("wish_log").document(str(guild_id)).collection("daily")
+
+    def guild_stats(self, guild_id):
+        """The aggregate leaderboard document for a specific guild"""
+        return self.db.collection("wish_log").document(str(guild_id)).collection("stats").document("leaderboard")
+
+    def guild_rollups(self, guild_id):
+        """The monthly rollup collection for a specific guild"""
+        return self.db.collection("wish_log").document(str(guild_id)).collection("rollups")
+
+    def guild_streaks(self, guild_id):
+        """The per-user streak collection for a specific guild"""
+        return self.db.collection("wish_log").document(str(guild_id)).collection("streaks")
+
+    def guild_stats_marker(self, guild_id):
+        """The document marking a guild's aggregate counts as seeded from its history"""
+        return self.db.collection("wish_log").document(str(guild_id)).collection("stats").document("aggregates")
+
+    def guild_streak_marker(self, guild_id):
+        """The document marking a guild's streaks as seeded from its history"""
+        return self.db.collection("wish_log").document(str(guild_id)).collection("stats").document("streaks")
+
+    def guild_settings(self, guild_id):
+        """The persisted settings document for a specific guild (e.g. rotated shame role ID)"""
+        return self.db.collection("wish_log").document(str(guild_id)).collection("settings").document("guild")
+
+    def commit_records(self, guild_id, date_str, field_users):
+        day_ref = self.guild_log(guild_id).document(date_str)
+        return _commit_records_transaction(self.db.transaction(), day_ref, self.guild_stats(guild_id), self.guild_stats_marker(guild_id),
+                                           self.guild_streak_marker(guild_id), self.guild_streaks(guild_id), field_users)
+
+    def get_day_logs(self, guild_ids, date_str):
+        refs = [self.guild_log(guild_id).document(date_str) for guild_id in guild_ids]
+        logs = {guild_id: dict(EMPTY_DAY) for guild_id in guild_ids}
+        for doc in self.db.get_all(refs):
+            if doc.exists:
+                logs[int(doc.reference.parent.parent.id)] = doc.to_dict()
+        return logs
+
+    def get_day_range(self, guild_id, start_date, end_date):
+        log = self.guild_log(guild_id)
+        query = (log.where(filter=FieldFilter(FieldPath.document_id(), ">=", log.document(start_date)))
+                    .where(filter=FieldFilter(FieldPath.document_id(), "<=", log.document(end_date))))
+        return {doc.id: doc.to_dict() or dict(EMPTY_DAY) for doc in query.stream()}
+
+    def count_history(self, guild_id):
+        """Count wishes/shames per user by scanning every daily document (slow, used for rebuilds)"""
+        wished_counter = {}
+        shamed_counter = {}
+
+        doc_count = 0
+        for doc in self.guild_log(guild_id).stream():
+            doc_count += 1
+            data = doc.to_dict()
+            if not data:  # Skip empty documents
+                continue
+
+            # Each day counts once per user, even if the array somehow holds duplicates
+            for user in set(data.get("wished", [])):
+                wished_counter[user] = wished_counter.get(user, 0) + 1
+            for user in set(data.get("shamed", [])):
+                shamed_counter[user] = shamed_counter.get(user, 0) + 1
+
+        logger.info(f"📊 Processed {doc_count} daily documents for guild {guild_id}")
+        return {"wished": wished_counter, "shamed": shamed_counter}
+
+    def get_user_history(self, guild_id, user_id):
+        history = {}
+        for field in ("wished", "shamed"):
+            query = self.guild_log(guild_id).where(filter=FieldFilter(field, "array_contains", str(user_id)))
+            history[field] = sorted(doc.id for doc in query.stream())
+        return history
+
+    def get_aggregates(self, guild_id):
+        # A leaderboard document without the seeded marker only holds increments since the deploy
+        marker_ref, stats_ref = self.guild_stats_marker(guild_id), self.guild_stats(guild_id)
+        docs = {doc.reference.path: doc for doc in self.db.get_all([marker_ref, stats_ref]) if doc.exists}
+        if marker_ref.path not in docs:
+            return None
+        return (docs[stats_ref.path].to_dict() or {}) if stats_ref.path in docs else {"wished": {}, "shamed": {}}
+
+    def set_aggregates(self, guild_id, counts):
+        # Overwrite (no merge) so users removed from the daily logs disappear from the aggregate too,
+        # and mark the guild seeded in the same batch so commits start incrementing from here
+        batch = self.db.batch()
+        batch.set(self.guild_stats(guild_id), counts)
+        batch.set(self.guild_stats_marker(guild_id), {"seeded_at": firestore.SERVER_TIMESTAMP})
+        batch.commit()
+
+    def get_rollups(self, guild_id, months):
+        refs = [self.guild_rollups(guild_id).document(month) for month in months]
+        return {doc.id: doc.to_dict() for doc in self.db.get_all(refs) if doc.exists}
+
+    def set_rollup(self, guild_id, month, rollup):
+        self.guild_rollups(guild_id).document(month).set(rollup)
+
+    def delete_rollup(self, guild_id, month):
+        self.guild_rollups(guild_id).document(month).delete()
+
+    def get_streaks(self, guild_id, user_ids=None):
+        if not self.guild_streak_marker(guild_id).get().exists:
+            return None
+        if user_ids is None:
+            docs = self.guild_streaks(guild_id).stream()
+        else:
+            docs = self.db.get_all([self.guild_streaks(guild_id).document(str(user_id)) for user_id in user_ids])
+        streaks = {"wished": {}, "shamed": {}}
+        for doc in docs:
+            if doc.exists:
+                for field, streak in (doc.to_dict() or {}).items():
+                    streaks.setdefault(field, {})[doc.id] = streak
+        return streaks
+
+    def set_streaks(self, guild_id, streaks):
+        collection = self.guild_streaks(guild_id)
+        users = {}
+        for field, field_streaks in streaks.items():
+            for user_id, streak in field_streaks.items():
+                users.setdefault(user_id, {})[field] = streak
+
+        # Drop users that no longer appear in the history, then rewrite the rest (batches hold at most 500 writes)
+        writes = [(ref, None) for ref in collection.list_documents() if ref.id not in users]
+        writes += [(collection.document(user_id), data) for user_id, data in users.items()]
+        for start in range(0, len(writes), 500):
+            batch = self.db.batch()
+            for ref, data in writes[start:start + 500]:
+                if data is None:
+                    batch.delete(ref)
+                else:
+                    batch.set(ref, data)
+            batch.commit()
+        self.guild_streak_marker(guild_id).set({"seeded_at": firestore.SERVER_TIMESTAMP})
+
+    def load_guild_settings(self, guild_ids):
+        refs = [self.guild_settings(guild_id) for guild_id in guild_ids]
+        settings = {}
+        for doc in self.db.get_all(refs):
+            if doc.exists:
+                settings[int(doc.reference.parent.parent.id)] = doc.to_dict() or {}
+        return settings
+
+    def save_guild_settings(self, guild_id, settings):
+        self.guild_settings(guild_id).set(settings, merge=True)
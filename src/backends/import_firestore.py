@@ -0,0 +1,64 @@
+"""Copy the Firestore wish_log collection into a SQLite database.
+
+Streams each guild's daily documents and imports them in batches, plus each guild's settings
+document. Rows already present are skipped, so the import can be re-run (e.g. right before
+switching STORAGE_BACKEND to sqlite) to pick up days written since the last run. Aggregate
+leaderboard documents are not copied - the SQLite backend counts from the records table.
+
+    python -m src.backends.import_firestore [--sqlite data/drshamer.sqlite3] [--guild ID ...] [--batch 500]
+"""
+import argparse
+import logging
+import time
+from .firestore import FirestoreBackend
+from .sqlite import SQLiteBackend, SQLITE_PATH
+
+logger = logging.getLogger(__name__)
+
+def import_guild(source, target, guild_id, batch_size):
+    """Stream one guild's daily documents into SQLite; returns (documents read, rows added)"""
+    documents = rows = 0
+    batch = {}
+    for doc in source.guild_log(guild_id).stream():
+        documents += 1
+        batch[doc.id] = doc.to_dict() or {}
+        if len(batch) >= batch_size:
+            rows += target.import_days(guild_id, batch)
+            batch = {}
+    if batch:
+        rows += target.import_days(guild_id, batch)
+
+    settings = source.guild_settings(guild_id).get()
+    if settings.exists and settings.to_dict():
+        target.save_guild_settings(guild_id, settings.to_dict())
+    return documents, rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sqlite", default=SQLITE_PATH, help="database file to import into")
+    parser.add_argument("--guild", type=int, action="append", help="only import these guild IDs")
+    parser.add_argument("--batch", type=int, default=500, help="daily documents per SQLite transaction")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    source = FirestoreBackend()
+    source.connect()
+    target = SQLiteBackend(args.sqlite)
+    target.connect()
+    try:
+        # list_documents also returns guild documents that only exist as a parent of subcollections
+        guild_ids = args.guild or [int(ref.id) for ref in source.db.collection("wish_log").list_documents()]
+        started = time.perf_counter()
+        total_documents = total_rows = 0
+        for guild_id in guild_ids:
+            documents, rows = import_guild(source, target, guild_id, args.batch)
+            total_documents += documents
+            total_rows += rows
+            logger.info(f"📥 Guild {guild_id}: {documents} daily documents, {rows} new rows")
+        logger.info(f"✅ Imported {len(guild_ids)} guilds ({total_documents} documents, {total_rows} new rows) into {args.sqlite} in {time.perf_counter() - started:.1f}s")
+    finally:
+        target.close()
+        source.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import copy
+import threading
+import time
+from .base import StorageBackend, EMPTY_DAY, advance_streak
+
+class MemoryBackend(StorageBackend):
+    """Process-local dictionaries - for benchmarks, local development and tests.
+
+    Everything is lost on restart. `latency` (seconds) makes every call block like a network
+    round-trip; with latency set the backend runs on the storage executor like a real one.
+    """
+    name = "memory"
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.blocking = latency > 0
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._days = {}  # guild_id -> {date_str: {"wished": set, "shamed": set}}
+        self._aggregates = {}  # guild_id -> {"wished": {user_id: n}, "shamed": {user_id: n}}, once seeded
+        self._rollups = {}  # guild_id -> {month: rollup}
+        self._streaks = {}  # guild_id -> {"wished": {user_id: streak}, "shamed": {...}}, once seeded
+        self._settings = {}  # guild_id -> dict
+
+    def _round_trip(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def commit_records(self, guild_id, date_str, field_users):
+        self._round_trip()
+        with self._lock:
+            day = self._days.setdefault(guild_id, {}).setdefault(date_str, {"wished": set(), "shamed": set()})
+            aggregates = self._aggregates.get(guild_id)
+            streaks = self._streaks.get(guild_id)
+            added = {}
+            for field, users in field_users.items():
+                new_users = sorted(set(users) - day[field])
+                if not new_users:
+                    continue
+                day[field].update(new_users)
+                for user_id in new_users:
+                    if aggregates is not None:
+                        counts = aggregates.setdefault(field, {})
+                        counts[user_id] = counts.get(user_id, 0) + 1
+                    if streaks is not None:
+                        streaks[field][user_id] = advance_streak(streaks[field].get(user_id), date_str)
+                added[field] = new_users
+            return added
+
+    def _day_log(self, day):
+        return {"wished": sorted(day["wished"]), "shamed": sorted(day["shamed"])}
+
+    def get_day_logs(self, guild_ids, date_str):
+        self._round_trip()
+        with self._lock:
+            logs = {}
+            for guild_id in guild_ids:
+                day = self._days.get(guild_id, {}).get(date_str)
+                logs[guild_id] = self._day_log(day) if day else dict(EMPTY_DAY)
+            return logs
+
+    def get_day_range(self, guild_id, start_date, end_date):
+        self._round_trip()
+        with self._lock:
+            days = self._days.get(guild_id, {})
+            return {date_str: self._day_log(day) for date_str, day in sorted(days.items()) if start_date <= date_str <= end_date}
+
+    def count_history(self, guild_id):
+        self._round_trip()
+        with self._lock:
+            counts = {"wished": {}, "shamed": {}}
+            for day in self._days.get(guild_id, {}).values():
+                for field in ("wished", "shamed"):
+                    for user_id in day[field]:
+                        counts[field][user_id] = counts[field].get(user_id, 0) + 1
+            return counts
+
+    def get_aggregates(self, guild_id):
+        self._round_trip()
+        with self._lock:
+            aggregates = self._aggregates.get(guild_id)
+            return {field: dict(counts) for field, counts in aggregates.items()} if aggregates is not None else None
+
+    def set_aggregates(self, guild_id, counts):
+        self._round_trip()
+        with self._lock:
+            self._aggregates[guild_id] = {field: dict(values) for field, values in counts.items()}
+
+    def get_rollups(self, guild_id, months):
+        self._round_trip()
+        with self._lock:
+            rollups = self._rollups.get(guild_id, {})
+            return {month: copy.deepcopy(rollups[month]) for month in months if month in rollups}
+
+    def set_rollup(self, guild_id, month, rollup):
+        self._round_trip()
+        with self._lock:
+            self._rollups.setdefault(guild_id, {})[month] = copy.deepcopy(rollup)
+
+    def delete_rollup(self, guild_id, month):
+        self._round_trip()
+        with self._lock:
+            self._rollups.get(guild_id, {}).pop(month, None)
+
+    def get_streaks(self, guild_id, user_ids=None):
+        self._round_trip()
+        with self._lock:
+            streaks = self._streaks.get(guild_id)
+            if streaks is None:
+                return None
+            return {field: {user_id: dict(streak) for user_id, streak in users.items() if user_ids is None or user_id in user_ids}
+                    for field, users in streaks.items()}
+
+    def set_streaks(self, guild_id, streaks):
+        self._round_trip()
+        with self._lock:
+            self._streaks[guild_id] = copy.deepcopy(streaks)
+
+    def load_guild_settings(self, guild_ids):
+        self._round_trip()
+        with self._lock:
+            return {guild_id: dict(self._settings[guild_id]) for guild_id in guild_ids if guild_id in self._settings}
+
+    def save_guild_settings(self, guild_id, settings):
+        self._round_trip()
+        with self._lock:
+            self._settings.setdefault(guild_id, {}).update(settings)
@@ -0,0 +1,302 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from .base import StorageBackend, advance_streak
+
+logger = logging.getLogger(__name__)
+
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data/drshamer.sqlite3")
+# Writes queued while a transaction is running are committed together in the next one
+SQLITE_MAX_BATCH = int(os.getenv("SQLITE_MAX_BATCH", "64"))
+
+# One row per (guild, day, kind, user). WITHOUT ROWID clusters the table on its primary key, so
+# day and date-range reads are range scans, and records_by_user holds every column, so
+# leaderboards and per-user history are answered from the index alone.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    guild_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    kind TEXT NOT NULL CHECK (kind IN ('wished', 'shamed')),
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (guild_id, date, kind, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS records_by_user ON records (guild_id, user_id, kind, date);
+CREATE TABLE IF NOT EXISTS rollups (
+    guild_id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    rollup TEXT NOT NULL,
+    PRIMARY KEY (guild_id, month)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS streaks (
+    guild_id INTEGER NOT NULL,
+    kind TEXT NOT NULL CHECK (kind IN ('wished', 'shamed')),
+    user_id TEXT NOT NULL,
+    last TEXT NOT NULL,
+    current INTEGER NOT NULL,
+    best INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, kind, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS streak_guilds (
+    guild_id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS guild_settings (
+    guild_id INTEGER PRIMARY KEY,
+    settings TEXT NOT NULL
+);
+"""
+
+def _open(path, readonly=False):
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA busy_timeout = 5000")
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+class SQLiteBackend(StorageBackend):
+    """A local SQLite database in WAL mode - for self-hosting, and cheap indexed reads.
+
+    Every write goes through one writer thread that owns the only writing connection and
+    commits whatever is queued as a single transaction. Reads use a connection per storage
+    executor thread and, thanks to WAL, never wait for the writer.
+    """
+    name = "sqlite"
+
+    def __init__(self, path=None):
+        self.path = path or SQLITE_PATH
+        self.stats = {"writes": 0, "transactions": 0}
+        self._queue = queue.SimpleQueue()
+        self._writer = None
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+
+    def connect(self):
+        if self._writer is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = _open(self.path)
+        mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        if mode.lower() != "wal":
+            raise RuntimeError(f"SQLite refused WAL mode for {self.path} (got {mode})")
+        # In WAL mode NORMAL only risks the last transactions on power loss, never corruption
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.executescript(SCHEMA)
+
+        self._writer = threading.Thread(target=self._write_loop, args=(conn,), name="sqlite-writer", daemon=True)
+        self._writer.start()
+        logger.info(f"🗄️ SQLite storage at {self.path} (journal mode {mode})")
+
+    def close(self):
+        if self._writer is None:
+            return
+        self._queue.put(None)
+        self._writer.join()
+        self._writer = None
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+        self._local = threading.local()
+
+    def _write_loop(self, conn):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < SQLITE_MAX_BATCH:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # Finish this batch, then stop
+                    break
+                batch.append(item)
+            self._commit_batch(conn, batch)
+        conn.execute("PRAGMA optimize")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.close()
+
+    def _commit_batch(self, conn, batch):
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for write, future in batch:
+                # A savepoint per write, so one failing write doesn't undo the others
+                conn.execute("SAVEPOINT write")
+                try:
+                    results.append((future, write(conn), None))
+                    conn.execute("RELEASE write")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write")
+                    conn.execute("RELEASE write")
+                    results.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.stats["writes"] += len(batch)
+        self.stats["transactions"] += 1
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _write(self, write):
+        """Run write(conn) on the writer thread and wait for its transaction to commit"""
+        if self._writer is None:
+            raise RuntimeError("SQLite backend is not connected")
+        future = Future()
+        self._queue.put((write, future))
+        return future.result()
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _open(self.path, readonly=True)
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def commit_records(self, guild_id, date_str, field_users):
+        def write(conn):
+            added = {}
+            for field, users in field_users.items():
+                new_users = [user_id for user_id in sorted(set(users))
+                             if conn.execute("INSERT OR IGNORE INTO records (guild_id, date, kind, user_id) VALUES (?, ?, ?, ?)",
+                                             (guild_id, date_str, field, user_id)).rowcount]
+                if new_users:
+                    added[field] = new_users
+            if added and conn.execute("SELECT 1 FROM streak_guilds WHERE guild_id = ?", (guild_id,)).fetchone():
+                for field, users in added.items():
+                    for user_id in users:
+                        row = conn.execute("SELECT last, current, best FROM streaks WHERE guild_id = ? AND kind = ? AND user_id = ?",
+                                           (guild_id, field, user_id)).fetchone()
+                        streak = advance_streak(dict(zip(("last", "current", "best"), row)) if row else None, date_str)
+                        conn.execute("INSERT OR REPLACE INTO streaks (guild_id, kind, user_id, last, current, best) VALUES (?, ?, ?, ?, ?, ?)",
+                                     (guild_id, field, user_id, streak["last"], streak["current"], streak["best"]))
+            return added
+        return self._write(write)
+
+    def import_days(self, guild_id, days):
+        """Bulk-insert {date_str: day log} for one guild in a single transaction; returns rows added"""
+        rows = [(guild_id, date_str, field, str(user_id))
+                for date_str, log in days.items() for field in ("wished", "shamed") for user_id in set(log.get(field, []))]
+
+        def write(conn):
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO records (guild_id, date, kind, user_id) VALUES (?, ?, ?, ?)", rows)
+            return conn.total_changes - before
+        return self._write(write)
+
+    def get_day_logs(self, guild_ids, date_str):
+        logs = {guild_id: {"wished": [], "shamed": []} for guild_id in guild_ids}
+        placeholders = ",".join("?" * len(guild_ids))
+        rows = self._reader().execute(
+            f"SELECT guild_id, kind, user_id FROM records WHERE date = ? AND guild_id IN ({placeholders}) ORDER BY guild_id, kind, user_id",
+            (date_str, *guild_ids))
+        for guild_id, kind, user_id in rows:
+            logs[guild_id][kind].append(user_id)
+        return logs
+
+    def get_day_range(self, guild_id, start_date, end_date):
+        days = {}
+        rows = self._reader().execute(
+            "SELECT date, kind, user_id FROM records WHERE guild_id = ? AND date BETWEEN ? AND ? ORDER BY date, kind, user_id",
+            (guild_id, start_date, end_date))
+        for date_str, kind, user_id in rows:
+            days.setdefault(date_str, {"wished": [], "shamed": []})[kind].append(user_id)
+        return days
+
+    def _counts(self, query, params):
+        counts = {"wished": {}, "shamed": {}}
+        for kind, user_id, days in self._reader().execute(query, params):
+            counts[kind][user_id] = days
+        return counts
+
+    def count_history(self, guild_id):
+        return self._counts("SELECT kind, user_id, COUNT(*) FROM records WHERE guild_id = ? GROUP BY user_id, kind", (guild_id,))
+
+    def count_range(self, guild_id, start_date, end_date):
+        return self._counts("SELECT kind, user_id, COUNT(*) FROM records WHERE guild_id = ? AND date BETWEEN ? AND ? GROUP BY kind, user_id",
+                            (guild_id, start_date, end_date))
+
+    def get_user_history(self, guild_id, user_id):
+        history = {"wished": [], "shamed": []}
+        rows = self._reader().execute(
+            "SELECT kind, date FROM records WHERE guild_id = ? AND user_id = ?",
+            (guild_id, str(user_id)))
+        for kind, date_str in rows:
+            history[kind].append(date_str)
+        # Sorted here rather than with ORDER BY, which tempts the planner into a primary key scan
+        for dates in history.values():
+            dates.sort()
+        return history
+
+    def get_aggregates(self, guild_id):
+        # Counted from the index on every read - there is no separate aggregate to keep in sync
+        return self.count_history(guild_id)
+
+    def set_aggregates(self, guild_id, counts):
+        pass  # Aggregates are always derived from the records table
+
+    def get_rollups(self, guild_id, months):
+        placeholders = ",".join("?" * len(months))
+        rows = self._reader().execute(f"SELECT month, rollup FROM rollups WHERE guild_id = ? AND month IN ({placeholders})", (guild_id, *months))
+        return {month: json.loads(rollup) for month, rollup in rows}
+
+    def set_rollup(self, guild_id, month, rollup):
+        self._write(lambda conn: conn.execute("INSERT OR REPLACE INTO rollups (guild_id, month, rollup) VALUES (?, ?, ?)",
+                                              (guild_id, month, json.dumps(rollup))))
+
+    def delete_rollup(self, guild_id, month):
+        self._write(lambda conn: conn.execute("DELETE FROM rollups WHERE guild_id = ? AND month = ?", (guild_id, month)))
+
+    def get_streaks(self, guild_id, user_ids=None):
+        reader = self._reader()
+        if not reader.execute("SELECT 1 FROM streak_guilds WHERE guild_id = ?", (guild_id,)).fetchone():
+            return None
+        query = "SELECT kind, user_id, last, current, best FROM streaks WHERE guild_id = ?"
+        params = (guild_id,)
+        if user_ids is not None:
+            query += f" AND user_id IN ({','.join('?' * len(user_ids))})"
+            params += tuple(str(user_id) for user_id in user_ids)
+        streaks = {"wished": {}, "shamed": {}}
+        for kind, user_id, last, current, best in reader.execute(query, params):
+            streaks[kind][user_id] = {"last": last, "current": current, "best": best}
+        return streaks
+
+    def set_streaks(self, guild_id, streaks):
+        rows = [(guild_id, field, user_id, streak["last"], streak["current"], streak["best"])
+                for field, field_streaks in streaks.items() for user_id, streak in field_streaks.items()]
+
+        def write(conn):
+            conn.execute("DELETE FROM streaks WHERE guild_id = ?", (guild_id,))
+            conn.executemany("INSERT INTO streaks (guild_id, kind, user_id, last, current, best) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("INSERT OR IGNORE INTO streak_guilds (guild_id) VALUES (?)", (guild_id,))
+        self._write(write)
+
+    def load_guild_settings(self, guild_ids):
+        placeholders = ",".join("?" * len(guild_ids))
+        rows = self._reader().execute(f"SELECT guild_id, settings FROM guild_settings WHERE guild_id IN ({placeholders})", tuple(guild_ids))
+        return {guild_id: json.loads(settings) for guild_id, settings in rows}
+
+    def save_guild_settings(self, guild_id, settings):
+        def write(conn):
+            row = conn.execute("SELECT settings FROM guild_settings WHERE guild_id = ?", (guild_id,)).fetchone()
+            merged = {**(json.loads(row[0]) if row else {}), **settings}
+            conn.execute("INSERT OR REPLACE INTO guild_settings (guild_id, settings) VALUES (?, ?)", (guild_id, json.dumps(merged)))
+        self._write(write)
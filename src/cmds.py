@@ -1,11 +1,64 @@
-from .config import config
-from .utils import get_dev_channel_name, get_server_tag
-from .firestore_db import get_leaderboard
+import logging
+import os
+import re
+import time
+from datetime import date, timedelta
+from .config import config, SHAME_ROLE_MODE_CONFIG
+from .utils import get_dev_channel_name, get_server_tag, get_shame_role_mode, get_guild_capabilities
+from .watchdog import format_handler_stats
+from .sharding import register_guild_state
+from .member_cache import get_display_names
+from .wish_clock import parse_clock_time, reset_clock
+from .firestore_db import LEADERBOARD_SIZE, get_leaderboard, rebuild_leaderboard_stats, check_leaderboard_stats, save_guild_settings, add_record_listener, get_today_date, get_streaks, rebuild_streaks
+
+logger = logging.getLogger(__name__)
+
+# Rendered leaderboards per guild, dropped whenever that guild's records change.
+# The TTL is only a safety net (e.g. for display name changes).
+LEADERBOARD_CACHE_TTL = int(os.getenv("LEADERBOARD_CACHE_TTL", "3600"))
+leaderboard_cache = register_guild_state("leaderboards", {})  # guild_id -> {(today, start_date, end_date): {"cached_at": monotonic, "leaderboard": dict, "description": str}}
+leaderboard_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+# Bumped on every invalidation, so a leaderboard read that a flush overtook is not cached
+leaderboard_generations = register_guild_state("leaderboard_generations", {})  # guild_id -> int
+
+def invalidate_leaderboard_cache(guild_id):
+    """Drop a guild's cached leaderboard (called when its records change)"""
+    leaderboard_generations[guild_id] = leaderboard_generations.get(guild_id, 0) + 1
+    if leaderboard_cache.pop(guild_id, None) is not None:
+        leaderboard_cache_stats["invalidations"] += 1
+
+add_record_listener(invalidate_leaderboard_cache)
+
+MONTH_PATTERN = re.compile(r'^(\d{4})-(\d{2})$')
+
+def parse_leaderboard_window(arg, today):
+    """Resolve a `rank` window (week, month, year or YYYY-MM) to (title, start_date, end_date), or None if invalid"""
+    today_date = date.fromisoformat(today)
+    if arg is None:
+        return "All Time", None, None
+    if arg == "week":
+        return "This Week", (today_date - timedelta(days=today_date.weekday())).isoformat(), today
+    if arg == "month":
+        return "This Month", today_date.replace(day=1).isoformat(), today
+    if arg == "year":
+        return "This Year", today_date.replace(month=1, day=1).isoformat(), today
+    
+    match = MONTH_PATTERN.match(arg)
+    if not match or not 1 <= int(match.group(2)) <= 12:
+        return None
+    start = date(int(match.group(1)), int(match.group(2)), 1)
+    end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return start.strftime("%B %Y"), start.isoformat(), end.isoformat()
+
+def get_leaderboard_cache_hit_rate():
+    """Fraction of leaderboard requests served from the cache"""
+    total = leaderboard_cache_stats["hits"] + leaderboard_cache_stats["misses"]
+    return leaderboard_cache_stats["hits"] / total if total else 0.0
 
 async def handle_bot_mention(message, server_tag, guild_id, bot):
     """Handle mentions of the bot for commands"""
     # Only allow commands in dev channels
-    is_dev_channel = message.channel.name == get_dev_channel_name(guild_id)
+    is_dev_channel = message.channel.id == get_guild_capabilities(message.guild, bot).dev_channel_id
     if not is_dev_channel:
         await message.channel.send(f"⚠️ Bot commands can only be used in the dev channel: #{get_dev_channel_name(guild_id)}")
         return
@@ -26,29 +79,51 @@ async def handle_bot_mention(message, server_tag, guild_id, bot):
         await set_buffer_time(message, parts[2], server_tag)
     elif len(parts) >= 3 and parts[0] == "set" and parts[1] == "summarydelay":
         await set_summary_delay(message, parts[2], server_tag)
+    elif len(parts) >= 3 and parts[0] == "set" and parts[1] == "rolemode":
+        await set_role_mode(message, parts[2], server_tag, guild_id)
+    elif len(parts) >= 2 and parts[0] == "rank" and parts[1] == "rebuild":
+        await rebuild_leaderboard(message, server_tag, guild_id)
+    elif len(parts) >= 2 and parts[0] == "rank" and parts[1] == "check":
+        await check_leaderboard(message, server_tag, guild_id)
     elif len(parts) >= 1 and parts[0] == "rank":
-        await show_leaderboard(message, server_tag, guild_id)
+        await show_leaderboard(message, server_tag, guild_id, parts[1] if len(parts) >= 2 else None)
+    elif len(parts) >= 2 and parts[0] == "streak" and parts[1] == "rebuild":
+        await rebuild_streak_stats(message, server_tag, guild_id)
+    elif len(parts) >= 1 and parts[0] == "streak":
+        await show_streak(message, server_tag, guild_id, bot)
+    elif len(parts) >= 1 and parts[0] == "timings":
+        await message.channel.send(format_handler_stats())
     else:
-        await message.channel.send(f"🤖 Available commands:\n• `@{bot.user.display_name} set wishtime HH:MM` - Set the wish time (e.g., 11:11)\n• `@{bot.user.display_name} set shametime HH:MM` - Set the shame summary time (e.g., 22:22)\n• `@{bot.user.display_name} set buffer N` - Set the buffer time in seconds (e.g., 20)\n• `@{bot.user.display_name} set summarydelay N` - Set the summary delay in seconds (e.g., 180)\n• `@{bot.user.display_name} rank` - Show leaderboard of top wishers and shamers")
+        await message.channel.send(f"🤖 Available commands:\n• `@{bot.user.display_name} set wishtime HH:MM` - Set the wish time (e.g., 11:11)\n• `@{bot.user.display_name} set shametime HH:MM` - Set the shame summary time (e.g., 22:22)\n• `@{bot.user.display_name} set buffer N` - Set the buffer time in seconds (e.g., 20)\n• `@{bot.user.display_name} set summarydelay N` - Set the summary delay in seconds (e.g., 180)\n• `@{bot.user.display_name} set rolemode remove|rotate` - Clear the shame role member by member, or by recreating the role\n• `@{bot.user.display_name} rank` - Show leaderboard of top wishers and shamers\n• `@{bot.user.display_name} rank week|month|year|YYYY-MM` - Show the leaderboard for this week, month, year or a given month\n• `@{bot.user.display_name} rank rebuild` - Rebuild leaderboard totals from the daily logs\n• `@{bot.user.display_name} rank check` - Check leaderboard totals against the daily logs\n• `@{bot.user.display_name} streak [@user]` - Show current and longest wish and shame streaks\n• `@{bot.user.display_name} streak rebuild` - Recompute streaks from the daily logs\n• `@{bot.user.display_name} timings` - Show handler latency percentiles and event-loop lag")
+
+def is_clock_time(value):
+    """Whether a command argument is a valid HH:MM time"""
+    try:
+        parse_clock_time(value)
+        return len(value) == 5
+    except ValueError:
+        return False
 
 async def set_wish_time(message, new_time, server_tag):
     """Set the wish time with basic validation"""
-    # Basic validation - just check if it's HH:MM format
-    if len(new_time) == 5 and new_time[2] == ':':
+    # Basic validation - a HH:MM time the wish clock can use
+    if is_clock_time(new_time):
         old_time = config.WISH_TIME
         config.WISH_TIME = new_time
-        print(f"{server_tag} ⏰ Wish time changed from {old_time} to {config.WISH_TIME} by {message.author.name}")
+        reset_clock()
+        logger.info(f"{server_tag} ⏰ Wish time changed from {old_time} to {config.WISH_TIME} by {message.author.name}")
         await message.channel.send(f"✅ Wish time updated to **{config.WISH_TIME}**! 🕐")
     else:
         await message.channel.send(f"❌ Invalid time format! Please use HH:MM format (e.g., 11:11)")
 
 async def set_shame_time(message, new_time, server_tag, bot):
     """Set the shame time with basic validation"""
-    # Basic validation - just check if it's HH:MM format
-    if len(new_time) == 5 and new_time[2] == ':':
+    # Basic validation - a HH:MM time the wish clock can use
+    if is_clock_time(new_time):
         old_time = config.SHAME_TIME
         config.SHAME_TIME = new_time
-        print(f"{server_tag} 🔔 Shame time changed from {old_time} to {config.SHAME_TIME} by {message.author.name}")
+        reset_clock()
+        logger.info(f"{server_tag} 🔔 Shame time changed from {old_time} to {config.SHAME_TIME} by {message.author.name}")
         
         # Restart the shame summary task with new time
         from .shame_summary import restart_shame_summary_task
@@ -64,7 +139,8 @@ async def set_buffer_time(message, new_buffer, server_tag):
     if new_buffer.isdigit():
         old_buffer = config.WISH_BUFFER_TIME
         config.WISH_BUFFER_TIME = int(new_buffer)
-        print(f"{server_tag} ⏱️ Buffer time changed from {old_buffer}s to {config.WISH_BUFFER_TIME}s by {message.author.name}")
+        reset_clock()
+        logger.info(f"{server_tag} ⏱️ Buffer time changed from {old_buffer}s to {config.WISH_BUFFER_TIME}s by {message.author.name}")
         await message.channel.send(f"✅ Buffer time updated to **{config.WISH_BUFFER_TIME} seconds**! (Total window: {60 + config.WISH_BUFFER_TIME}s)")
     else:
         await message.channel.send(f"❌ Invalid number! Please use a number (e.g., 20)") 
@@ -75,53 +151,102 @@ async def set_summary_delay(message, new_delay, server_tag):
     if new_delay.isdigit():
         old_delay = config.WISH_SUMMARY_DELAY
         config.WISH_SUMMARY_DELAY = int(new_delay)
-        print(f"{server_tag} ⏰ Summary delay changed from {old_delay}s to {config.WISH_SUMMARY_DELAY}s by {message.author.name}")
+        logger.info(f"{server_tag} ⏰ Summary delay changed from {old_delay}s to {config.WISH_SUMMARY_DELAY}s by {message.author.name}")
         await message.channel.send(f"✅ Summary delay updated to **{config.WISH_SUMMARY_DELAY} seconds**!")
     else:
         await message.channel.send(f"❌ Invalid number! Please use a number (e.g., 180)")
 
-async def show_leaderboard(message, server_tag, guild_id):
-    """Show the leaderboard of top wishers and shamers"""
+async def set_role_mode(message, new_mode, server_tag, guild_id):
+    """Set how the shame role is cleared for this server"""
+    if new_mode not in ("remove", "rotate"):
+        await message.channel.send(f"❌ Invalid role mode! Please use `remove` or `rotate`")
+        return
+    
+    old_mode = get_shame_role_mode(guild_id)
+    SHAME_ROLE_MODE_CONFIG[guild_id] = new_mode
+    logger.info(f"{server_tag} 🔄 Shame role mode changed from {old_mode} to {new_mode} by {message.author.name}")
+    
+    saved = await save_guild_settings(guild_id, shame_role_mode=new_mode)
+    note = "" if saved else "\n⚠️ Could not save the setting - it will reset on restart."
+    if new_mode == "rotate":
+        await message.channel.send(f"✅ Role mode updated to **rotate**! The shame role will be recreated on each fresh start (needs permission to move roles).{note}")
+    else:
+        await message.channel.send(f"✅ Role mode updated to **remove**! The shame role will be removed member by member.{note}")
+
+def format_streak(streak):
+    """Leaderboard suffix for a user's current and best streak (empty without one)"""
+    if not streak or not streak["best"]:
+        return ""
+    return f" · 🔥 {streak['current']} (best {streak['best']})"
+
+def render_leaderboard(guild, leaderboard, title="All Time", names=None):
+    """Format the leaderboard as embed text"""
+    top_wishers = leaderboard["top_wishers"][:LEADERBOARD_SIZE]  # Top 10
+    top_shamers = leaderboard["top_shamers"][:LEADERBOARD_SIZE]  # Top 10
+    streaks = leaderboard.get("streaks", {})
+    names = names or {}
+    
+    # Format the leaderboard message
+    embed_description = f"🏆 **Wish & Shame Leaderboard - {title}** 🏆\n\n"
+    
+    # Top Wishers section
+    embed_description += "✨ **Top Wishers:**\n"
+    if top_wishers:
+        for i, (user_id, count) in enumerate(top_wishers, 1):
+            display_name = names.get(str(user_id), f"<@{user_id}>")
+            
+            medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
+            embed_description += f"{medal} {display_name}: {count} day(s){format_streak(streaks.get('wished', {}).get(user_id))}\n"
+    else:
+        embed_description += "No wishers yet!\n"
+    
+    # Top Shamers section
+    embed_description += "\n🔔 **Top Shamers:**\n"
+    if top_shamers:
+        for i, (user_id, count) in enumerate(top_shamers, 1):
+            display_name = names.get(str(user_id), f"<@{user_id}>")
+            
+            medal = "💩" if i == 1 else "🤡" if i == 2 else "😤" if i == 3 else f"{i}."
+            embed_description += f"{medal} {display_name}: {count} day(s){format_streak(streaks.get('shamed', {}).get(user_id))}\n"
+    else:
+        embed_description += "No shamers yet!\n"
+    
+    embed_description += f"\n*Each day counts as 1 point maximum · 🔥 current streak (best streak)*"
+    return embed_description
+
+async def get_leaderboard_description(guild, title="All Time", start_date=None, end_date=None):
+    """Get the rendered leaderboard for a guild and window, from the cache when it is still valid"""
+    # Keyed by today as well: windows move and current streaks lapse when the day rolls over
+    key = (get_today_date(), start_date, end_date)
+    cached = leaderboard_cache.get(guild.id, {}).get(key)
+    if cached and time.monotonic() - cached["cached_at"] < LEADERBOARD_CACHE_TTL:
+        leaderboard_cache_stats["hits"] += 1
+        return cached["description"], True
+    
+    leaderboard_cache_stats["misses"] += 1
+    generation = leaderboard_generations.get(guild.id, 0)
+    leaderboard = await get_leaderboard(guild.id, start_date, end_date)
+    if leaderboard is None:
+        raise RuntimeError("leaderboard unavailable")  # Don't cache a failure
+    # Only the shown users' names are needed - fetched in batches when they are not cached
+    shown = [user_id for user_id, _ in leaderboard["top_wishers"][:LEADERBOARD_SIZE] + leaderboard["top_shamers"][:LEADERBOARD_SIZE]]
+    description = render_leaderboard(guild, leaderboard, title, await get_display_names(guild, shown))
+    if leaderboard_generations.get(guild.id, 0) == generation:
+        # Only cached when no records landed while it was read - otherwise it is shown but not kept
+        leaderboard_cache.setdefault(guild.id, {})[key] = {"cached_at": time.monotonic(), "leaderboard": leaderboard, "description": description}
+    return description, False
+
+async def show_leaderboard(message, server_tag, guild_id, window=None):
+    """Show the leaderboard of top wishers and shamers, all-time or for a window"""
+    resolved = parse_leaderboard_window(window, get_today_date())
+    if resolved is None:
+        await message.channel.send("❌ Unknown leaderboard period. Use `rank`, `rank week`, `rank month`, `rank year` or `rank YYYY-MM` (e.g. `rank 2025-07`).")
+        return
+    title, start_date, end_date = resolved
+    
     try:
-        leaderboard = get_leaderboard(guild_id)
-        
-        top_wishers = leaderboard["top_wishers"][:10]  # Top 10
-        top_shamers = leaderboard["top_shamers"][:10]  # Top 10
-        
-        # Format the leaderboard message
-        embed_description = "🏆 **Wish & Shame Leaderboard** 🏆\n\n"
-        
-        # Top Wishers section
-        embed_description += "✨ **Top Wishers:**\n"
-        if top_wishers:
-            for i, (user_id, count) in enumerate(top_wishers, 1):
-                try:
-                    user = message.guild.get_member(int(user_id))
-                    display_name = user.display_name if user else f"<@{user_id}>"
-                except (ValueError, TypeError):
-                    display_name = f"<@{user_id}>"
-                
-                medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
-                embed_description += f"{medal} {display_name}: {count} day(s)\n"
-        else:
-            embed_description += "No wishers yet!\n"
-        
-        # Top Shamers section
-        embed_description += "\n🔔 **Top Shamers:**\n"
-        if top_shamers:
-            for i, (user_id, count) in enumerate(top_shamers, 1):
-                try:
-                    user = message.guild.get_member(int(user_id))
-                    display_name = user.display_name if user else f"<@{user_id}>"
-                except (ValueError, TypeError):
-                    display_name = f"<@{user_id}>"
-                
-                medal = "💩" if i == 1 else "🤡" if i == 2 else "😤" if i == 3 else f"{i}."
-                embed_description += f"{medal} {display_name}: {count} day(s)\n"
-        else:
-            embed_description += "No shamers yet!\n"
-        
-        embed_description += f"\n*Each day counts as 1 point maximum*"
+        started = time.perf_counter()
+        embed_description, cache_hit = await get_leaderboard_description(message.guild, title, start_date, end_date)
         
         # Create and send embed
         import discord
@@ -133,8 +258,64 @@ async def show_leaderboard(message, server_tag, guild_id):
         embed.set_footer(text="Leaderboard")
         
         await message.channel.send(embed=embed)
-        print(f"{server_tag} 📊 Sent leaderboard to {message.author.name}")
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"{server_tag} 📊 Sent {title.lower()} leaderboard to {message.author.name} in {elapsed_ms:.0f}ms (cache {'hit' if cache_hit else 'miss'}, hit rate {get_leaderboard_cache_hit_rate():.0%})")
         
     except Exception as e:
-        print(f"{server_tag} ❌ Failed to show leaderboard: {e}")
-        await message.channel.send(f"❌ Failed to retrieve leaderboard. Please try again later.")
\ No newline at end of file
+        logger.error(f"{server_tag} ❌ Failed to show leaderboard: {e}")
+        await message.channel.send(f"❌ Failed to retrieve leaderboard. Please try again later.")
+
+async def rebuild_leaderboard(message, server_tag, guild_id):
+    """Rebuild the aggregate leaderboard counts from the daily logs"""
+    await message.channel.send("🔧 Rebuilding leaderboard totals from the daily logs...")
+    counts = await rebuild_leaderboard_stats(guild_id)
+    if counts is None:
+        await message.channel.send("❌ Failed to rebuild leaderboard totals. Please try again later.")
+        return
+    
+    logger.info(f"{server_tag} 🔧 Leaderboard totals rebuilt by {message.author.name}")
+    await message.channel.send(f"✅ Leaderboard totals rebuilt: **{len(counts['wished'])}** wishers, **{len(counts['shamed'])}** shamers")
+
+async def check_leaderboard(message, server_tag, guild_id):
+    """Check the aggregate leaderboard counts against the daily logs"""
+    mismatches = await check_leaderboard_stats(guild_id)
+    if mismatches is None:
+        await message.channel.send("❌ Failed to check leaderboard totals. Please try again later.")
+        return
+    
+    if not mismatches:
+        await message.channel.send("✅ Leaderboard totals match the daily logs")
+        return
+    
+    lines = [f"• {field} <@{user_id}>: stored {stored}, expected {expected}" for field, user_id, stored, expected in mismatches[:10]]
+    if len(mismatches) > 10:
+        lines.append(f"• ...and {len(mismatches) - 10} more")
+    logger.warning(f"{server_tag} ⚠️ Leaderboard totals have {len(mismatches)} mismatch(es)")
+    await message.channel.send(f"⚠️ Found **{len(mismatches)}** mismatch(es) between leaderboard totals and daily logs:\n" + "\n".join(lines) + "\nRun `rank rebuild` to fix them.")
+
+async def show_streak(message, server_tag, guild_id, bot):
+    """Show the current and longest wish and shame streaks of the author or a mentioned user"""
+    mentioned = [user for user in message.mentions if user.id != bot.user.id]
+    user = mentioned[0] if mentioned else message.author
+    streaks = await get_streaks(guild_id, [user.id])
+    if streaks is None:
+        await message.channel.send("❌ Failed to retrieve streaks. Please try again later.")
+        return
+    
+    wished = streaks["wished"].get(str(user.id), {"current": 0, "best": 0})
+    shamed = streaks["shamed"].get(str(user.id), {"current": 0, "best": 0})
+    logger.info(f"{server_tag} 🔥 Sent streaks for {user.name} to {message.author.name}")
+    await message.channel.send(f"🔥 **{user.display_name}**\n"
+                               f"✨ Wish streak: **{wished['current']}** day(s) in a row (longest {wished['best']})\n"
+                               f"🔔 Shame streak: **{shamed['current']}** day(s) in a row (longest {shamed['best']})")
+
+async def rebuild_streak_stats(message, server_tag, guild_id):
+    """Recompute the guild's streaks from the daily logs"""
+    await message.channel.send("🔧 Recomputing streaks from the daily logs...")
+    streaks = await rebuild_streaks(guild_id)
+    if streaks is None:
+        await message.channel.send("❌ Failed to rebuild streaks. Please try again later.")
+        return
+    
+    logger.info(f"{server_tag} 🔧 Streaks rebuilt by {message.author.name}")
+    await message.channel.send(f"✅ Streaks rebuilt: **{len(streaks['wished'])}** wishers, **{len(streaks['shamed'])}** shamers")
@@ -58,4 +58,17 @@ SHAME_SUMMARY_CHANNEL_CONFIG = {
     1390289538613772400: "dr-shamer-dev", # JJ's test server - same as dev
     1343509963812769832: "dr-shamer-dev", # The Post Office - same as dev
     # Add more servers as needed - default to dev channel for new servers
-} 
\ No newline at end of file
+} 
+
+# Configuration - How the shame role is cleared when a new wish starts
+#   "remove" - remove the role from each member (one API call per shamed member)
+#   "rotate" - recreate the role and delete the old one (a few API calls however many are shamed)
+SHAME_ROLE_MODE_CONFIG = {
+    168316445569056768: "remove",   # London server
+    1390289538613772400: "remove",  # JJ's test server
+    1343509963812769832: "remove",  # The Post Office
+    # Add more servers as needed - default to remove for new servers
+}
+
+# Below this many role holders, per-member removal is cheaper than rotating the role
+ROLE_ROTATION_MIN_HOLDERS = 4
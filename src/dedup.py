@@ -0,0 +1,127 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+class RecentEventCache:
+    """Bounded set of recently seen event keys (e.g. message IDs) with LRU and TTL eviction"""
+
+    def __init__(self, max_size=1024, ttl=600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # key -> last seen (monotonic). Refreshed on every hit and kept in that order,
+        # so the front always holds the entry that expires first.
+        self._entries = OrderedDict()
+
+    def seen(self, key):
+        """Return True if the key was seen recently, otherwise remember it and return False"""
+        now = time.monotonic()
+        entries = self._entries
+        last_seen = entries.get(key)
+        is_duplicate = last_seen is not None and now - last_seen <= self.ttl
+
+        entries[key] = now
+        entries.move_to_end(key)
+        if is_duplicate:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._evict(now)
+        return is_duplicate
+
+    def _evict(self, now):
+        entries = self._entries
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+        while entries:
+            oldest_key, last_seen = next(iter(entries.items()))
+            if now - last_seen <= self.ttl:
+                break
+            del entries[oldest_key]
+
+    def stats(self):
+        """Hit/miss counters, where a hit is a redelivered event that was skipped"""
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        last_seen = self._entries.get(key)
+        return last_seen is not None and time.monotonic() - last_seen <= self.ttl
+
+class RecentValueCache:
+    """Bounded map of recent keys to values (e.g. message ID -> wish classification) with LRU and TTL eviction"""
+
+    def __init__(self, max_size=4096, ttl=86400):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # key -> (stored at (monotonic), value), least recently used first
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """The cached value, or None when the key is unknown or expired"""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value):
+        now = time.monotonic()
+        entries = self._entries
+        entries[key] = (now, value)
+        entries.move_to_end(key)
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+
+    def stats(self):
+        """Hit/miss counters, where a hit is a lookup answered from the cache"""
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._entries)
+
+class SingleFlight:
+    """Concurrent calls with the same key share one in-flight run instead of repeating the work"""
+
+    def __init__(self, on_call=None):
+        self.started = 0
+        self.joined = 0
+        # Called with (key, joined) for every call, e.g. to count them in a metric
+        self.on_call = on_call
+        # key -> task of the run in flight; removed as soon as it finishes, so later calls start a fresh run
+        self._in_flight = {}
+
+    async def run(self, key, start):
+        """Await `start()` (a coroutine factory), or join the run already in flight for `key`"""
+        task = self._in_flight.get(key)
+        joined = task is not None
+        if joined:
+            self.joined += 1
+        else:
+            self.started += 1
+            task = self._in_flight[key] = asyncio.ensure_future(start())
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        if self.on_call:
+            self.on_call(key, joined)
+        # A cancelled caller must not cancel the run the others are waiting on
+        return await asyncio.shield(task)
+
+    def in_flight(self, key):
+        return key in self._in_flight
+
+    def stats(self):
+        """Runs started and calls that joined one (each join is work not repeated)"""
+        return {"in_flight": len(self._in_flight), "started": self.started, "joined": self.joined}
+
+    def __len__(self):
+        return len(self._in_flight)
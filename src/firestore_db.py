@@ -1,132 +1,638 @@
-from google.cloud import firestore
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from .backends import create_backend, EMPTY_DAY, advance_streak
 from .config import LONDON_TZ
+from .metrics import STORAGE_LATENCY, STORAGE_ERRORS, BACKGROUND_TASKS_STARTED
+from .sharding import register_guild_state
+from . import journal
+import asyncio
+import calendar
+import logging
 import os
+import time
 
-# Initialize Firestore client
-db = None
+logger = logging.getLogger(__name__)
 
-def init_firestore():
-    """Initialize Firestore client"""
-    global db
+# Storage backend (see src/backends): "firestore" (default), "sqlite" or "memory"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore")
+STORAGE_INIT_ATTEMPTS = int(os.getenv("STORAGE_INIT_ATTEMPTS", "3"))
+# Once start-up gave up on connecting, the record flush tries again: after the interval at first,
+# doubling up to the max between failed attempts
+STORAGE_RECONNECT_INTERVAL = float(os.getenv("STORAGE_RECONNECT_INTERVAL", "30"))
+STORAGE_RECONNECT_MAX_INTERVAL = float(os.getenv("STORAGE_RECONNECT_MAX_INTERVAL", "600"))
+backend = None
+_connecting = False
+_reconnect_at = 0.0
+_reconnect_delay = 0.0
+
+# Firestore's client is synchronous (gRPC), so every blocking backend call runs on this small
+# dedicated pool instead of the discord.py event loop. Calls that take longer than the timeout
+# are abandoned by the caller; the pool size bounds how many can pile up behind a slow backend.
+FIRESTORE_TIMEOUT = float(os.getenv("FIRESTORE_TIMEOUT", "10"))
+FIRESTORE_WORKERS = int(os.getenv("FIRESTORE_WORKERS", "4"))
+# Wishers and shamers shown per leaderboard - only their streaks are read
+LEADERBOARD_SIZE = 10
+_executor = ThreadPoolExecutor(max_workers=FIRESTORE_WORKERS, thread_name_prefix="storage")
+
+async def _run_blocking(func, *args, timeout=FIRESTORE_TIMEOUT):
+    """Run a backend method on the storage executor with a timeout (inline for non-blocking backends)"""
+    owner = getattr(func, "__self__", backend)
+    labels = {"backend": owner.name, "operation": func.__name__.strip("_")}
+    try:
+        with STORAGE_LATENCY.time(**labels):
+            if not owner.blocking:
+                return func(*args)
+            loop = asyncio.get_running_loop()
+            return await asyncio.wait_for(loop.run_in_executor(_executor, func, *args), timeout)
+    except Exception:
+        STORAGE_ERRORS.inc(**labels)
+        raise
+
+async def init_firestore(new_backend=None, attempts=STORAGE_INIT_ATTEMPTS):
+    """Connect the storage backend selected by STORAGE_BACKEND (or the one given); True on success"""
+    global _connecting, _reconnect_at
+    if backend and new_backend is None:
+        return True  # Already connected - one client per process
+    
+    _connecting = True
+    try:
+        connected = await _connect(new_backend, attempts)
+    finally:
+        _connecting = False
+    if not connected:
+        # Everything keeps working without storage (records are buffered, reads come back empty),
+        # but /healthz reports it and every call logs why; the record flush tries connecting again later
+        _reconnect_at = max(_reconnect_at, time.monotonic() + STORAGE_RECONNECT_INTERVAL)
+    return connected
+
+async def _connect(new_backend, attempts):
+    global backend
     try:
-        db = firestore.Client()
-        print("✅ Firestore client initialized")
+        # Importing the backend module (e.g. the Firestore/gRPC stack) takes a while, so keep it off the event loop
+        candidate = new_backend or await asyncio.get_running_loop().run_in_executor(_executor, create_backend, STORAGE_BACKEND)
     except Exception as e:
-        print(f"❌ Failed to initialize Firestore: {e}")
-        db = None
+        logger.error("❌ Failed to load storage backend '%s': %s", STORAGE_BACKEND, e, extra={"event": "storage_init_failed"})
+        backend = None
+        return False
+    
+    for attempt in range(1, attempts + 1):
+        try:
+            await _run_blocking(candidate.connect)
+            backend = candidate
+            today_logs.clear()
+            logger.info("✅ %s storage backend initialized", candidate.name, extra={"event": "storage_ready", "backend": candidate.name})
+            return True
+        except Exception as e:
+            logger.error("❌ Failed to initialize %s storage (attempt %s/%s): %s", candidate.name, attempt, attempts, e,
+                         extra={"event": "storage_init_failed", "backend": candidate.name})
+            if attempt < attempts:
+                await asyncio.sleep(2 ** attempt)
+    
+    backend = None
+    return False
 
-def get_guild_log(guild_id):
-    """Get the daily collection for a specific guild"""
-    if not db:
-        return None
-    return db.collection("wish_log").document(str(guild_id)).collection("daily")
+async def _reconnect_storage():
+    """Try connecting storage again if the backoff allows it; True once connected"""
+    global _reconnect_at, _reconnect_delay
+    if backend:
+        return True
+    now = time.monotonic()
+    if _connecting or now < _reconnect_at:
+        return False  # Start-up is still connecting, or the last attempt was too recent
+    
+    _reconnect_delay = min(max(_reconnect_delay * 2, STORAGE_RECONNECT_INTERVAL), STORAGE_RECONNECT_MAX_INTERVAL)
+    _reconnect_at = now + _reconnect_delay
+    if await init_firestore(attempts=1):
+        _reconnect_delay = 0.0
+        return True
+    logger.warning("⚠️ Storage still not connected, keeping %s pending record(s); next attempt in %.0fs", _pending_count, _reconnect_delay,
+                   extra={"event": "record_flush_deferred", "count": _pending_count})
+    return False
+
+async def close_storage():
+    """Flush buffered records and release the backend's clients/files"""
+    global backend
+    await flush_pending_records()
+    if backend:
+        storage, backend = backend, None
+        try:
+            await _run_blocking(storage.close, timeout=None)
+        except Exception as e:
+            logger.error("❌ Failed to close %s storage: %s", storage.name, e)
+
+def get_storage_status():
+    """Which backend is configured and whether it is connected (for /healthz)"""
+    return {"backend": backend.name if backend else STORAGE_BACKEND, "ready": backend is not None}
 
 def get_today_date():
     """Get today's date in London timezone as YYYY-MM-DD"""
     london_time = datetime.now(LONDON_TZ)
     return london_time.strftime("%Y-%m-%d")
 
+# Write-behind buffer: records are coalesced per (guild, day, field) and flushed as one
+# transaction per guild-day, either on a short timer or once enough records are pending.
+RECORD_FLUSH_INTERVAL = float(os.getenv("RECORD_FLUSH_INTERVAL", "2"))
+RECORD_FLUSH_MAX_PENDING = int(os.getenv("RECORD_FLUSH_MAX_PENDING", "200"))
+# Records kept while they cannot be stored (storage down, commits failing); newer ones are dropped
+RECORD_BUFFER_MAX = int(os.getenv("RECORD_BUFFER_MAX", "50000"))
+
+pending_records = {}  # (guild_id, date_str, field) -> set of user IDs
+record_listeners = []  # callbacks(guild_id) run after a guild's stored wish/shame data changes
+record_stats = {"recorded": 0, "flushed": 0, "writes": 0, "coalesced": 0, "failed_writes": 0, "dropped": 0}
+_pending_count = 0
+_flush_task = None
+_urgent_flush_task = None
+_flush_lock = None
+
+# Today's stored day log per guild: filled by reads and kept current by this process's own flushes
+# (only the process running a guild's shard writes to it), so repeat reads of today skip storage
+today_logs = register_guild_state("today_logs", {})  # guild_id -> (date_str, {"wished": [...], "shamed": [...]})
+_commit_count = 0  # A read that overlaps a commit may predate it, so it is not cached
+
+def _get_flush_lock():
+    global _flush_lock
+    if _flush_lock is None:
+        _flush_lock = asyncio.Lock()
+    return _flush_lock
+
+def _queue_records(guild_id, date_str, field, user_ids):
+    global _pending_count
+    users = pending_records.setdefault((guild_id, date_str, field), set())
+    before = len(users)
+    users.update(user_ids)
+    _pending_count += len(users) - before
+    return len(users) - before
+
+async def _flush_after_delay():
+    # Keep going while records are left over (failed commits, storage not connected) - this task
+    # is still running when its own flush asks for a retry, so it cannot schedule another one.
+    # Without storage it waits for the next reconnect attempt instead of waking every interval.
+    while True:
+        await asyncio.sleep(RECORD_FLUSH_INTERVAL if backend else max(RECORD_FLUSH_INTERVAL, _reconnect_at - time.monotonic()))
+        await flush_pending_records()
+        if not pending_records:
+            return
+
+def _schedule_flush():
+    """Make sure a flush is coming: immediately if the buffer is full, otherwise after the interval"""
+    global _flush_task, _urgent_flush_task
+    if _pending_count >= RECORD_FLUSH_MAX_PENDING and backend:
+        if _urgent_flush_task is None or _urgent_flush_task.done():
+            _urgent_flush_task = asyncio.create_task(flush_pending_records())
+            BACKGROUND_TASKS_STARTED.inc(kind="record_flush")
+    elif _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.create_task(_flush_after_delay())
+        BACKGROUND_TASKS_STARTED.inc(kind="record_flush")
+
+def add_record_listener(callback):
+    """Register a callback(guild_id) to run whenever a guild's stored wish/shame data changes"""
+    record_listeners.append(callback)
+
+def _notify_record_listeners(guild_id):
+    for callback in record_listeners:
+        try:
+            callback(guild_id)
+        except Exception as e:
+            logger.error("❌ Record listener %s failed for guild %s: %s", callback.__name__, guild_id, e)
+
 async def record_user(guild_id, user_id, on_time=True):
-    """Record a user as either wished on time or shamed"""
-    if not db:
-        print("❌ Firestore not initialized, cannot record user")
+    """Record a user as either wished on time or shamed (buffered, written on the next flush)"""
+    # Buffered and journaled even while storage is not connected - the flush reconnects and stores them,
+    # up to RECORD_BUFFER_MAX records
+    if _pending_count >= RECORD_BUFFER_MAX:
+        record_stats["dropped"] += 1
+        if record_stats["dropped"] == 1 or record_stats["dropped"] % 1000 == 0:
+            logger.error("❌ Record buffer full (%s pending), dropped %s record(s) so far", _pending_count, record_stats['dropped'],
+                         extra={"event": "record_dropped", "count": record_stats["dropped"]})
         return False
     
-    try:
-        today = get_today_date()
-        doc_ref = get_guild_log(guild_id).document(today)
-        field = "wished" if on_time else "shamed"
+    field = "wished" if on_time else "shamed"
+    date_str = get_today_date()
+    _queue_records(guild_id, date_str, field, [str(user_id)])
+    # Journaled until a flush stores it, so a restart in between does not lose it
+    journal.append("record", guild_id=guild_id, date=date_str, field=field, user_id=str(user_id))
+    record_stats["recorded"] += 1
+    _schedule_flush()
+    return True
+
+def replay_records(records):
+    """Queue records recovered from the journal for the next flush (users already stored are skipped by the commit)"""
+    if not records:
+        return 0
+    
+    queued = 0
+    for guild_id, date_str, field, user_id in records:
+        queued += _queue_records(guild_id, date_str, field, [user_id])
+    _schedule_flush()
+    logger.info("📼 Re-queued %s record(s) from the journal", queued, extra={"event": "journal_records_replayed", "count": queued})
+    return queued
+
+async def flush_pending_records():
+    """Write all buffered records to storage, one atomic commit per guild and day"""
+    global pending_records, _pending_count
+    async with _get_flush_lock():
+        if not pending_records:
+            return 0
+        if not await _reconnect_storage():
+            # Left in the buffer (and the journal) for the next attempt
+            _schedule_flush()
+            return 0
         
-        # Use arrayUnion to avoid duplicates
-        doc_ref.set({field: firestore.ArrayUnion([str(user_id)])}, merge=True)
-        print(f"✅ Recorded user {user_id} as {'wished' if on_time else 'shamed'} for guild {guild_id}")
-        return True
-    except Exception as e:
-        print(f"❌ Failed to record user {user_id}: {e}")
-        return False
+        batch, pending_records = pending_records, {}
+        record_count, _pending_count = _pending_count, 0
+        journaled_through = journal.journal_seq()  # Every journaled record up to here is in this batch
+        
+        # Group fields by document so each guild-day is a single write
+        documents = {}
+        for (guild_id, date_str, field), users in batch.items():
+            documents.setdefault((guild_id, date_str), {})[field] = users
+        
+        writes = 0
+        requeued = 0
+        for (guild_id, date_str), field_users in documents.items():
+            try:
+                added = await _run_blocking(backend.commit_records, guild_id, date_str, field_users)
+                writes += 1
+                for field, users in added.items():
+                    logger.info("✅ Recorded %s user(s) as %s for guild %s on %s", len(users), field, guild_id, date_str)
+                if added and date_str < get_today_date():
+                    # A late write to a day that may already be folded into its month's rollup
+                    await _run_blocking(backend.delete_rollup, guild_id, date_str[:7])
+                _merge_today_log(guild_id, date_str, added)
+                if added:
+                    _notify_record_listeners(guild_id)
+            except Exception as e:
+                # Put the records back so the next flush retries them
+                record_stats["failed_writes"] += 1
+                logger.error("❌ Failed to flush records for guild %s on %s: %s", guild_id, date_str, e)
+                for field, users in field_users.items():
+                    requeued += _queue_records(guild_id, date_str, field, users)
+        
+        flushed = record_count - requeued
+        record_stats["flushed"] += flushed
+        record_stats["writes"] += writes
+        record_stats["coalesced"] += max(flushed - writes, 0)
+        logger.info("💾 Flushed %s record(s) in %s write(s) (%s writes saved by coalescing so far)", flushed, writes, record_stats['coalesced'])
+        
+        if not requeued:
+            journal.ack(journaled_through)
+        if pending_records:
+            _schedule_flush()
+        return flushed
+
+def _merge_today_log(guild_id, date_str, added):
+    """Add just-committed users to the cached log of today, if that day is cached"""
+    global _commit_count
+    _commit_count += 1
+    cached = today_logs.get(guild_id)
+    if not cached or cached[0] != date_str:
+        return
+    for field, users in added.items():
+        cached[1][field] = cached[1].get(field, []) + [user_id for user_id in users if user_id not in cached[1].get(field, [])]
 
-def get_day_log(guild_id, date_str=None):
+async def _read_day_logs(guild_ids, date_str):
+    """Read day logs from storage, serving (and filling) today's from the cache"""
+    if date_str != get_today_date():
+        return await _run_blocking(backend.get_day_logs, guild_ids, date_str)
+    
+    logs = {}
+    missing = []
+    for guild_id in guild_ids:
+        cached = today_logs.get(guild_id)
+        if cached and cached[0] == date_str:
+            logs[guild_id] = {field: list(users) for field, users in cached[1].items()}
+        else:
+            missing.append(guild_id)
+    if missing:
+        commits_before = _commit_count
+        for guild_id, log in (await _run_blocking(backend.get_day_logs, missing, date_str)).items():
+            if _commit_count == commits_before:
+                today_logs[guild_id] = (date_str, {field: list(users) for field, users in log.items()})
+            logs[guild_id] = log
+    return logs
+
+async def get_day_log(guild_id, date_str=None):
     """Get the wish/shame log for a specific day"""
-    if not db:
-        return {"wished": [], "shamed": []}
+    if not backend:
+        return dict(EMPTY_DAY)
     
     try:
         if date_str is None:
             date_str = get_today_date()
         
-        doc = get_guild_log(guild_id).document(date_str).get()
-        return doc.to_dict() if doc.exists else {"wished": [], "shamed": []}
+        logs = await _read_day_logs([guild_id], date_str)
+        return logs[guild_id]
     except Exception as e:
-        print(f"❌ Failed to get day log for {date_str}: {e}")
-        return {"wished": [], "shamed": []}
+        logger.error("❌ Failed to get day log for %s: %s", date_str, e)
+        return dict(EMPTY_DAY)
 
-def get_daily_wishers(guild_id, date_str=None):
+async def get_daily_wishers(guild_id, date_str=None):
     """Get list of users who wished on time for a specific day"""
     try:
-        log = get_day_log(guild_id, date_str)
+        log = await get_day_log(guild_id, date_str)
         return log.get("wished", [])
     except Exception as e:
-        print(f"❌ Failed to get daily wishers for guild {guild_id}: {e}")
+        logger.error("❌ Failed to get daily wishers for guild %s: %s", guild_id, e)
         return []
 
-def get_daily_shamers(guild_id, date_str=None):
+async def get_daily_shamers(guild_id, date_str=None):
     """Get list of users who were shamed for a specific day"""
     try:
-        log = get_day_log(guild_id, date_str)
+        log = await get_day_log(guild_id, date_str)
         return log.get("shamed", [])
     except Exception as e:
-        print(f"❌ Failed to get daily shamers for guild {guild_id}: {e}")
+        logger.error("❌ Failed to get daily shamers for guild %s: %s", guild_id, e)
         return []
 
-def user_already_recorded_today(guild_id, user_id, field_type="wished"):
+async def get_day_logs(guild_ids, date_str=None):
+    """Get the wish/shame logs of several guilds for one day in a single batched read (None on failure)"""
+    if not backend:
+        return None
+    if not guild_ids:
+        return {}
+    
+    try:
+        if date_str is None:
+            date_str = get_today_date()
+        
+        return await _read_day_logs(list(guild_ids), date_str)
+    except Exception as e:
+        logger.error("❌ Failed to get day logs for %s guilds on %s: %s", len(guild_ids), date_str, e)
+        return None
+
+async def get_day_range(guild_id, start_date, end_date):
+    """Get a guild's logs for every recorded day between two dates, inclusive -> {date_str: log} (None on failure)"""
+    if not backend:
+        return None
+    
+    try:
+        return await _run_blocking(backend.get_day_range, guild_id, start_date, end_date)
+    except Exception as e:
+        logger.error("❌ Failed to get logs for guild %s from %s to %s: %s", guild_id, start_date, end_date, e)
+        return None
+
+async def get_range_counts(guild_id, start_date, end_date):
+    """Count days per user and field between two dates, inclusive -> {"wished": {user_id: n}, "shamed": {...}} (None on failure)"""
+    if not backend:
+        return None
+    
+    try:
+        return await _run_blocking(backend.count_range, guild_id, start_date, end_date)
+    except Exception as e:
+        logger.error("❌ Failed to count records for guild %s from %s to %s: %s", guild_id, start_date, end_date, e)
+        return None
+
+async def get_user_history(guild_id, user_id):
+    """Dates a user wished on time and was shamed -> {"wished": [date_str], "shamed": [date_str]} (None on failure)"""
+    if not backend:
+        return None
+    
+    try:
+        return await _run_blocking(backend.get_user_history, guild_id, user_id)
+    except Exception as e:
+        logger.error("❌ Failed to get history for user %s in guild %s: %s", user_id, guild_id, e)
+        return None
+
+def _recompute_streaks(storage, guild_id):
+    """Replay every daily log in order to seed a guild's streaks"""
+    streaks = {"wished": {}, "shamed": {}}
+    for date_str, log in sorted(storage.get_day_range(guild_id, "0000-00-00", "9999-99-99").items()):
+        for field, field_streaks in streaks.items():
+            for user_id in set(log.get(field, [])):
+                field_streaks[user_id] = advance_streak(field_streaks.get(user_id), date_str)
+    storage.set_streaks(guild_id, streaks)
+    return streaks
+
+async def rebuild_streaks(guild_id):
+    """Recompute a guild's streaks from its full history (seeds guilds that predate streak tracking)"""
+    if not backend:
+        logger.error("❌ Storage not initialized, cannot rebuild streaks")
+        return None
+    
+    try:
+        # Under the flush lock, so no record lands between the history scan and the rewrite
+        async with _get_flush_lock():
+            streaks = await _run_blocking(_recompute_streaks, backend, guild_id, timeout=None)
+        logger.info("🔥 Rebuilt streaks for guild %s: %s wishers, %s shamers", guild_id, len(streaks['wished']), len(streaks['shamed']))
+        _notify_record_listeners(guild_id)
+        return streaks
+    except Exception as e:
+        logger.error("❌ Failed to rebuild streaks for guild %s: %s", guild_id, e)
+        return None
+
+async def get_streaks(guild_id, user_ids=None):
+    """Current and longest streaks per field and user -> {"wished": {user_id: {"current", "best", "last"}}, ...} (None on failure)"""
+    if not backend:
+        return None
+    
+    try:
+        user_ids = [str(user_id) for user_id in user_ids] if user_ids is not None else None
+        streaks = await _run_blocking(backend.get_streaks, guild_id, user_ids)
+        if streaks is None:
+            logger.info("🔥 No streaks for guild %s yet, seeding from daily logs", guild_id)
+            streaks = await rebuild_streaks(guild_id)
+            if streaks is None:
+                return None
+        
+        # Streaks are only written when a record lands; one whose last day is before yesterday
+        # (London time) was broken when the day rolled over
+        yesterday = (date.fromisoformat(get_today_date()) - timedelta(days=1)).isoformat()
+        return {field: {user_id: {**streak, "current": streak["current"] if streak["last"] >= yesterday else 0}
+                        for user_id, streak in field_streaks.items() if user_ids is None or user_id in user_ids}
+                for field, field_streaks in streaks.items()}
+    except Exception as e:
+        logger.error("❌ Failed to get streaks for guild %s: %s", guild_id, e)
+        return None
+
+async def user_already_recorded_today(guild_id, user_id, field_type="wished"):
     """Check if user is already recorded for today"""
     try:
-        today_log = get_day_log(guild_id)
+        today = get_today_date()
         field = "wished" if field_type == "wished" else "shamed"
+        if str(user_id) in pending_records.get((guild_id, today, field), ()):
+            return True
+        today_log = await get_day_log(guild_id, today)
         return str(user_id) in today_log.get(field, [])
     except Exception as e:
-        print(f"❌ Failed to check if user {user_id} already recorded: {e}")
+        logger.error("❌ Failed to check if user %s already recorded: %s", user_id, e)
         return False
 
-def get_leaderboard(guild_id):
-    """Generate leaderboard for a specific guild"""
-    if not db:
-        return {"top_wishers": [], "top_shamers": []}
+def _rebuild_aggregates(storage, guild_id):
+    counts = storage.count_history(guild_id)
+    storage.set_aggregates(guild_id, counts)
+    return counts
+
+def _month_end(month):
+    """Last day of a "YYYY-MM" month as YYYY-MM-DD"""
+    year, month_number = int(month[:4]), int(month[5:7])
+    return f"{month}-{calendar.monthrange(year, month_number)[1]:02d}"
+
+def _next_day(date_str):
+    return (date.fromisoformat(date_str) + timedelta(days=1)).isoformat()
+
+def _month_spans(start_date, end_date):
+    """Split an inclusive date range into (month, first day, last day) spans, one per calendar month"""
+    spans = []
+    day = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    while day <= end:
+        month = day.strftime("%Y-%m")
+        month_end = date.fromisoformat(_month_end(month))
+        spans.append((month, day.isoformat(), min(month_end, end).isoformat()))
+        day = month_end + timedelta(days=1)
+    return spans
+
+def _add_counts(total, counts):
+    for field in ("wished", "shamed"):
+        for user_id, days in counts.get(field, {}).items():
+            total[field][user_id] = total[field].get(user_id, 0) + days
+
+def _count_window(storage, guild_id, start_date, end_date, today):
+    """Counts between two dates: monthly rollups for whole months, daily logs only for the rest"""
+    yesterday = (date.fromisoformat(today) - timedelta(days=1)).isoformat()
+    total = {"wished": {}, "shamed": {}}
+    ranges = []  # (first, last) spans still to count from the daily logs
+    rollup_spans = []
+    for month, first, last in _month_spans(start_date, end_date):
+        # A rollup covers its month from the 1st up to "through" (at most yesterday; today is still open)
+        closes = min(_month_end(month), yesterday)
+        if first.endswith("-01") and first <= yesterday and last >= closes:
+            rollup_spans.append((month, first, closes))
+            if last > closes:
+                ranges.append((_next_day(closes), last))
+        else:
+            ranges.append((first, last))
+    
+    rollups = storage.get_rollups(guild_id, [month for month, _, _ in rollup_spans]) if rollup_spans else {}
+    for month, first, closes in rollup_spans:
+        rollup = rollups.get(month) or {"wished": {}, "shamed": {}, "through": None}
+        if (rollup["through"] or "") < closes:
+            # Fold the days closed since the rollup was last written (the whole month if it is new)
+            fold_from = _next_day(rollup["through"]) if rollup["through"] else first
+            _add_counts(rollup, storage.count_range(guild_id, fold_from, closes))
+            rollup["through"] = closes
+            storage.set_rollup(guild_id, month, rollup)
+        _add_counts(total, rollup)
+    for first, last in ranges:
+        _add_counts(total, storage.count_range(guild_id, first, last))
+    return total, len(rollup_spans), len(ranges)
+
+def _rebuild_rollups(storage, guild_id, today):
+    """Recount every closed month's rollup from the daily logs"""
+    yesterday = (date.fromisoformat(today) - timedelta(days=1)).isoformat()
+    months = {}
+    for date_str, log in storage.get_day_range(guild_id, "0000-00-00", yesterday).items():
+        counts = months.setdefault(date_str[:7], {"wished": {}, "shamed": {}})
+        for field in ("wished", "shamed"):
+            for user_id in set(log.get(field, [])):
+                counts[field][user_id] = counts[field].get(user_id, 0) + 1
+    for month, counts in months.items():
+        storage.set_rollup(guild_id, month, {**counts, "through": min(_month_end(month), yesterday)})
+    return len(months)
+
+async def rebuild_leaderboard_stats(guild_id):
+    """Regenerate the aggregate leaderboard counts from the daily logs"""
+    if not backend:
+        logger.error("❌ Storage not initialized, cannot rebuild leaderboard stats")
+        return None
     
     try:
-        wished_counter = {}
-        shamed_counter = {}
-        
-        # Get all daily documents for this guild
-        guild_collection = get_guild_log(guild_id)
-        if not guild_collection:
-            return {"top_wishers": [], "top_shamers": []}
-        
-        docs = guild_collection.stream()
+        # A full history scan can legitimately take longer than a normal call, so no timeout here. Under
+        # the flush lock, so no record is committed between the count and the overwrite
+        async with _get_flush_lock():
+            counts = await _run_blocking(_rebuild_aggregates, backend, guild_id, timeout=None)
+            months = await _run_blocking(_rebuild_rollups, backend, guild_id, get_today_date(), timeout=None)
+        logger.info("🔧 Rebuilt leaderboard stats for guild %s: %s wishers, %s shamers, %s monthly rollup(s)", guild_id, len(counts['wished']), len(counts['shamed']), months)
+        _notify_record_listeners(guild_id)
+        return counts
+    except Exception as e:
+        logger.error("❌ Failed to rebuild leaderboard stats for guild %s: %s", guild_id, e)
+        return None
+
+def _compare_aggregates(storage, guild_id):
+    expected = storage.count_history(guild_id)
+    stored = storage.get_aggregates(guild_id) or {}
+    
+    mismatches = []
+    for field in ("wished", "shamed"):
+        expected_counts = expected[field]
+        stored_counts = stored.get(field, {})
+        for user in sorted(set(expected_counts) | set(stored_counts)):
+            if expected_counts.get(user, 0) != stored_counts.get(user, 0):
+                mismatches.append((field, user, stored_counts.get(user, 0), expected_counts.get(user, 0)))
+    return mismatches
+
+async def check_leaderboard_stats(guild_id):
+    """Compare the aggregate leaderboard counts with a full count of the daily logs"""
+    if not backend:
+        logger.error("❌ Storage not initialized, cannot check leaderboard stats")
+        return None
+    
+    try:
+        mismatches = await _run_blocking(_compare_aggregates, backend, guild_id, timeout=None)
+        logger.info("🔍 Leaderboard stats check for guild %s: %s mismatch(es)", guild_id, len(mismatches))
+        return mismatches
+    except Exception as e:
+        logger.error("❌ Failed to check leaderboard stats for guild %s: %s", guild_id, e)
+        return None
+
+async def get_leaderboard(guild_id, start_date=None, end_date=None):
+    """Generate leaderboard for a specific guild, all-time or between two dates inclusive (None if unavailable)"""
+    if not backend:
+        return None
+    
+    try:
+        if start_date is not None:
+            # Folding closed days into rollups must not interleave with a flush (see flush_pending_records)
+            async with _get_flush_lock():
+                counts, rollups, ranges = await _run_blocking(_count_window, backend, guild_id, start_date, end_date, get_today_date(), timeout=None)
+            logger.info("📊 Leaderboard for guild %s from %s to %s: %s monthly rollup(s), %s daily range(s)", guild_id, start_date, end_date, rollups, ranges)
+        else:
+            counts = await _run_blocking(backend.get_aggregates, guild_id)
+        if counts is None:
+            # First leaderboard for this guild since aggregates were introduced - backfill once
+            logger.info("📊 No leaderboard stats for guild %s yet, backfilling from daily logs", guild_id)
+            counts = await rebuild_leaderboard_stats(guild_id) or {}
         
-        # Process documents (might be empty for new guilds)
-        doc_count = 0
-        for doc in docs:
-            doc_count += 1
-            data = doc.to_dict()
-            if not data:  # Skip empty documents
-                continue
-            
-            # Count wishes
-            for user in data.get("wished", []):
-                wished_counter[user] = wished_counter.get(user, 0) + 1
-            
-            # Count shames
-            for user in data.get("shamed", []):
-                shamed_counter[user] = shamed_counter.get(user, 0) + 1
+        wished_counter = counts.get("wished", {})
+        shamed_counter = counts.get("shamed", {})
+        top_wishers = sorted(wished_counter.items(), key=lambda x: x[1], reverse=True)
+        top_shamers = sorted(shamed_counter.items(), key=lambda x: x[1], reverse=True)
         
-        print(f"📊 Processed {doc_count} documents for guild {guild_id} leaderboard")
+        # Streaks of the shown users only (one document each on Firestore, not the whole collection)
+        shown = sorted({user_id for user_id, _ in top_wishers[:LEADERBOARD_SIZE] + top_shamers[:LEADERBOARD_SIZE]})
+        streaks = await get_streaks(guild_id, shown) if shown else None
         
         return {
-            "top_wishers": sorted(wished_counter.items(), key=lambda x: x[1], reverse=True),
-            "top_shamers": sorted(shamed_counter.items(), key=lambda x: x[1], reverse=True)
+            "top_wishers": top_wishers,
+            "top_shamers": top_shamers,
+            "streaks": streaks or {"wished": {}, "shamed": {}}
         }
     except Exception as e:
-        print(f"❌ Failed to generate leaderboard for guild {guild_id}: {e}")
-        return {"top_wishers": [], "top_shamers": []} 
\ No newline at end of file
+        logger.error("❌ Failed to generate leaderboard for guild %s: %s", guild_id, e)
+        return None
+
+async def load_guild_settings(guild_ids):
+    """Load persisted settings for several guilds in one batched read -> {guild_id: settings}"""
+    if not backend or not guild_ids:
+        return {}
+    
+    try:
+        return await _run_blocking(backend.load_guild_settings, list(guild_ids))
+    except Exception as e:
+        logger.error("❌ Failed to load guild settings: %s", e)
+        return {}
+
+async def save_guild_settings(guild_id, **settings):
+    """Persist settings for a guild (merged into any existing ones)"""
+    if not backend:
+        logger.error("❌ Storage not initialized, cannot save settings for guild %s", guild_id)
+        return False
+    
+    try:
+        await _run_blocking(backend.save_guild_settings, guild_id, settings)
+        logger.info("💾 Saved settings for guild %s: %s", guild_id, settings)
+        return True
+    except Exception as e:
+        logger.error("❌ Failed to save settings for guild %s: %s", guild_id, e)
+        return False
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from aiohttp import web
+from discord import AutoShardedClient
+from . import metrics
+from .metrics import Gauge, DISCORD_REST_LATENCY, BACKGROUND_TASKS_STARTED
+from .watchdog import loop_state, get_handler_stats, start_watchdog, LOOP_PROBE_INTERVAL
+from . import firestore_db
+from .firestore_db import record_stats, get_storage_status
+from .sharding import get_shard_ids, get_shard_state, describe_shards
+from .startup import startup_state, is_warmed_up
+
+logger = logging.getLogger(__name__)
+
+# /healthz fails when any of these are exceeded
+HEALTH_MAX_LOOP_LAG = float(os.getenv("HEALTH_MAX_LOOP_LAG", "5"))
+HEALTH_MAX_GATEWAY_LATENCY = float(os.getenv("HEALTH_MAX_GATEWAY_LATENCY", "10"))
+
+# Updated by the gateway listeners
+health_state = {
+    "gateway_connected": False,
+    "gateway_changed_at": time.time(),
+    "shards": {},  # shard_id -> connected, for sharded bots
+}
+
+def set_gateway_connected(connected, shard_id=None):
+    if shard_id is not None:
+        if health_state["shards"].get(shard_id) != connected:
+            health_state["shards"][shard_id] = connected
+            logger.info(f"🔌 Shard {shard_id} {'connected' if connected else 'disconnected'}", extra={"event": "shard_state", "shard_id": shard_id, "connected": connected})
+        connected = all(health_state["shards"].values())
+    if health_state["gateway_connected"] != connected:
+        health_state["gateway_connected"] = connected
+        health_state["gateway_changed_at"] = time.time()
+        logger.info(f"🔌 Gateway {'connected' if connected else 'disconnected'}", extra={"event": "gateway_state", "connected": connected})
+
+def track_gateway(bot):
+    """Follow gateway connection state through discord.py's connect/resume/disconnect events (per shard when sharded)"""
+    if isinstance(bot, AutoShardedClient):
+        # A sharded client also fires the plain events, once for every shard - only the shard_* ones say which
+        async def on_shard_connect(shard_id):
+            set_gateway_connected(True, shard_id)
+        
+        async def on_shard_resumed(shard_id):
+            set_gateway_connected(True, shard_id)
+        
+        async def on_shard_disconnect(shard_id):
+            set_gateway_connected(False, shard_id)
+        
+        bot.add_listener(on_shard_connect, "on_shard_connect")
+        bot.add_listener(on_shard_resumed, "on_shard_resumed")
+        bot.add_listener(on_shard_disconnect, "on_shard_disconnect")
+        return
+    
+    async def on_connect():
+        set_gateway_connected(True)
+    
+    async def on_resumed():
+        set_gateway_connected(True)
+    
+    async def on_disconnect():
+        set_gateway_connected(False)
+    
+    bot.add_listener(on_connect, "on_connect")
+    bot.add_listener(on_resumed, "on_resumed")
+    bot.add_listener(on_disconnect, "on_disconnect")
+
+def get_gateway_latency(bot):
+    """Heartbeat latency in seconds - the slowest shard's when sharded"""
+    if isinstance(bot, AutoShardedClient) and bot.latencies:
+        return max(latency for _, latency in bot.latencies)
+    return bot.latency
+
+def instrument_http(bot):
+    """Time every Discord REST request by method and route template (e.g. /guilds/{guild_id}/roles)"""
+    http = bot.http
+    request = http.request
+    
+    async def timed_request(route, **kwargs):
+        with DISCORD_REST_LATENCY.time(method=route.method, route=route.path):
+            return await request(route, **kwargs)
+    
+    http.request = timed_request
+
+def finite_or(value, default):
+    return value if math.isfinite(value) else default
+
+def get_health(bot):
+    """Current health checks and overall status"""
+    latency = get_gateway_latency(bot)
+    latency_ok = math.isfinite(latency) and latency <= HEALTH_MAX_GATEWAY_LATENCY
+    probe_at = loop_state["probe_at"]
+    probe_age = time.monotonic() - probe_at if probe_at is not None else None
+    loop_ok = loop_state["lag"] <= HEALTH_MAX_LOOP_LAG and (probe_age is None or probe_age <= LOOP_PROBE_INTERVAL + HEALTH_MAX_LOOP_LAG)
+    gateway_ok = health_state["gateway_connected"] and not bot.is_closed()
+    if isinstance(bot, AutoShardedClient):
+        # Every shard this process runs must be up, including ones that have not connected yet
+        gateway_ok = gateway_ok and all(health_state["shards"].get(shard_id, False) for shard_id in get_shard_ids(bot))
+    
+    return {
+        "status": "ok" if gateway_ok and latency_ok and loop_ok else "unhealthy",
+        "gateway": {
+            "connected": gateway_ok,
+            "ready": bot.is_ready(),
+            "since": health_state["gateway_changed_at"],
+            "heartbeat_latency_ms": round(latency * 1000, 1) if math.isfinite(latency) else None,
+        },
+        "event_loop": {
+            "lag_ms": round(loop_state["lag"] * 1000, 1),
+            "last_probe_age_s": round(probe_age, 1) if probe_age is not None else None,
+        },
+        # Reported but not failed on: without storage the bot still enforces the wish time
+        "storage": get_storage_status(),
+        "guilds": len(bot.guilds),
+        "shards": describe_shards(bot),
+        # Seconds after process start that each start-up phase was reached; ready_count > 1 means the gateway re-identified
+        "startup": {"warmed_up": is_warmed_up(), "phases": startup_state["phases"], "ready_count": startup_state["ready_count"]},
+    }
+
+def register_runtime_gauges(bot, dedup_caches):
+    """Expose existing in-process counters (buffers, caches, queues) as gauges read at scrape time"""
+    from .cmds import leaderboard_cache_stats
+    from .role_queue import role_queues
+    from .utils import wish_classifications, guild_capabilities
+    
+    Gauge("drshamer_gateway_connected", "1 if the gateway connection is up", function=lambda: int(health_state["gateway_connected"]))
+    Gauge("drshamer_gateway_latency_seconds", "Gateway heartbeat latency (slowest shard)", function=lambda: finite_or(get_gateway_latency(bot), -1))
+    Gauge("drshamer_shard_latency_seconds", "Gateway heartbeat latency per shard", ["shard"], function=lambda: {
+        (str(shard_id),): finite_or(latency, -1) for shard_id, latency in (bot.latencies if isinstance(bot, AutoShardedClient) else [(0, bot.latency)])
+    })
+    Gauge("drshamer_shard_guilds", "Guilds per shard", ["shard"], function=lambda: {(str(shard_id),): shard["guilds"] for shard_id, shard in get_shard_state(bot).items()})
+    Gauge("drshamer_startup_seconds", "Seconds after process start that each start-up phase was reached", ["phase"], function=lambda: {
+        (phase,): seconds for phase, seconds in startup_state["phases"].items()
+    })
+    Gauge("drshamer_guilds", "Guilds the bot is in", function=lambda: len(bot.guilds))
+    Gauge("drshamer_asyncio_tasks", "Tasks alive on the event loop", function=lambda: len(asyncio.all_tasks()))
+    Gauge("drshamer_pending_records", "Wish/shame records waiting in the write-behind buffer", function=lambda: firestore_db._pending_count)
+    Gauge("drshamer_record_stats", "Write-behind buffer totals", ["stat"], function=lambda: {(stat,): value for stat, value in record_stats.items()})
+    Gauge("drshamer_dedup_events", "Event dedup cache counters", ["cache", "result"], function=lambda: {
+        key: value for name, cache in dedup_caches.items() for key, value in (((name, "duplicate"), cache.hits), ((name, "new"), cache.misses))
+    })
+    Gauge("drshamer_wish_classification_cache", "Stored wish classifications looked up by 🌠 reactions", ["result"], function=lambda: {
+        (stat,): value for stat, value in wish_classifications.stats().items()
+    })
+    Gauge("drshamer_leaderboard_cache", "Leaderboard cache counters", ["result"], function=lambda: {(stat,): value for stat, value in leaderboard_cache_stats.items()})
+    Gauge("drshamer_guild_setup", "Guilds by whether the bot can manage their shame role (capabilities resolved so far)", ["status"], function=lambda: {
+        ("ok",): sum(1 for capabilities in guild_capabilities.values() if not capabilities.role_problem),
+        ("misconfigured",): sum(1 for capabilities in guild_capabilities.values() if capabilities.role_problem),
+    })
+    Gauge("drshamer_role_queue_depth", "Role operations waiting or in flight, per guild", ["guild_id"], function=lambda: {(str(guild_id),): queue.depth for guild_id, queue in role_queues.items()})
+
+async def start_health_server(bot, dedup_caches):
+    """Serve / (liveness), /healthz (real health), /metrics (Prometheus), /debug/handlers (watchdog timings) and /debug/shards on the bot's event loop"""
+    async def handle_root(request):
+        return web.Response(text="OK")
+    
+    async def handle_healthz(request):
+        health = get_health(bot)
+        return web.json_response(health, status=200 if health["status"] == "ok" else 503)
+    
+    async def handle_handler_stats(request):
+        return web.json_response(get_handler_stats())
+    
+    async def handle_shards(request):
+        return web.json_response({str(shard_id): shard for shard_id, shard in get_shard_state(bot).items()})
+    
+    async def handle_metrics(request):
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8", headers={"X-Prometheus-Format": "0.0.4"})
+    
+    app = web.Application()
+    app.router.add_get("/", handle_root)
+    app.router.add_get("/healthz", handle_healthz)
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_get("/debug/handlers", handle_handler_stats)
+    app.router.add_get("/debug/shards", handle_shards)
+    
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    port = int(os.getenv("PORT", 8080))
+    await web.TCPSite(runner, port=port).start()
+    
+    track_gateway(bot)
+    instrument_http(bot)
+    register_runtime_gauges(bot, dedup_caches)
+    start_watchdog()
+    BACKGROUND_TASKS_STARTED.inc(kind="loop_lag_monitor")
+    logger.info(f"🩺 Health server listening on port {port}", extra={"event": "health_server_started"})
+    return runner
@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Append-only local journal of the state that would otherwise only live in memory until it is
+# stored or used: buffered wish/shame records, open wish windows (the delayed wish summary) and
+# shame role clean-ups. Every event is applied to a small state as it is written; a compaction
+# writes that state as a snapshot and starts an empty journal, so recovery reads one snapshot
+# plus at most JOURNAL_COMPACT_EVENTS events however long the bot has been running.
+#
+#   <JOURNAL_DIR>/snapshot.json   {"seq": n, "acked": n, "records": [...], "windows": {...}, "roles_cleared": {...}}
+#   <JOURNAL_DIR>/journal.jsonl   one event per line: {"seq": n, "type": ..., "at": unix time, ...}
+#
+# Events: record (a user queued as wished/shamed), ack (every record up to a seq is stored),
+# wish (a user joined a guild's wish window), window_closed (summary sent, failed or expired),
+# roles_cleared (shame roles removed or rotated for a new wish, so a restart mid-window does not
+# clear them again). An empty JOURNAL_DIR disables it.
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "data/journal")
+JOURNAL_COMPACT_EVENTS = int(os.getenv("JOURNAL_COMPACT_EVENTS", "1000"))
+
+def _empty_state():
+    return {"seq": 0, "acked": 0, "records": [], "windows": {}, "roles_cleared": {}}
+
+_state = _empty_state()
+_file = None
+_directory = None
+_since_snapshot = 0
+
+def _apply(state, event):
+    """Fold one event into the journal state (used both live and on replay)"""
+    kind = event["type"]
+    guild_key = str(event.get("guild_id"))
+    if kind == "record":
+        state["records"].append([event["seq"], event["guild_id"], event["date"], event["field"], event["user_id"]])
+    elif kind == "ack":
+        state["acked"] = max(state["acked"], event["through"])
+        state["records"] = [record for record in state["records"] if record[0] > state["acked"]]
+    elif kind == "wish":
+        window = state["windows"].setdefault(guild_key, {"opened_at": event["at"], "date": event["date"], "users": []})
+        window["channel_id"] = event["channel_id"]
+        if event["user_id"] not in window["users"]:
+            window["users"].append(event["user_id"])
+    elif kind == "window_closed":
+        state["windows"].pop(guild_key, None)
+    elif kind == "roles_cleared":
+        state["roles_cleared"][guild_key] = event["at"]
+    state["seq"] = max(state["seq"], event["seq"])
+
+def _paths(directory):
+    return os.path.join(directory, "snapshot.json"), os.path.join(directory, "journal.jsonl")
+
+def recover_journal(directory=None):
+    """Load the snapshot, replay the journal written after it and open the journal for appending"""
+    global _state, _directory, _since_snapshot
+    directory = JOURNAL_DIR if directory is None else directory
+    if not directory:
+        return None
+
+    started = time.perf_counter()
+    snapshot_path, journal_path = _paths(directory)
+    state = _empty_state()
+    replayed = 0
+    try:
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path) as f:
+                state.update(json.load(f))
+        if os.path.exists(journal_path):
+            with open(journal_path) as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash - everything before it is intact
+                        logger.warning(f"⚠️ Skipping a truncated journal line after seq {state['seq']}")
+                        continue
+                    if event["seq"] > state["seq"]:
+                        _apply(state, event)
+                        replayed += 1
+    except Exception as e:
+        logger.error(f"❌ Failed to recover the journal in {directory}, starting without it: {e}", extra={"event": "journal_recovery_failed"})
+        return None
+
+    _state, _directory, _since_snapshot = state, directory, 0
+    # Start from a fresh snapshot so the next recovery does not replay these events again
+    compact()
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"📼 Recovered journal in {elapsed_ms:.0f}ms: {replayed} event(s) replayed after the snapshot, "
+                f"{len(state['records'])} un-stored record(s), {len(state['windows'])} open wish window(s)",
+                extra={"event": "journal_recovered", "replayed": replayed, "records": len(state["records"]), "windows": len(state["windows"]), "latency_ms": elapsed_ms})
+    return state
+
+def _open_journal():
+    global _file
+    if _file:
+        _file.close()
+    _file = open(_paths(_directory)[1], "w", encoding="utf-8")
+
+def append(kind, **fields):
+    """Write an event to the journal and apply it (no-op while the journal is not open)"""
+    global _file, _since_snapshot
+    if _file is None:
+        return None
+    event = {"seq": _state["seq"] + 1, "type": kind, "at": round(time.time(), 3), **fields}
+    try:
+        _file.write(json.dumps(event, separators=(",", ":")) + "\n")
+        _file.flush()  # In the OS page cache - survives the process crashing, not the host
+    except Exception as e:
+        logger.error(f"❌ Failed to write to the journal, disabling it: {e}", extra={"event": "journal_write_failed"})
+        _file = None
+        return None
+    _apply(_state, event)
+    _since_snapshot += 1
+    return event["seq"]
+
+def journal_seq():
+    """Seq of the last event written"""
+    return _state["seq"]
+
+def ack(through):
+    """Mark every record written up to `through` as stored; compacts once enough events have piled up"""
+    if _file is None or through <= _state["acked"]:
+        return
+    append("ack", through=through)
+    if _since_snapshot >= JOURNAL_COMPACT_EVENTS:
+        compact()
+
+def compact():
+    """Write the current state as the snapshot and start an empty journal"""
+    global _since_snapshot
+    if not _directory:
+        return
+    snapshot_path, _ = _paths(_directory)
+    try:
+        with open(snapshot_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(_state, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(snapshot_path + ".tmp", snapshot_path)
+        # Events up to the snapshot's seq are skipped on replay, so a crash before this truncation is harmless
+        _open_journal()
+        _since_snapshot = 0
+    except Exception as e:
+        logger.error(f"❌ Failed to compact the journal: {e}", extra={"event": "journal_compaction_failed"})
+
+def get_unacked_records():
+    """Records written to the journal but not known to be stored -> [(guild_id, date_str, field, user_id)]"""
+    return [(guild_id, date_str, field, user_id) for _, guild_id, date_str, field, user_id in _state["records"]]
+
+def get_open_windows():
+    """Wish windows whose summary was not sent yet -> {guild_id: {"opened_at", "date", "channel_id", "users"}}"""
+    return {int(guild_id): window for guild_id, window in _state["windows"].items()}
+
+def get_roles_cleared():
+    """When each guild's shame roles were last cleared -> {guild_id: unix time}"""
+    return {int(guild_id): cleared_at for guild_id, cleared_at in _state["roles_cleared"].items()}
+
+def close_journal():
+    """Compact and close (on shutdown, after buffered records were flushed)"""
+    global _file, _directory
+    if _file is None:
+        return
+    compact()
+    _file.close()
+    _file, _directory = None, None
@@ -0,0 +1,105 @@
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has - anything else on a record came from `extra=` and is emitted as a field
+_STANDARD_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+# Python level names -> Cloud Logging severities
+_SEVERITY = {"DEBUG": "DEBUG", "INFO": "INFO", "WARNING": "WARNING", "ERROR": "ERROR", "CRITICAL": "CRITICAL"}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, in the shape Cloud Logging parses from stdout"""
+
+    def format(self, record):
+        entry = {
+            "severity": _SEVERITY.get(record.levelname, record.levelname),
+            "message": record.getMessage(),
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "logger": record.name,
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enqueue a copy of the record with its message merged and any traceback rendered as text"""
+
+    # The stock prepare() formats the whole record (traceback appended to the message) and drops
+    # exc_info, so the listener's JSON formatter could never fill its "exception" field
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            # Tracebacks are rare, and the frames they reference must not outlive this call
+            if not record.exc_text:
+                record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_traceback_formatter = logging.Formatter()
+
+_listener = None
+
+def parse_log_levels(spec):
+    """Parse "src.utils=WARNING,src.role_queue.members=ERROR" into {logger name: level}"""
+    levels = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+def setup_logging():
+    """Route all logging through a queue drained by a background thread that writes to stdout.
+
+    Environment:
+        LOG_LEVEL   - root level (default INFO)
+        LOG_LEVELS  - per-logger overrides, e.g. "src.role_queue.members=WARNING,src.main=DEBUG"
+        LOG_FORMAT  - "json" (default, for Cloud Logging) or "text" (local development)
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    # Handlers on the event loop only enqueue the record; formatting and I/O happen on the listener thread
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.handlers[:] = [_QueueHandler(log_queue)]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    for name, level in parse_log_levels(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level)
+
+    # discord.py is chatty at INFO about gateway internals
+    if "discord" not in os.getenv("LOG_LEVELS", ""):
+        logging.getLogger("discord").setLevel(logging.WARNING)
+
+def stop_logging():
+    """Flush queued records and stop the background writer"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,9 +1,10 @@
 import discord
 from discord.ext import commands
 from datetime import datetime
-import threading
 import asyncio
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import logging
+import signal
+import time
 import os
 from dotenv import load_dotenv
 
@@ -11,55 +12,172 @@ from dotenv import load_dotenv
 if os.path.exists('.env'):
     load_dotenv()
 
+from .logging_config import setup_logging, stop_logging
 from .config import config, LONDON_TZ
-from .utils import *
-from .utils import WrongTimeException, assign_shame_role
+from .utils import get_server_tag, is_debug_mode, classify_message, get_cached_classification, forget_classification, remove_shame_roles, assign_shame_role, in_flight_operations, apply_guild_settings, restore_shame_role_holders, restore_roles_cleared, refresh_guild_capabilities, on_guild_setup_changed
 from .cmds import handle_bot_mention
-from .wish_reactions import track_successful_wish
-from .firestore_db import init_firestore, record_user
+from .dedup import RecentEventCache
+from .wish_reactions import track_successful_wish, resume_wish_windows
+from .firestore_db import init_firestore, record_user, close_storage, load_guild_settings, get_day_logs, replay_records
+from .journal import recover_journal, get_unacked_records, get_open_windows, get_roles_cleared, close_journal
 from .shame_summary import start_shame_summary_task
+from .health import start_health_server
+from .metrics import EVENTS_HANDLED, BACKGROUND_TASKS_STARTED
+from .watchdog import timed, stop_watchdog
+from .sharding import is_sharded, get_shard_options, describe_shards, owned_guilds, drop_guild_state
+from .member_cache import LEAN_MEMBER_CACHE, get_member_cache_options, forget_former_holder
+from .startup import mark_phase, note_ready, warm_up, is_warmed_up, wait_until_warmed_up
+from . import wish_clock
+from .wish_clock import in_wish_minute, in_reaction_window
 
 intents = discord.Intents.default()
 intents.message_content = True
 intents.reactions = True
 intents.messages = True
-intents.members = True
+intents.members = True  # Also needed in lean member cache mode, for member updates and lookups
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+# SHARD_COUNT switches to AutoShardedBot; SHARD_IDS then picks which shards this process runs
+BotBase = commands.AutoShardedBot if is_sharded() else commands.Bot
 
-# Track recently processed messages to avoid duplicates
-recent_messages = []
+class DrShamerBot(BotBase):
+    async def setup_hook(self):
+        # Runs once per process, after login and before the gateway connects (unlike on_ready)
+        mark_phase("logged_in")
+        
+        # Cloud Run stops containers with SIGTERM - shut down cleanly so buffered records are flushed
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(self.close()))
+        except NotImplementedError:
+            pass  # Signal handlers are not available on Windows event loops
+        
+        # Health and metrics are served from the bot's own loop, so a stalled loop fails /healthz
+        await start_health_server(self, {"messages": recent_messages, "reactions": recent_reactions})
+        
+        if LEAN_MEMBER_CACHE:
+            self.add_listener(forget_former_holder, "on_member_update")
+        
+        # Rebuild what was only in memory before a restart (un-stored records, open wish windows, role clean-ups)
+        recover_journal()
+        restore_roles_cleared(get_roles_cleared())
+        
+        # Connect storage while the gateway connects; the summary task waits for start-up to finish
+        self.storage_ready = asyncio.create_task(init_firestore())
+        start_shame_summary_task(self)
+    
+    async def close(self):
+        await close_storage()
+        close_journal()
+        await super().close()
+        stop_watchdog()
+        stop_logging()
+
+bot = DrShamerBot(command_prefix='!', intents=intents, **get_shard_options(), **get_member_cache_options())
+mark_phase("imported")
+
+logger = logging.getLogger(__name__)
+
+# Track recently processed events to avoid duplicates (Discord sometimes redelivers them)
+recent_messages = RecentEventCache(max_size=1024)
+recent_reactions = RecentEventCache(max_size=4096)
+
+def start_background(coro, kind):
+    """Fire-and-forget a coroutine, counted by kind in /metrics"""
+    BACKGROUND_TASKS_STARTED.inc(kind=kind)
+    return asyncio.create_task(coro)
+
+def event_latency_ms(created_at):
+    """Milliseconds between Discord creating an event and us handling it"""
+    return round((time.time() - created_at.timestamp()) * 1000, 1)
+
+async def load_settings_and_holders(guilds):
+    """Apply persisted settings, then find shame role holders and resolve what the bot can do in each guild"""
+    # Persisted per-guild settings first (e.g. shame role IDs replaced by role rotation)
+    apply_guild_settings(await load_guild_settings([guild.id for guild in guilds]))
+    
+    # Lean member cache: only shame role holders are cached, so find the ones from before the restart
+    await restore_shame_role_holders(guilds)
+    
+    for guild in guilds:
+        refresh_guild_capabilities(guild, bot)
 
 @bot.event
 async def on_ready():
-    print(f'✅ Dr. Shamer is online as {bot.user}')
-    print(f'✅ Connected to {len(bot.guilds)} servers: {", ".join([guild.name for guild in bot.guilds])}')
+    if not note_ready():
+        # A new gateway session after a reconnect - storage, settings and background tasks are already set up
+        logger.info("🔁 Gateway ready again as %s (%s servers)", bot.user, len(bot.guilds), extra={"event": "ready_again", "guild_count": len(bot.guilds)})
+        return
+    
+    mark_phase("gateway_ready")
+    logger.info("✅ Dr. Shamer is online as %s", bot.user, extra={"event": "ready"})
+    logger.info("✅ Connected to %s servers (%s): %s", len(bot.guilds), describe_shards(bot), ", ".join([guild.name for guild in bot.guilds]),
+                extra={"event": "ready", "guild_count": len(bot.guilds), "shards": describe_shards(bot)})
     
-    # Initialize Firestore
-    init_firestore()
+    # Ship records the journal has that storage may not, and pick up wish windows open at the restart
+    await bot.storage_ready
+    replay_records(get_unacked_records())
+    resume_wish_windows(bot, get_open_windows())
     
-    # Start the daily shame summary background task
-    start_shame_summary_task(bot)
+    # Warm everything the handlers read, for all guilds at once, before letting events through
+    guilds = owned_guilds(bot)
+    await warm_up([load_settings_and_holders(guilds), get_day_logs([guild.id for guild in guilds])])
+
+@bot.event
+async def on_guild_remove(guild):
+    # Kicked, or the guild was deleted - nothing held for it here is needed any more
+    drop_guild_state(guild.id)
+
+# Role, channel and bot member changes are the only things that change what the bot can do in a guild
+@bot.event
+async def on_guild_role_create(role):
+    on_guild_setup_changed(role.guild, bot, "role created")
+
+@bot.event
+async def on_guild_role_delete(role):
+    on_guild_setup_changed(role.guild, bot, "role deleted")
+
+@bot.event
+async def on_guild_role_update(before, after):
+    on_guild_setup_changed(after.guild, bot, "role updated")
+
+@bot.event
+async def on_member_update(before, after):
+    if after.id == bot.user.id:
+        on_guild_setup_changed(after.guild, bot, "bot member updated")
+
+@bot.event
+async def on_guild_channel_create(channel):
+    on_guild_setup_changed(channel.guild, bot, "channel created")
 
 @bot.event
+async def on_guild_channel_delete(channel):
+    on_guild_setup_changed(channel.guild, bot, "channel deleted")
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    if before.name != after.name:
+        on_guild_setup_changed(after.guild, bot, "channel renamed")
+
+@bot.event
+@timed("on_message")
 async def on_message(message):
     if message.author.bot:
         return
-
+    
     # Skip messages not from a guild
     if not message.guild:
         return
-
-    # Deduplicate messages (Discord sometimes sends duplicates)
-    global recent_messages
-    message_key = f"{message.id}_{message.guild.id}"
-    if message_key in recent_messages:
+    
+    # Hold events that arrive while start-up is still warming the caches
+    if not is_warmed_up():
+        await wait_until_warmed_up()
+    
+    # Deduplicate messages (Discord sometimes sends duplicates) - message IDs are globally unique
+    if recent_messages.seen(message.id):
+        EVENTS_HANDLED.inc(event="message", outcome="duplicate")
+        logger.info("🔁 Skipping duplicate message %s (%d duplicates / %d messages so far)", message.id, recent_messages.hits, recent_messages.misses,
+                    extra={"event": "duplicate_message", "guild_id": message.guild.id})
         return
-    recent_messages.append(message_key)
     
-    # Clean up old message IDs (keep only last 100)
-    recent_messages = recent_messages[-100:]
-
     server_tag = get_server_tag(message.guild)
     guild_id = message.guild.id
     
@@ -70,121 +188,138 @@ async def on_message(message):
                       message.reference.resolved.author.id == bot.user.id)
     
     if is_reply_to_bot:
+        EVENTS_HANDLED.inc(event="message", outcome="ignored")
         return  # Ignore replies to the bot completely
     
     # Check if the bot is mentioned (but not a reply)
     if bot.user.mentioned_in(message):
+        EVENTS_HANDLED.inc(event="message", outcome="mention")
         await handle_bot_mention(message, server_tag, guild_id, bot)
         return
     
-    # Check if message is a wish format (with fast precheck)
-    if "wish" in message.content.lower():
-        try:
-            if is_wish_message(message.content):
-                # Use message creation time, not current time
-                london_time = message.created_at.astimezone(LONDON_TZ)
-                
-                is_correct_time = london_time.strftime('%H:%M') == config.WISH_TIME
-                
-                if is_correct_time:
-                    print(f"{server_tag} 🎯 Detected wish message at {london_time.strftime('%H:%M')}: {message.id}")
-                    print(f"{server_tag} 📝 Message: '{message.content}'")
-                    
-                    # Record successful wish to Firestore (async, no await - arrayUnion handles duplicates)
-                    asyncio.create_task(record_user(guild_id, message.author.id, on_time=True))
-                    
-                    # Track successful wish for summary message (still needed for in-memory summary)
-                    track_successful_wish(message.guild, message.author, message.channel)
-                    
-                    # Remove shame roles from all users for fresh start (do this last as it's slow)
-                    await remove_shame_roles(message.guild, bot)
-                    
-                    # Debug message for successful wish creation
-                    if is_debug_mode(guild_id):
-                        await message.channel.send(f"🐛 **DEBUG:** {message.author.mention} successfully created a wish at {london_time.strftime('%H:%M')}! 🌠")
-                else:
-                    print(f"{server_tag} ⏰ Wish attempted at {london_time.strftime('%H:%M')} but not {config.WISH_TIME} - assigning shame role and recording")
-                    # Fire off both shame role assignment and Firestore recording as background tasks
-                    asyncio.create_task(assign_shame_role(message.guild, message.author, bot))
-                    asyncio.create_task(record_user(guild_id, message.author.id, on_time=False))
+    # Check if message is a wish format (single pass - most messages are rejected on the first check),
+    # remembered for the reactions that follow
+    wish = classify_message(message.id, message.content)
+    EVENTS_HANDLED.inc(event="message", outcome="wrong_time" if wish.wrong_time else "wish" if wish.is_wish else "other")
+    if wish.wrong_time:
+        logger.info("%s ⏰ Wrong time in wish message: %s instead of %s - assigning shame role and recording", server_tag, wish.time_used, config.WISH_TIME,
+                    extra={"event": "wish_wrong_time", "guild_id": guild_id, "user_id": message.author.id, "latency_ms": event_latency_ms(message.created_at)})
+        # Fire off both shame role assignment and Firestore recording as background tasks
+        start_background(assign_shame_role(message.guild, message.author, bot), "assign_shame_role")
+        start_background(record_user(guild_id, message.author.id, on_time=False), "record_user")
+    elif wish.is_wish:
+        # Use message creation time, not current time
+        is_correct_time = in_wish_minute(message.created_at.timestamp())
+        london_time = message.created_at.astimezone(LONDON_TZ)
         
-        except WrongTimeException as e:
-            print(f"{server_tag} ⏰ Wrong time in wish message: {e.used_time} instead of {config.WISH_TIME} - assigning shame role and recording")
+        if is_correct_time:
+            logger.info("%s 🎯 Detected wish message at %02d:%02d: %s", server_tag, london_time.hour, london_time.minute, message.id,
+                        extra={"event": "wish", "guild_id": guild_id, "user_id": message.author.id, "latency_ms": event_latency_ms(message.created_at)})
+            logger.debug("%s 📝 Message: '%s'", server_tag, message.content, extra={"event": "wish_content", "guild_id": guild_id})
+            
+            # Record successful wish to Firestore (async, no await - arrayUnion handles duplicates)
+            start_background(record_user(guild_id, message.author.id, on_time=True), "record_user")
+            
+            # Track successful wish for summary message (still needed for in-memory summary)
+            track_successful_wish(message.guild, message.author, message.channel)
+            
+            # Remove shame roles from all users for fresh start (do this last as it's slow)
+            await remove_shame_roles(message.guild, bot)
+            
+            # Debug message for successful wish creation
+            if is_debug_mode(guild_id):
+                await message.channel.send(f"🐛 **DEBUG:** {message.author.mention} successfully created a wish at {london_time.strftime('%H:%M')}! 🌠")
+        else:
+            logger.info("%s ⏰ Wish attempted at %02d:%02d but not %s - assigning shame role and recording", server_tag, london_time.hour, london_time.minute, config.WISH_TIME,
+                        extra={"event": "wish_late", "guild_id": guild_id, "user_id": message.author.id, "latency_ms": event_latency_ms(message.created_at)})
             # Fire off both shame role assignment and Firestore recording as background tasks
-            asyncio.create_task(assign_shame_role(message.guild, message.author, bot))
-            asyncio.create_task(record_user(guild_id, message.author.id, on_time=False))
-
+            start_background(assign_shame_role(message.guild, message.author, bot), "assign_shame_role")
+            start_background(record_user(guild_id, message.author.id, on_time=False), "record_user")
+    
     await bot.process_commands(message)
 
+async def classify_reacted_message(channel, message_id):
+    """Classification of a reacted-to message: from the cache, or fetched (once per message) and classified"""
+    wish = get_cached_classification(message_id)
+    if wish is not None:
+        return wish
+    
+    message = await in_flight_operations.run((channel.guild.id, "fetch_message", message_id), lambda: channel.fetch_message(message_id))
+    return classify_message(message.id, message.content)
+
 @bot.event
-async def on_reaction_add(reaction, user):
-    if user.bot:
-        return
+async def on_raw_message_edit(payload):
+    # An edit can turn a message into a wish or out of one - classify it again when it is next reacted to
+    forget_classification(payload.message_id)
 
-    # Skip reactions not from a guild
-    if not reaction.message.guild:
+@bot.event
+@timed("on_raw_reaction_add")
+async def on_raw_reaction_add(payload):
+    # Raw reactions arrive for every message, not only the ones still in discord.py's message cache
+    if payload.guild_id is None or str(payload.emoji) != "🌠":
+        return
+    
+    user = payload.member
+    if user is None or user.bot:
         return
-
-    server_tag = get_server_tag(reaction.message.guild)
-    guild_id = reaction.message.guild.id
     
-    # Check if this is a 🌠 reaction to a wish message (with fast precheck)
-    if str(reaction.emoji) != "🌠":
+    if not is_warmed_up():
+        await wait_until_warmed_up()
+    
+    # Deduplicate reactions - one 🌠 per user per message counts
+    if recent_reactions.seen((payload.message_id, user.id)):
+        EVENTS_HANDLED.inc(event="reaction", outcome="duplicate")
+        logger.info("🔁 Skipping duplicate reaction on %s by %s (%d duplicates / %d reactions so far)", payload.message_id, user.id, recent_reactions.hits, recent_reactions.misses,
+                    extra={"event": "duplicate_reaction", "guild_id": payload.guild_id})
         return
     
-    if "wish" not in reaction.message.content.lower():
+    guild = bot.get_guild(payload.guild_id)
+    channel = guild.get_channel_or_thread(payload.channel_id) if guild else None
+    if channel is None:
         return
+    server_tag = get_server_tag(guild)
+    guild_id = guild.id
     
+    # Ignore reactions to non-wish messages and to wishes with the wrong time
     try:
-        if not is_wish_message(reaction.message.content):
-            return
-    except WrongTimeException:
-        return  # Ignore reactions to messages with wrong time
-
-    # Check if the reaction is being made at wish time + buffer
-    london_time = datetime.now(LONDON_TZ)
+        wish = await classify_reacted_message(channel, payload.message_id)
+    except discord.HTTPException as e:
+        EVENTS_HANDLED.inc(event="reaction", outcome="unknown_message")
+        logger.warning("%s ⚠️ Could not fetch message %s for a 🌠 reaction by %s: %s", server_tag, payload.message_id, user.name, e,
+                       extra={"event": "reaction_message_unavailable", "guild_id": guild_id, "user_id": user.id})
+        return
+    if not wish.is_wish or wish.wrong_time:
+        EVENTS_HANDLED.inc(event="reaction", outcome="ignored")
+        return
     
-    # Create today's wish time and check if within buffer (60s wish minute + buffer)
-    wish_hour, wish_minute = map(int, config.WISH_TIME.split(':'))
-    wish_time_today = london_time.replace(hour=wish_hour, minute=wish_minute, second=0, microsecond=0)
-    time_diff = (london_time - wish_time_today).total_seconds()
-    is_correct_time = 0 <= time_diff <= (60 + config.WISH_BUFFER_TIME)
+    # Check if the reaction is being made at wish time + buffer (60s wish minute + buffer)
+    now = wish_clock.wall_time()
+    is_correct_time = in_reaction_window(now)
+    london_time = datetime.fromtimestamp(now, LONDON_TZ)
     
+    EVENTS_HANDLED.inc(event="reaction", outcome="on_time" if is_correct_time else "late")
     if is_correct_time:
-        print(f"{server_tag} 🌟 {user.name} made a wish on time at {london_time.strftime('%H:%M')}!")
+        logger.info("%s 🌟 %s made a wish on time at %02d:%02d!", server_tag, user.name, london_time.hour, london_time.minute,
+                    extra={"event": "wish_reaction", "guild_id": guild_id, "user_id": user.id})
         
         # Record successful wish to Firestore (async, no await - arrayUnion handles duplicates)
-        asyncio.create_task(record_user(guild_id, user.id, on_time=True))
+        start_background(record_user(guild_id, user.id, on_time=True), "record_user")
         
         # Track successful wish for summary message (still needed for in-memory summary)
-        track_successful_wish(reaction.message.guild, user, reaction.message.channel)
+        track_successful_wish(guild, user, channel)
         
         # Debug message for successful wish reaction
         if is_debug_mode(guild_id):
-            await reaction.message.channel.send(f"🐛 **DEBUG:** {user.mention} successfully made a wish at {london_time.strftime('%H:%M')}! ✨")
+            await channel.send(f"🐛 **DEBUG:** {user.mention} successfully made a wish at {london_time.strftime('%H:%M')}! ✨")
     else:
-        print(f"{server_tag} 😤 {user.name} tried to make a wish at {london_time.strftime('%H:%M')} but it wasn't at {config.WISH_TIME}... assigning shame role and recording")
+        logger.info("%s 😤 %s tried to make a wish at %02d:%02d but it wasn't at %s... assigning shame role and recording", server_tag, user.name, london_time.hour, london_time.minute, config.WISH_TIME,
+                    extra={"event": "wish_reaction_late", "guild_id": guild_id, "user_id": user.id})
         # Fire off both shame role assignment and Firestore recording as background tasks
-        asyncio.create_task(assign_shame_role(reaction.message.guild, user, bot))
-        asyncio.create_task(record_user(guild_id, user.id, on_time=False))
-
-class HealthCheckHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        self.send_response(200)
-        self.end_headers()
-        self.wfile.write(b'OK')
-    
-    def log_message(self, format, *args):
-        pass  # Suppress logs
-
-def start_health_server():
-    port = int(os.getenv('PORT', 8080))
-    HTTPServer(('', port), HealthCheckHandler).serve_forever()
+        start_background(assign_shame_role(guild, user, bot), "assign_shame_role")
+        start_background(record_user(guild_id, user.id, on_time=False), "record_user")
 
 if __name__ == "__main__":
-    # Start health check server in background thread
-    health_thread = threading.Thread(target=start_health_server, daemon=True)
-    health_thread.start()
+    setup_logging()
     
     bot_token = os.getenv("DISCORD_BOT_TOKEN")
-    bot.run(bot_token) 
\ No newline at end of file
+    bot.run(bot_token, log_handler=None)  # Logging is configured by setup_logging 
\ No newline at end of file
@@ -0,0 +1,75 @@
+import discord
+import logging
+import os
+from .config import SHAME_ROLE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Lean member cache: no member chunking at startup and an empty MemberCacheFlags, so discord.py
+# only keeps the bot's own member. The bot then caches shame role holders itself (role.members
+# scans the member cache, so it only ever sees cached members) and looks up leaderboard names
+# over the gateway when it needs them.
+LEAN_MEMBER_CACHE = os.getenv("LEAN_MEMBER_CACHE", "0").lower() in ("1", "true", "yes")
+# Gateway member queries take at most 100 user IDs
+MEMBER_QUERY_BATCH = 100
+
+def get_member_cache_options():
+    """Bot keyword arguments for the member cache policy (discord.py's defaults unless lean)"""
+    if not LEAN_MEMBER_CACHE:
+        return {}
+    return {"chunk_guilds_at_startup": False, "member_cache_flags": discord.MemberCacheFlags.none()}
+
+def keep_member(guild, member):
+    """Cache a member (a new shame role holder) so role.members and role updates see it"""
+    # MemberCacheFlags has no per-role policy, so holders are added to the guild's cache directly.
+    # Guild._add_member is private discord.py API (discord.py is pinned in requirements.txt for it):
+    # a map of our own would not do, since on_member_update is only dispatched for cached members
+    if LEAN_MEMBER_CACHE and isinstance(member, discord.Member) and guild.get_member(member.id) is None:
+        guild._add_member(member)
+
+def forget_members(guild, members):
+    """Drop members that no longer hold the shame role from the cache (never the bot itself)"""
+    if not LEAN_MEMBER_CACHE:
+        return 0
+    forgotten = 0
+    for member in members:
+        if member.id != guild.me.id and guild.get_member(member.id) is not None:
+            guild._remove_member(member)  # Private API, the counterpart of _add_member in keep_member
+            forgotten += 1
+    return forgotten
+
+async def forget_former_holder(before, after):
+    """on_member_update listener: stop caching a member once they lose the shame role (e.g. removed by hand)"""
+    role_id = SHAME_ROLE_CONFIG.get(after.guild.id)
+    if role_id and before.get_role(role_id) and not after.get_role(role_id):
+        forget_members(after.guild, [after])
+
+async def query_members(guild, user_ids):
+    """Look up members over the gateway in batches, without caching them -> {user_id: Member}"""
+    members = {}
+    user_ids = [int(user_id) for user_id in user_ids]
+    for start in range(0, len(user_ids), MEMBER_QUERY_BATCH):
+        batch = user_ids[start:start + MEMBER_QUERY_BATCH]
+        for member in await guild.query_members(user_ids=batch, limit=len(batch), cache=False):
+            members[member.id] = member
+    return members
+
+async def get_display_names(guild, user_ids):
+    """Display names for a few users -> {user_id (str): name}, fetching uncached members in lean mode"""
+    names = {}
+    missing = []
+    for user_id in user_ids:
+        member = guild.get_member(int(user_id))
+        if member:
+            names[str(user_id)] = member.display_name
+        else:
+            missing.append(user_id)
+
+    if missing and LEAN_MEMBER_CACHE:
+        try:
+            for member_id, member in (await query_members(guild, missing)).items():
+                names[str(member_id)] = member.display_name
+        except Exception as e:
+            # Members that left (or a timed-out query) are shown as mentions instead
+            logger.warning("[%s] ⚠️ Failed to look up %s member name(s): %s", guild.name, len(missing), e)
+    return names
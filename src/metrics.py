@@ -0,0 +1,136 @@
+import bisect
+import time
+from contextlib import contextmanager
+
+# Minimal Prometheus instrumentation - counters, gauges and histograms with labels, rendered in
+# the text exposition format by render(). Everything is updated from the event loop thread,
+# so no locking is needed.
+
+REGISTRY = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self):
+        return []
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, label_values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, label_values, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        return [("", key, None, value) for key, value in sorted(self._values.items())]
+
+class Gauge(Metric):
+    """A gauge that is either set directly or read from a callback at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        self._function = function
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+    def samples(self):
+        if self._function is not None:
+            values = self._function()
+            if not isinstance(values, dict):
+                values = {(): values}
+            return [("", key if isinstance(key, tuple) else (key,), None, value) for key, value in sorted(values.items())]
+        return [("", key, None, value) for key, value in sorted(self._values.items())]
+
+class Histogram(Metric):
+    kind = "histogram"
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the with-block takes, in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        samples = []
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                samples.append(("_bucket", key, ("le", _format_value(bound)), cumulative))
+            samples.append(("_count", key, None, cumulative))
+            samples.append(("_sum", key, None, series[-1]))
+        return samples
+
+def render():
+    """All registered metrics in the Prometheus text exposition format"""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+# Shared metrics, instrumented where the work happens
+EVENTS_HANDLED = Counter("drshamer_events_total", "Gateway events handled, by event type and outcome", ["event", "outcome"])
+STORAGE_LATENCY = Histogram("drshamer_storage_latency_seconds", "Storage backend call latency (executor queueing included)", ["backend", "operation"])
+STORAGE_ERRORS = Counter("drshamer_storage_errors_total", "Failed or timed-out storage backend calls", ["backend", "operation"])
+DISCORD_REST_LATENCY = Histogram("drshamer_discord_rest_latency_seconds", "Discord REST request latency (rate-limit waits included)", ["method", "route"])
+SINGLE_FLIGHT_CALLS = Counter("drshamer_single_flight_calls_total", "Coalesced operations (shame role clean-ups, role assignments, message fetches), by whether the call ran it or joined a run in flight", ["action", "result"])
+ROLE_OPERATIONS = Counter("drshamer_role_operations_total", "Shame role add/remove operations, by action and result", ["action", "result"])
+BACKGROUND_TASKS_STARTED = Counter("drshamer_background_tasks_started_total", "Background tasks started, by kind", ["kind"])
+EVENT_LOOP_LAG = Histogram("drshamer_event_loop_lag_seconds", "How late the event loop ran a scheduled wake-up", buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+HANDLER_LATENCY = Histogram("drshamer_handler_latency_seconds", "Duration of watched handlers (watchdog enabled only)", ["handler"])
+SLOW_CALLBACKS = Counter("drshamer_slow_callbacks_total", "Handlers over the watchdog threshold and event-loop stalls", ["kind", "name"])
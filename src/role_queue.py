@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import os
+import time
+import discord
+from .metrics import ROLE_OPERATIONS
+from .sharding import register_guild_state
+
+logger = logging.getLogger(__name__)
+# One line per member changed - silence with LOG_LEVELS=src.role_queue.members=WARNING
+member_logger = logging.getLogger(f"{__name__}.members")
+
+def get_server_tag(guild):
+    """Get server name tag for logging"""
+    return f"[{guild.name}]" if guild else "[Unknown]"
+
+# How many role requests per guild may be in flight at once. Every add/remove for a guild shares
+# one Discord rate-limit bucket, and discord.py already waits on that bucket internally, so a
+# small number keeps requests flowing without stacking up retries behind a 429.
+ROLE_QUEUE_CONCURRENCY = int(os.getenv("ROLE_QUEUE_CONCURRENCY", "3"))
+
+class RoleAction:
+    """A pending role add/remove for one member"""
+    
+    def __init__(self, member, role, add, reason):
+        self.member = member
+        self.role = role
+        self.add = add
+        self.reason = reason
+        self.future = asyncio.get_running_loop().create_future()
+    
+    @property
+    def key(self):
+        return (self.member.id, self.role.id)
+    
+    def resolve(self, result):
+        if not self.future.done():
+            self.future.set_result(result)
+
+class RoleActionQueue:
+    """Per-guild queue of role mutations with bounded concurrency and redundant-operation dropping"""
+    
+    def __init__(self, guild, concurrency=ROLE_QUEUE_CONCURRENCY):
+        self.guild = guild
+        self.concurrency = concurrency
+        self.stats = {"queued": 0, "joined": 0, "applied": 0, "skipped": 0, "dropped": 0, "failed": 0, "rate_limited": 0}
+        self.last_drain_seconds = None
+        self._pending = {}  # (member_id, role_id) -> RoleAction, insertion ordered
+        self._in_flight = {}  # (member_id, role_id) -> RoleAction being applied
+        self._worker_count = 0
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._busy_since = None
+        self._paused_until = 0
+    
+    @property
+    def depth(self):
+        """Operations waiting or in flight"""
+        return len(self._pending) + len(self._in_flight)
+    
+    def submit(self, member, role, add, reason):
+        """Queue a role change and return a future resolving to True if a request was made"""
+        action = RoleAction(member, role, add, reason)
+        previous = self._pending.get(action.key)
+        if previous is not None:
+            if previous.add == add:
+                # Identical change already waiting - share its outcome
+                return self._join(previous)
+            # The later operation wins (e.g. add followed by remove); the earlier one never runs
+            self.stats["dropped"] += 1
+            ROLE_OPERATIONS.inc(action="add" if previous.add else "remove", result="dropped")
+            previous.resolve(False)
+            del self._pending[action.key]
+        
+        applying = self._in_flight.get(action.key)
+        if applying is not None and applying.add == add:
+            # Identical change already being applied - the member cache may not show it yet, so a second request would repeat it
+            return self._join(applying)
+        
+        self._pending[action.key] = action
+        self.stats["queued"] += 1
+        if self._busy_since is None:
+            self._busy_since = time.perf_counter()
+            self._drained.clear()
+        while self._worker_count < self.concurrency and self._worker_count < len(self._pending):
+            self._worker_count += 1
+            asyncio.create_task(self._worker())
+        return action.future
+    
+    def _join(self, action):
+        self.stats["joined"] += 1
+        ROLE_OPERATIONS.inc(action="add" if action.add else "remove", result="joined")
+        return action.future
+    
+    async def wait_drained(self):
+        """Wait until every queued operation has finished"""
+        await self._drained.wait()
+    
+    def _next_action(self):
+        # Skip members whose previous operation is still in flight so changes apply in order
+        for key, action in self._pending.items():
+            if key not in self._in_flight:
+                del self._pending[key]
+                return action
+        return None
+    
+    async def _worker(self):
+        server_tag = get_server_tag(self.guild)
+        while True:
+            action = self._next_action()
+            if action is None:
+                self._worker_count -= 1
+                break
+            
+            self._in_flight[action.key] = action
+            try:
+                await self._apply(action, server_tag)
+            finally:
+                self._in_flight.pop(action.key, None)
+        
+        if not self._pending and not self._in_flight and self._busy_since is not None:
+            self.last_drain_seconds = time.perf_counter() - self._busy_since
+            self._busy_since = None
+            self._drained.set()
+            logger.info("%s 🧾 Role queue drained in %.2fs (%s applied, %s joined, %s skipped, %s dropped, %s failed so far)", server_tag, self.last_drain_seconds, self.stats['applied'], self.stats['joined'], self.stats['skipped'], self.stats['dropped'], self.stats['failed'],
+                        extra={"event": "role_queue_drained", "guild_id": self.guild.id, "latency_ms": round(self.last_drain_seconds * 1000, 1), **self.stats})
+    
+    async def _apply(self, action, server_tag):
+        member, role = action.member, action.role
+        
+        # Nothing to do if the member is already in the requested state
+        action_name = "add" if action.add else "remove"
+        if (role in member.roles) == action.add:
+            self.stats["skipped"] += 1
+            ROLE_OPERATIONS.inc(action=action_name, result="skipped")
+            action.resolve(False)
+            return
+        
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        
+        try:
+            if action.add:
+                await member.add_roles(role, reason=action.reason)
+                member_logger.info("%s 🔴 Added '%s' role to %s", server_tag, role.name, member.name,
+                                   extra={"event": "role_added", "guild_id": self.guild.id, "user_id": member.id})
+            else:
+                await member.remove_roles(role, reason=action.reason)
+                member_logger.info("%s 🧹 Removed '%s' role from %s", server_tag, role.name, member.name,
+                                   extra={"event": "role_removed", "guild_id": self.guild.id, "user_id": member.id})
+            self.stats["applied"] += 1
+            ROLE_OPERATIONS.inc(action=action_name, result="applied")
+            action.resolve(True)
+        except discord.HTTPException as e:
+            if e.status == 429:
+                # discord.py gave up retrying - back off the whole queue before the next request
+                self.stats["rate_limited"] += 1
+                retry_after = float(e.response.headers.get("Retry-After", 1)) if e.response is not None else 1
+                self._paused_until = time.monotonic() + retry_after
+            self.stats["failed"] += 1
+            ROLE_OPERATIONS.inc(action=action_name, result="rate_limited" if e.status == 429 else "failed")
+            logger.error("%s ❌ Failed to %s role for %s: %s", server_tag, 'add' if action.add else 'remove', member.name, e)
+            if e.code == 50013:
+                logger.warning("%s 💡 Permission error - check bot role hierarchy and permissions", server_tag)
+            action.resolve(False)
+        except Exception as e:
+            self.stats["failed"] += 1
+            ROLE_OPERATIONS.inc(action=action_name, result="failed")
+            logger.error("%s ❌ Failed to %s role for %s: %s", server_tag, 'add' if action.add else 'remove', member.name, e)
+            action.resolve(False)
+
+# One queue per guild
+role_queues = register_guild_state("role_queues", {})  # guild_id -> RoleActionQueue
+
+def get_role_queue(guild):
+    """Get (or create) the role action queue for a guild"""
+    queue = role_queues.get(guild.id)
+    if queue is None:
+        queue = role_queues[guild.id] = RoleActionQueue(guild)
+    queue.guild = guild
+    return queue
@@ -1,30 +1,45 @@
 import asyncio
 import discord
-from datetime import datetime, time, timedelta
+import logging
+import os
+import time
+from datetime import datetime
 from .config import config, LONDON_TZ, SHAME_SUMMARY_CONFIG
-from .firestore_db import get_daily_shamers
-from .utils import get_server_tag, get_shame_summary_channel_name
+from .firestore_db import get_daily_shamers, get_day_logs, flush_pending_records
+from .utils import get_server_tag, get_shame_summary_channel_name, get_guild_capabilities
 from .shame_reactions import get_random_shame_reaction
+from .metrics import BACKGROUND_TASKS_STARTED
+from .watchdog import timed
+from .sharding import owned_guilds
+from .startup import wait_until_warmed_up
+from .wish_clock import next_shame_at
+
+logger = logging.getLogger(__name__)
 
 # Store reference to the current shame summary task
 current_shame_task = None
 
-async def send_shame_summary(guild, channel):
-    """Send daily shame summary for a guild"""
+# How many guilds' shame summaries may be sending at once
+SHAME_SUMMARY_CONCURRENCY = int(os.getenv("SHAME_SUMMARY_CONCURRENCY", "10"))
+
+@timed("send_shame_summary")
+async def send_shame_summary(guild, channel, shamers=None):
+    """Send daily shame summary for a guild; returns True if a message was sent"""
     server_tag = get_server_tag(guild)
     guild_id = guild.id
     
     # Check if shame summary is enabled for this guild
     if not SHAME_SUMMARY_CONFIG.get(guild_id, True):
-        print(f"{server_tag} ⏭️ Shame summary disabled for this guild")
-        return
+        logger.info(f"{server_tag} ⏭️ Shame summary disabled for this guild")
+        return False
     
-    # Get today's shamers from Firestore
-    shamers = get_daily_shamers(guild_id)
+    # Get today's shamers from Firestore (unless already fetched in a batch)
+    if shamers is None:
+        shamers = await get_daily_shamers(guild_id)
     
     if not shamers:
-        print(f"{server_tag} 😊 No shamers today - skipping shame summary")
-        return
+        logger.info(f"{server_tag} 😊 No shamers today - skipping shame summary")
+        return False
     
     # Convert user IDs to user mentions (simple format)
     shamer_mentions = [f"<@{user_id}>" for user_id in shamers]
@@ -54,57 +69,108 @@ async def send_shame_summary(guild, channel):
     embed.set_image(url=reaction["gif_url"])
     
     await channel.send(embed=embed)
-    print(f"{server_tag} 📋 Sent shame summary for {len(shamer_mentions)} users")
+    logger.info(f"{server_tag} 📋 Sent shame summary for {len(shamer_mentions)} users")
+    return True
 
 async def wait_until_shame_time():
     """Wait until the next shame time (22:22 London time)"""
+    last_shame_at = 0
     while True:
-        now = datetime.now(LONDON_TZ)
-        shame_hour, shame_minute = map(int, config.SHAME_TIME.split(':'))
-        
-        # Calculate next shame time
-        shame_time_today = now.replace(hour=shame_hour, minute=shame_minute, second=0, microsecond=0)
-        
-        if now >= shame_time_today:
-            # If we've passed today's shame time, wait until tomorrow
-            shame_time_next = shame_time_today + timedelta(days=1)
-        else:
-            # Wait until today's shame time
-            shame_time_next = shame_time_today
+        # Never the same shame time twice, even if the sleep wakes up a little early
+        now = time.time()
+        shame_at = next_shame_at(max(now, last_shame_at))
         
-        sleep_seconds = (shame_time_next - now).total_seconds()
-        print(f"⏰ Waiting {sleep_seconds:.0f} seconds until next shame time at {shame_time_next.strftime('%H:%M')} London time")
+        sleep_seconds = shame_at - now
+        logger.info(f"⏰ Waiting {sleep_seconds:.0f} seconds until next shame time at {datetime.fromtimestamp(shame_at, LONDON_TZ).strftime('%H:%M')} London time")
         
         await asyncio.sleep(sleep_seconds)
+        last_shame_at = shame_at
         
         # Send shame summaries to all guilds
         yield
 
+def log_summary_outcome(guild, outcome, reason=None, **fields):
+    """Log one guild's shame summary outcome as a single structured line"""
+    entry = {"event": "shame_summary", "guild_id": guild.id, "guild": guild.name, "outcome": outcome}
+    if reason:
+        entry["reason"] = reason
+    entry.update(fields)
+    logger.info(f"{get_server_tag(guild)} 📋 Shame summary {outcome}" + (f" ({reason})" if reason else ""), extra=entry)
+    return outcome
+
+async def send_all_shame_summaries(bot):
+    """Send today's shame summary to every guild on this process's shards: one batched read, bounded concurrent sends"""
+    started = time.perf_counter()
+    outcomes = []
+    guilds = owned_guilds(bot)
+    
+    # Work out where each guild's summary goes before touching Firestore
+    targets = []
+    for guild in guilds:
+        if not SHAME_SUMMARY_CONFIG.get(guild.id, True):
+            outcomes.append(log_summary_outcome(guild, "skipped", "disabled"))
+            continue
+        
+        # Resolved with the guild's capabilities (a missing channel was warned about when it went missing)
+        channel_id = get_guild_capabilities(guild, bot).summary_channel_id
+        target_channel = guild.get_channel(channel_id) if channel_id else None
+        if target_channel:
+            targets.append((guild, target_channel))
+        else:
+            outcomes.append(log_summary_outcome(guild, "failed", "channel_not_found", channel=get_shame_summary_channel_name(guild.id)))
+    
+    # Make sure shames recorded in the last few seconds are included, then read every guild's day at once
+    await flush_pending_records()
+    day_logs = await get_day_logs([guild.id for guild, _ in targets])
+    
+    semaphore = asyncio.Semaphore(SHAME_SUMMARY_CONCURRENCY)
+    
+    async def send_one(guild, channel):
+        if day_logs is None:
+            return log_summary_outcome(guild, "failed", "storage_unavailable")
+        shamers = day_logs.get(guild.id, {}).get("shamed", [])
+        if not shamers:
+            return log_summary_outcome(guild, "skipped", "no_shamers")
+        
+        async with semaphore:
+            send_started = time.perf_counter()
+            try:
+                await send_shame_summary(guild, channel, shamers)
+            except Exception as e:
+                logger.error(f"{get_server_tag(guild)} ❌ Failed to send shame summary: {e}")
+                return log_summary_outcome(guild, "failed", "send_error", error=str(e))
+            latency_ms = round((time.perf_counter() - send_started) * 1000, 1)
+            return log_summary_outcome(guild, "sent", shamers=len(shamers), latency_ms=latency_ms)
+    
+    outcomes.extend(await asyncio.gather(*(send_one(guild, channel) for guild, channel in targets)))
+    
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"🔔 Shame summary run finished in {duration_ms:.0f}ms", extra={
+        "event": "shame_summary_run",
+        "guilds": len(guilds),
+        "sent": outcomes.count("sent"),
+        "skipped": outcomes.count("skipped"),
+        "failed": outcomes.count("failed"),
+        "latency_ms": duration_ms,
+    })
+
 async def shame_summary_task(bot):
     """Background task that sends shame summaries at 22:22 every day"""
-    print(f"🔔 Started daily shame summary task for {config.SHAME_TIME} London time")
+    await wait_until_warmed_up(timeout=None)
+    logger.info(f"🔔 Started daily shame summary task for {config.SHAME_TIME} London time")
     
     async for _ in wait_until_shame_time():
-        print(f"🔔 Sending daily shame summaries at {datetime.now(LONDON_TZ).strftime('%H:%M')} London time")
-        
-        for guild in bot.guilds:
-            server_tag = get_server_tag(guild)
-            
-            # Get configured channel for this guild
-            channel_name = get_shame_summary_channel_name(guild.id)
-            target_channel = discord.utils.get(guild.text_channels, name=channel_name)
-            
-            if target_channel:
-                await send_shame_summary(guild, target_channel)
-            else:
-                print(f"{server_tag} ❌ Channel '{channel_name}' not found for shame summary")
-        
-        print(f"🔔 Completed daily shame summaries")
+        logger.info(f"🔔 Sending daily shame summaries at {datetime.now(LONDON_TZ).strftime('%H:%M')} London time")
+        await send_all_shame_summaries(bot)
+        logger.info(f"🔔 Completed daily shame summaries")
 
 def start_shame_summary_task(bot):
-    """Start the background shame summary task"""
+    """Start the background shame summary task (once - a running task is kept)"""
     global current_shame_task
+    if current_shame_task and not current_shame_task.done():
+        return current_shame_task
     current_shame_task = asyncio.create_task(shame_summary_task(bot))
+    BACKGROUND_TASKS_STARTED.inc(kind="shame_summary_scheduler")
     return current_shame_task
 
 def restart_shame_summary_task(bot):
@@ -114,9 +180,10 @@ def restart_shame_summary_task(bot):
     # Cancel the old task
     if current_shame_task and not current_shame_task.done():
         current_shame_task.cancel()
-        print(f"🔄 Cancelled old shame summary task")
+        logger.info(f"🔄 Cancelled old shame summary task")
     
     # Start new task
     current_shame_task = asyncio.create_task(shame_summary_task(bot))
-    print(f"🔄 Started new shame summary task for {config.SHAME_TIME}")
+    BACKGROUND_TASKS_STARTED.inc(kind="shame_summary_scheduler")
+    logger.info(f"🔄 Started new shame summary task for {config.SHAME_TIME}")
     return current_shame_task 
\ No newline at end of file
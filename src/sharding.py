@@ -0,0 +1,115 @@
+import logging
+import math
+import os
+
+logger = logging.getLogger(__name__)
+
+# Sharding (see docs/DEPLOYMENT.md):
+#   SHARD_COUNT unset - one gateway connection for every guild (commands.Bot)
+#   SHARD_COUNT=auto  - AutoShardedBot with Discord's recommended shard count, all in this process
+#   SHARD_COUNT=N     - N shards in total; this process runs SHARD_IDS (e.g. "0-3" or "0,2"), default all
+SHARD_COUNT = os.getenv("SHARD_COUNT", "").strip().lower()
+SHARD_IDS = os.getenv("SHARD_IDS", "").strip()
+
+def parse_shard_ids(spec, shard_count):
+    """Parse "0-3,6" into a sorted list of shard IDs, checked against the shard count"""
+    shard_ids = set()
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        first, _, last = item.partition("-")
+        shard_ids.update(range(int(first), int(last or first) + 1))
+    if not shard_ids:
+        raise ValueError(f"SHARD_IDS '{spec}' names no shards")
+    if min(shard_ids) < 0 or max(shard_ids) >= shard_count:
+        raise ValueError(f"SHARD_IDS '{spec}' is outside 0-{shard_count - 1} for SHARD_COUNT={shard_count}")
+    return sorted(shard_ids)
+
+def is_sharded():
+    """Whether the bot should be an AutoShardedBot"""
+    return bool(SHARD_COUNT)
+
+def get_shard_options():
+    """Keyword arguments for AutoShardedBot from SHARD_COUNT/SHARD_IDS (empty when unsharded or auto)"""
+    if SHARD_COUNT in ("", "auto"):
+        if SHARD_IDS:
+            raise ValueError("SHARD_IDS needs an explicit SHARD_COUNT")
+        return {}
+    shard_count = int(SHARD_COUNT)
+    options = {"shard_count": shard_count}
+    if SHARD_IDS:
+        options["shard_ids"] = parse_shard_ids(SHARD_IDS, shard_count)
+    return options
+
+def shard_id_for_guild(guild_id, shard_count):
+    """The shard Discord delivers a guild's events to"""
+    return (guild_id >> 22) % shard_count
+
+def get_shard_ids(bot):
+    """Shards run by this process ([0] when unsharded)"""
+    if getattr(bot, "shard_ids", None):
+        return list(bot.shard_ids)
+    if bot.shard_count:
+        return list(range(bot.shard_count))
+    return [bot.shard_id or 0]
+
+def owns_guild(bot, guild_id):
+    """Whether this process runs the shard that holds a guild"""
+    if not bot.shard_count or bot.shard_count <= 1:
+        return True
+    return shard_id_for_guild(guild_id, bot.shard_count) in get_shard_ids(bot)
+
+def owned_guilds(bot):
+    """The bot's guilds that belong to this process's shards"""
+    # A guild is only ever delivered to its own shard, but while shards are being re-split across
+    # processes (e.g. a rolling deploy with a new SHARD_COUNT) two processes can briefly both see it
+    return [guild for guild in bot.guilds if owns_guild(bot, guild.id)]
+
+def describe_shards(bot):
+    """Human-readable shard assignment for logs (e.g. shards 0-3 of 16)"""
+    if not bot.shard_count:
+        return "unsharded"
+    shard_ids = get_shard_ids(bot)
+    if shard_ids == list(range(shard_ids[0], shard_ids[-1] + 1)) and len(shard_ids) > 1:
+        return f"shards {shard_ids[0]}-{shard_ids[-1]} of {bot.shard_count}"
+    return f"shard{'s' if len(shard_ids) > 1 else ''} {','.join(map(str, shard_ids))} of {bot.shard_count}"
+
+# Per-guild state kept in module globals (wish windows, role queues, caches) registers here, so it
+# can be dropped when a guild leaves this process and counted per shard for /debug/shards
+guild_state = {}  # name -> dict keyed by guild_id
+
+def register_guild_state(name, mapping):
+    """Register a guild_id-keyed dict as per-guild state owned by the guild's shard"""
+    guild_state[name] = mapping
+    return mapping
+
+def drop_guild_state(guild_id):
+    """Forget everything held for a guild (it left the bot or moved to another process)"""
+    dropped = [name for name, mapping in guild_state.items() if mapping.pop(guild_id, None) is not None]
+    if dropped:
+        logger.info(f"🧹 Dropped state for guild {guild_id}: {', '.join(dropped)}", extra={"event": "guild_state_dropped", "guild_id": guild_id})
+    return dropped
+
+def get_shard_state(bot):
+    """Per-shard connection, latency, guild count and state entries, for /debug/shards"""
+    shard_count = bot.shard_count or 1
+    shards = {}
+    for shard_id in get_shard_ids(bot):
+        shard = bot.get_shard(shard_id) if hasattr(bot, "get_shard") else None
+        shards[shard_id] = {
+            "connected": not shard.is_closed() if shard else not bot.shard_count and not bot.is_closed(),
+            "latency_ms": round(shard.latency * 1000, 1) if shard and math.isfinite(shard.latency) else None,
+            "guilds": 0,
+            "state": {name: 0 for name in guild_state},
+        }
+    for guild in bot.guilds:
+        entry = shards.get(guild.shard_id if bot.shard_count else 0)
+        if entry:
+            entry["guilds"] += 1
+    for name, mapping in guild_state.items():
+        for guild_id in list(mapping):
+            entry = shards.get(shard_id_for_guild(guild_id, shard_count))
+            if entry:
+                entry["state"][name] += 1
+    return shards
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Start-up runs once per process, however often the gateway reconnects: discord.py fires on_ready
+# again whenever a session cannot be resumed. Gateway events that arrive while the caches are
+# still warming up wait (up to STARTUP_WARMUP_TIMEOUT) rather than reading cold state.
+STARTUP_WARMUP_TIMEOUT = float(os.getenv("STARTUP_WARMUP_TIMEOUT", "30"))
+
+def _process_started_at():
+    """Wall-clock time this process started (from /proc on Linux, otherwise now)"""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+startup_state = {
+    "process_started_at": _process_started_at(),
+    "phases": {},  # phase -> seconds after process start, in the order reached
+    "ready_count": 0,
+}
+_warmed_up = asyncio.Event()
+
+# Phases as they are reached: modules imported, logged in (setup_hook), first READY, caches warm
+STARTUP_PHASES = ("imported", "logged_in", "gateway_ready", "warmed_up")
+
+def mark_phase(phase):
+    """Record when a start-up phase was reached (only the first time)"""
+    if phase not in startup_state["phases"]:
+        startup_state["phases"][phase] = round(time.time() - startup_state["process_started_at"], 3)
+    return startup_state["phases"][phase]
+
+def note_ready():
+    """Count an on_ready; True only for the first one"""
+    startup_state["ready_count"] += 1
+    return startup_state["ready_count"] == 1
+
+def is_warmed_up():
+    return _warmed_up.is_set()
+
+async def wait_until_warmed_up(timeout=STARTUP_WARMUP_TIMEOUT):
+    """Wait for start-up to finish; False if it took longer than the timeout (None waits for good)"""
+    if _warmed_up.is_set():
+        return True
+    try:
+        await asyncio.wait_for(_warmed_up.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+async def warm_up(steps):
+    """Run the warm-up coroutines, log time-to-ready per phase, then let gateway events through"""
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(asyncio.gather(*steps), STARTUP_WARMUP_TIMEOUT)
+    except Exception as e:
+        # Handlers still work from cold caches, so a failed warm-up only costs latency
+        logger.error(f"❌ Start-up warm-up failed after {time.perf_counter() - started:.2f}s: {e!r}", extra={"event": "startup_warmup_failed"})
+    finally:
+        mark_phase("warmed_up")
+        _warmed_up.set()
+
+    phases = startup_state["phases"]
+    previous = 0
+    durations = {}
+    for phase in STARTUP_PHASES:
+        if phase in phases:
+            durations[phase] = round(phases[phase] - previous, 3)
+            previous = phases[phase]
+    logger.info(f"🚀 Ready {phases['warmed_up']:.2f}s after process start (" + ", ".join(f"{phase} +{seconds:.2f}s" for phase, seconds in durations.items()) + ")",
+                extra={"event": "startup_complete", "ready_s": phases["warmed_up"], "phases": durations})
+    return durations
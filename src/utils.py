@@ -1,20 +1,76 @@
 import asyncio
+import discord
+import logging
+import os
 import re
-from datetime import datetime
-from .config import config, LONDON_TZ, SHAME_ROLE_CONFIG, DEV_CHANNEL_CONFIG, DEBUG_MODE_CONFIG, SHAME_SUMMARY_CONFIG, SHAME_SUMMARY_CHANNEL_CONFIG
+from collections import namedtuple
+from datetime import datetime, timedelta
+from .config import config, LONDON_TZ, SHAME_ROLE_CONFIG, DEV_CHANNEL_CONFIG, DEBUG_MODE_CONFIG, SHAME_SUMMARY_CONFIG, SHAME_SUMMARY_CHANNEL_CONFIG, SHAME_ROLE_MODE_CONFIG, ROLE_ROTATION_MIN_HOLDERS
+from .role_queue import get_role_queue
+from .firestore_db import save_guild_settings, get_day_range, get_today_date
+from .member_cache import LEAN_MEMBER_CACHE, keep_member, forget_members, query_members
+from .watchdog import timed
+from .dedup import RecentValueCache, SingleFlight
+from .metrics import SINGLE_FLIGHT_CALLS, ROLE_OPERATIONS
+from .sharding import register_guild_state
+from .wish_clock import get_day_clock, wall_time
+from . import journal
 
-class WrongTimeException(Exception):
-    def __init__(self, used_time):
-        self.used_time = used_time
-        super().__init__(f"Wrong time used: {used_time}")
+logger = logging.getLogger(__name__)
+
+# Result of classify_wish_message: time_used is the first HH:MM in the message (or None),
+# wrong_time is True for wish messages naming a time other than config.WISH_TIME
+WishCheck = namedtuple("WishCheck", ["is_wish", "time_used", "wrong_time"])
+NOT_A_WISH = WishCheck(False, None, False)
+WISH_WITHOUT_TIME = WishCheck(True, None, False)
+
+TIME_PATTERN = re.compile(r'\b(\d{1,2}:\d{2})\b')
+
+# Wish classification per message ID, stored when on_message first sees a message so that every 🌠
+# reaction to it is a dict lookup rather than another pass over the content
+WISH_CLASSIFICATION_CACHE_SIZE = int(os.getenv("WISH_CLASSIFICATION_CACHE_SIZE", "4096"))
+wish_classifications = RecentValueCache(max_size=WISH_CLASSIFICATION_CACHE_SIZE, ttl=86400)
+
+# Operations keyed by (guild_id, action, target) that a caller joins when the same one is already
+# in flight: at 11:11 several wishes land within seconds and each asks for the same shame role
+# clean-up, and a member spamming late wishes asks for the same role assignment again and again
+def count_operation(key, joined):
+    SINGLE_FLIGHT_CALLS.inc(action=key[1], result="joined" if joined else "started")
+
+in_flight_operations = SingleFlight(on_call=count_operation)
+
+# When each guild's shame roles were last cleared (epoch seconds). The clean-up runs once per wish
+# window: a user shamed for a wrong-time wish after it keeps the role when more wishes come in.
+roles_cleared_at = register_guild_state("roles_cleared_at", {})
+
+# What the bot can do in a guild, resolved once rather than per event: the shame role (and why it
+# cannot be managed, if so) and the summary and dev channel IDs. Refreshed on role, channel and
+# bot member events, so a misconfigured guild is warned about once and then skipped in O(1).
+GuildCapabilities = namedtuple("GuildCapabilities", ["role_id", "role_problem", "summary_channel_id", "dev_channel_id"])
+guild_capabilities = register_guild_state("guild_capabilities", {})  # guild_id -> GuildCapabilities
+
+# Lean member cache: how far back to look for shamed members who may still hold the shame role
+SHAME_HOLDER_LOOKBACK_DAYS = int(os.getenv("SHAME_HOLDER_LOOKBACK_DAYS", "7"))
 
 def get_shame_role_id(guild_id):
     """Get the appropriate shame role ID for a server"""
     if guild_id not in SHAME_ROLE_CONFIG:
-        print(f"❌ Guild ID {guild_id} not found in SHAME_ROLE_CONFIG")
+        logger.error("❌ Guild ID %s not found in SHAME_ROLE_CONFIG", guild_id)
         return None
     return SHAME_ROLE_CONFIG[guild_id]
 
+def get_shame_role_mode(guild_id):
+    """Get how the shame role is cleared for a server ("remove" or "rotate")"""
+    return SHAME_ROLE_MODE_CONFIG.get(guild_id, "remove")  # Default to per-member removal
+
+def apply_guild_settings(guild_settings):
+    """Apply persisted per-guild settings (loaded from Firestore) on top of the hardcoded config"""
+    for guild_id, settings in guild_settings.items():
+        if "shame_role_id" in settings:
+            SHAME_ROLE_CONFIG[guild_id] = int(settings["shame_role_id"])
+        if "shame_role_mode" in settings:
+            SHAME_ROLE_MODE_CONFIG[guild_id] = settings["shame_role_mode"]
+
 def get_server_tag(guild):
     """Get server name tag for logging"""
     return f"[{guild.name}]" if guild else "[Unknown]"
@@ -35,110 +91,280 @@ def get_shame_summary_channel_name(guild_id):
     """Get the appropriate shame summary channel name for a server"""
     return SHAME_SUMMARY_CHANNEL_CONFIG.get(guild_id, get_dev_channel_name(guild_id))  # Default to dev channel
 
-def is_wish_message(message_content):
-    """Check if message is a wish format, raise exception if wrong time"""
-    text = message_content.lower().strip()
+def classify_wish_message(message_content):
+    """Check if message is a wish format and whether it names the wrong time"""
+    # One lowercase copy, reused by every check below. For typical short chat messages a plain
+    # substring test on it beats a case-insensitive regex scan, and most messages stop here.
+    text = message_content.lower()
+    if "wish" not in text:
+        return NOT_A_WISH
     
     # Check for valid wish patterns
-    has_make_wish = "make a wish" in text
-    has_wish_with_star = "wish" in text and "🌠" in message_content  # Use original for emoji
+    if "make a wish" not in text and "🌠" not in message_content:
+        return NOT_A_WISH
     
-    if not (has_make_wish or has_wish_with_star):
-        return False
-    
-    # If it's a wish message, check for time and validate
-    time_match = re.search(r'\b(\d{1,2}:\d{2})\b', text)
-    if time_match:
-        used_time = time_match.group(1)
-        if used_time != config.WISH_TIME:
-            raise WrongTimeException(used_time)
-    
-    return True
+    # Compare against the current config so runtime wish time changes apply immediately
+    time_match = TIME_PATTERN.search(text)
+    if not time_match:
+        return WISH_WITHOUT_TIME
+    used_time = time_match.group(1)
+    return WishCheck(True, used_time, used_time != config.WISH_TIME)
+
+def classify_message(message_id, message_content):
+    """Classify a message and remember the result for reactions to it"""
+    wish = classify_wish_message(message_content)
+    wish_classifications.put(message_id, wish)
+    return wish
 
+def get_cached_classification(message_id):
+    """The stored classification of a message (None if unknown), checked against the current wish time"""
+    wish = wish_classifications.get(message_id)
+    if wish is None or wish.time_used is None:
+        return wish
+    # The wish time can change at runtime - the time named in the message is what was cached
+    wrong_time = wish.time_used != config.WISH_TIME
+    return wish if wish.wrong_time == wrong_time else WishCheck(True, wish.time_used, wrong_time)
+
+def forget_classification(message_id):
+    """Drop a message's stored classification (it was edited)"""
+    wish_classifications.discard(message_id)
+
+def get_manageable_shame_role(guild, bot, action):
+    """The guild's shame role if the bot can manage it, otherwise None (the problem was already warned about)"""
+    capabilities = get_guild_capabilities(guild, bot)
+    role = guild.get_role(capabilities.role_id) if not capabilities.role_problem else None
+    if role is None:
+        if not capabilities.role_problem:
+            # Deleted since the last refresh (its delete event has not been handled yet)
+            refresh_guild_capabilities(guild, bot, "shame role missing")
+        ROLE_OPERATIONS.inc(action=action, result="unavailable")
+    return role
+
+def mark_roles_cleared(guild_id, mode, count):
+    """Remember (and journal) that a guild's shame roles were cleared for the current wish window"""
+    roles_cleared_at[guild_id] = wall_time()
+    journal.append("roles_cleared", guild_id=guild_id, mode=mode, count=count)
+
+def restore_roles_cleared(cleared):
+    """Take the clean-up times recovered from the journal, so a restart mid-window does not clear again"""
+    for guild_id, cleared_at in cleared.items():
+        roles_cleared_at[guild_id] = max(cleared_at, roles_cleared_at.get(guild_id, 0))
+
+@timed("remove_shame_roles")
 async def remove_shame_roles(guild, bot):
-    """Remove the dunce role from all users when a new wish is detected"""
+    """Remove the dunce role from all users when a new wish is detected (joining a clean-up already running)"""
+    if roles_cleared_at.get(guild.id, 0) >= get_day_clock().wish_start:
+        return  # Already cleared for this wish window (maybe before a restart)
+    await in_flight_operations.run((guild.id, "clear_shame_roles", SHAME_ROLE_CONFIG.get(guild.id)), lambda: clear_shame_roles(guild, bot))
+
+async def clear_shame_roles(guild, bot):
+    """One shame role clean-up run: rotate the role or queue its removal from every holder"""
     server_tag = get_server_tag(guild)
     try:
-        role_id = get_shame_role_id(guild.id)
-        role = guild.get_role(role_id)
+        # Role, permission and hierarchy checks were resolved when the guild's capabilities were last refreshed
+        role = get_manageable_shame_role(guild, bot, "remove")
         if not role:
-            print(f"{server_tag} ❌ Role with ID {role_id} not found in {guild.name} (Guild ID: {guild.id})")
-            return
-        
-        # Check bot permissions before attempting to remove roles
-        bot_member = guild.get_member(bot.user.id)
-        if not bot_member.guild_permissions.manage_roles:
-            print(f"{server_tag} ❌ Bot missing 'Manage Roles' permission")
             return
         
-        # Check role hierarchy
-        bot_top_role = bot_member.top_role
-        if bot_top_role.position <= role.position:
-            print(f"{server_tag} ❌ Bot role '{bot_top_role.name}' (pos: {bot_top_role.position}) is not higher than target role '{role.name}' (pos: {role.position})")
-            return
+        # In rotate mode, replace the role itself instead of removing it member by member
+        if get_shame_role_mode(guild.id) == "rotate" and len(role.members) >= ROLE_ROTATION_MIN_HOLDERS:
+            holders = role.members
+            holder_count = len(holders)
+            if await rotate_shame_role(guild, role):
+                refresh_guild_capabilities(guild, bot, "shame role rotated")
+                forget_members(guild, holders)
+                mark_roles_cleared(guild.id, "rotate", holder_count)
+                logger.info("%s ✨ Cleared dunce roles from %s users for new wish by rotating the role", server_tag, holder_count,
+                            extra={"event": "shame_roles_cleared", "guild_id": guild.id, "mode": "rotate", "count": holder_count})
+                return
+            logger.info("%s ↩️ Falling back to removing '%s' member by member", server_tag, role.name)
         
-        # Remove the role from all members who have it
-        removed_count = 0
-        members_with_role = [member for member in guild.members if role in member.roles]
+        # Queue removal for everyone holding the role (role.members avoids scanning every member)
+        queue = get_role_queue(guild)
+        holders = role.members
+        removals = [queue.submit(member, role, False, "New wish detected - fresh start") for member in holders]
+        if removals:
+            logger.info("%s 🧹 Queued '%s' removal for %s users (queue depth %s)", server_tag, role.name, len(removals), queue.depth)
         
-        # Process in batches to avoid blocking the event loop
-        for member in members_with_role:
-            try:
-                await member.remove_roles(role, reason="New wish detected - fresh start")
-                print(f"{server_tag} 🧹 Removed '{role.name}' role from {member.name}")
-                removed_count += 1
-            except Exception as e:
-                print(f"{server_tag} ❌ Failed to remove role from {member.name}: {e}")
-            
-            # Yield control back to event loop every few operations to prevent blocking
-            if removed_count % 5 == 0:
-                await asyncio.sleep(0)
+        # Wait for the queue to work through them with bounded concurrency
+        results = await asyncio.gather(*removals)
+        removed_count = sum(1 for removed in results if removed)
+        forget_members(guild, [member for member, removed in zip(holders, results) if removed])
+        if removed_count == len(holders):
+            mark_roles_cleared(guild.id, "remove", removed_count)  # Otherwise the next wish retries the rest
         
         if removed_count > 0:
-            print(f"{server_tag} ✨ Cleared dunce roles from {removed_count} users for new wish")
+            logger.info("%s ✨ Cleared dunce roles from %s users for new wish in %.2fs", server_tag, removed_count, queue.last_drain_seconds or 0,
+                        extra={"event": "shame_roles_cleared", "guild_id": guild.id, "mode": "remove", "count": removed_count, "latency_ms": round((queue.last_drain_seconds or 0) * 1000, 1)})
         else:
-            print(f"{server_tag} ✨ No users had dunce roles to remove")
+            logger.info("%s ✨ No users had dunce roles to remove", server_tag)
     except Exception as e:
-        print(f"{server_tag} ❌ Error removing dunce roles: {e}")
+        logger.error("%s ❌ Error removing dunce roles: %s", server_tag, e, extra={"event": "shame_roles_error", "guild_id": guild.id})
         if "50013" in str(e):
-            print(f"{server_tag} 💡 Permission error - check bot role hierarchy and permissions")
+            logger.warning("%s 💡 Permission error - check bot role hierarchy and permissions", server_tag)
+
+async def delete_role_quietly(role, server_tag):
+    """Delete a half-created rotation role, logging instead of raising on failure"""
+    try:
+        await role.delete(reason="Role rotation failed")
+    except discord.HTTPException as e:
+        logger.error("%s ❌ Failed to clean up new role %s: %s", server_tag, role.id, e)
+
+async def rotate_shame_role(guild, role):
+    """Replace the shame role with an identical new one and delete the old one, clearing it from everyone"""
+    server_tag = get_server_tag(guild)
+    new_role = None
+    try:
+        new_role = await guild.create_role(
+            name=role.name,
+            permissions=role.permissions,
+            colour=role.colour,
+            hoist=role.hoist,
+            mentionable=role.mentionable,
+            reason="New wish detected - fresh start (role rotation)"
+        )
+        if new_role.position != role.position:
+            await new_role.edit(position=role.position, reason="Role rotation - keep the old position")
+    except discord.HTTPException as e:
+        # Typically missing permission to move roles - undo and let the caller remove per member
+        logger.error("%s ❌ Could not recreate '%s' at position %s: %s", server_tag, role.name, role.position, e)
+        if new_role:
+            await delete_role_quietly(new_role, server_tag)
+        return None
+    
+    try:
+        await role.delete(reason="New wish detected - fresh start (role rotation)")
+    except discord.HTTPException as e:
+        logger.error("%s ❌ Failed to delete old role %s, keeping it: %s", server_tag, role.id, e)
+        await delete_role_quietly(new_role, server_tag)
+        return None
+    
+    SHAME_ROLE_CONFIG[guild.id] = new_role.id
+    if not await save_guild_settings(guild.id, shame_role_id=new_role.id):
+        logger.warning("%s ⚠️ Rotated shame role ID %s is not persisted - it will be lost on restart", server_tag, new_role.id)
+    
+    logger.info("%s 🔄 Rotated '%s' role %s -> %s", server_tag, role.name, role.id, new_role.id,
+                extra={"event": "shame_role_rotated", "guild_id": guild.id, "old_role_id": role.id, "role_id": new_role.id})
+    return new_role
 
 async def assign_shame_role(guild, user, bot):
-    """Assign the 'dunce' role to a user"""
+    """Assign the 'dunce' role to a user (joining an assignment to them already running)"""
+    return await in_flight_operations.run((guild.id, "assign_shame_role", user.id), lambda: add_shame_role(guild, user, bot))
+
+async def add_shame_role(guild, user, bot):
+    """One shame role assignment: skip misconfigured guilds and current holders, then queue the add"""
     server_tag = get_server_tag(guild)
     try:
-        role_id = get_shame_role_id(guild.id)
-        role = guild.get_role(role_id)
+        # Role, permission and hierarchy checks were resolved when the guild's capabilities were last refreshed
+        role = get_manageable_shame_role(guild, bot, "add")
         if not role:
-            print(f"{server_tag} ❌ Role with ID {role_id} not found in {guild.name} (Guild ID: {guild.id})")
             return False
         
         # Check if user already has the shame role
         if role in user.roles:
-            print(f"{server_tag} ⏭️ {user.name} already has the '{role.name}' role - skipping role assignment")
+            logger.info("%s ⏭️ %s already has the '%s' role - skipping role assignment", server_tag, user.name, role.name,
+                        extra={"event": "shame_role_already_assigned", "guild_id": guild.id, "user_id": user.id})
             return False
         
-        # Check bot permissions before attempting to add role
-        bot_member = guild.get_member(bot.user.id)
-        if not bot_member.guild_permissions.manage_roles:
-            print(f"{server_tag} ❌ Bot missing 'Manage Roles' permission")
-            return False
-        
-        # Check role hierarchy - bot's top role must be higher than target role
-        bot_top_role = bot_member.top_role
-        if bot_top_role.position <= role.position:
-            print(f"{server_tag} ❌ Bot role '{bot_top_role.name}' (pos: {bot_top_role.position}) is not higher than target role '{role.name}' (pos: {role.position})")
-            print(f"{server_tag} 💡 Move bot role above '{role.name}' in Server Settings → Roles")
-            return False
-        
-        # Add the role to the user
-        await user.add_roles(role, reason="Failed to make a proper wish")
-        print(f"{server_tag} 🔴 Added '{role.name}' role to {user.name}")
-        return True
+        # Add the role to the user through the guild's role queue (cached first, so the member update that follows lands on it)
+        keep_member(guild, user)
+        return await get_role_queue(guild).submit(user, role, True, "Failed to make a proper wish")
     except Exception as e:
-        print(f"{server_tag} ❌ Error assigning role: {e}")
+        logger.error("%s ❌ Error assigning role: %s", server_tag, e, extra={"event": "shame_role_error", "guild_id": guild.id, "user_id": user.id})
         if "50013" in str(e):
-            print(f"{server_tag} 💡 Permission error - check bot role hierarchy and permissions")
+            logger.warning("%s 💡 Permission error - check bot role hierarchy and permissions", server_tag)
         return False
 
- 
\ No newline at end of file
+async def restore_shame_role_holders(guilds):
+    """Lean member cache: after a restart, cache the recently shamed members that still hold the shame role"""
+    if not LEAN_MEMBER_CACHE:
+        return
+    
+    today = datetime.strptime(get_today_date(), "%Y-%m-%d")
+    start_date = (today - timedelta(days=SHAME_HOLDER_LOOKBACK_DAYS)).strftime("%Y-%m-%d")
+    
+    async def restore_guild(guild):
+        server_tag = get_server_tag(guild)
+        role = guild.get_role(SHAME_ROLE_CONFIG.get(guild.id, 0))
+        if not role:
+            return
+        try:
+            days = await get_day_range(guild.id, start_date, today.strftime("%Y-%m-%d")) or {}
+            candidates = {user_id for log in days.values() for user_id in log.get("shamed", [])}
+            members = await query_members(guild, candidates)
+            holders = [member for member in members.values() if role in member.roles]
+            for member in holders:
+                keep_member(guild, member)
+            logger.info("%s 🪶 Cached %s '%s' holder(s) out of %s member(s) shamed since %s", server_tag, len(holders), role.name, len(candidates), start_date,
+                        extra={"event": "shame_holders_restored", "guild_id": guild.id, "count": len(holders)})
+        except Exception as e:
+            logger.error("%s ❌ Failed to restore shame role holders: %s", server_tag, e)
+    
+    await asyncio.gather(*(restore_guild(guild) for guild in guilds))
+
+def describe_role_problem(guild, bot):
+    """Why the bot cannot manage a guild's shame role, or None when it can"""
+    role_id = SHAME_ROLE_CONFIG.get(guild.id)
+    if role_id is None:
+        return "no shame role configured"
+    role = guild.get_role(role_id)
+    if not role:
+        return f"shame role {role_id} not found"
+    
+    bot_member = guild.get_member(bot.user.id)
+    if bot_member is None:
+        return "bot member not cached"
+    if not bot_member.guild_permissions.manage_roles:
+        return "bot missing 'Manage Roles' permission"
+    
+    # Bot's top role must be higher than the shame role to add or remove it
+    bot_top_role = bot_member.top_role
+    if bot_top_role.position <= role.position:
+        return f"bot role '{bot_top_role.name}' (pos: {bot_top_role.position}) is not higher than '{role.name}' (pos: {role.position}) - move it up in Server Settings → Roles"
+    return None
+
+def compute_guild_capabilities(guild, bot):
+    """Resolve a guild's shame role, whether the bot can manage it, and its summary and dev channels"""
+    summary_channel = discord.utils.get(guild.text_channels, name=get_shame_summary_channel_name(guild.id))
+    dev_channel = discord.utils.get(guild.text_channels, name=get_dev_channel_name(guild.id))
+    return GuildCapabilities(
+        role_id=SHAME_ROLE_CONFIG.get(guild.id),
+        role_problem=describe_role_problem(guild, bot),
+        summary_channel_id=summary_channel.id if summary_channel else None,
+        dev_channel_id=dev_channel.id if dev_channel else None,
+    )
+
+def get_setup_issues(guild_id, capabilities):
+    """What is wrong with a guild's setup, as short descriptions (empty when nothing is)"""
+    issues = [capabilities.role_problem] if capabilities.role_problem else []
+    if is_shame_summary_enabled(guild_id) and capabilities.summary_channel_id is None:
+        issues.append(f"summary channel '{get_shame_summary_channel_name(guild_id)}' not found")
+    return issues
+
+def refresh_guild_capabilities(guild, bot, reason="startup"):
+    """Recompute a guild's capabilities, warning once when its setup breaks and noting when it is fixed"""
+    server_tag = get_server_tag(guild)
+    previous = guild_capabilities.get(guild.id)
+    capabilities = guild_capabilities[guild.id] = compute_guild_capabilities(guild, bot)
+    
+    issues = get_setup_issues(guild.id, capabilities)
+    if issues != (get_setup_issues(guild.id, previous) if previous else []):
+        if issues:
+            skipping = ", shame role changes skipped until fixed" if capabilities.role_problem else ""
+            logger.warning("%s ⚠️ Guild setup problem (%s%s): %s", server_tag, reason, skipping, '; '.join(issues),
+                           extra={"event": "guild_setup_incomplete", "guild_id": guild.id, "issues": issues})
+        else:
+            logger.info("%s ✅ Guild setup fixed (%s)", server_tag, reason, extra={"event": "guild_setup_fixed", "guild_id": guild.id})
+    return capabilities
+
+def get_guild_capabilities(guild, bot):
+    """A guild's capabilities, computed on first use and kept until a role, channel or bot member change"""
+    capabilities = guild_capabilities.get(guild.id)
+    if capabilities is None:
+        capabilities = refresh_guild_capabilities(guild, bot, "first use")
+    return capabilities
+
+def on_guild_setup_changed(guild, bot, reason):
+    """Refresh after a role, channel or bot member event (guilds not looked at yet wait for first use)"""
+    if guild.id in guild_capabilities:
+        refresh_guild_capabilities(guild, bot, reason)
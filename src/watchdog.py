@@ -0,0 +1,172 @@
+import asyncio
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from .metrics import EVENT_LOOP_LAG, HANDLER_LATENCY, SLOW_CALLBACKS
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: WATCHDOG_ENABLED=1 turns on handler timing, the fine-grained lag probe and stack capture.
+# Off, the loop lag is still sampled once a second for /healthz and /metrics.
+WATCHDOG_ENABLED = os.getenv("WATCHDOG_ENABLED", "0").lower() in ("1", "true", "yes")
+# A handler running, or the loop being blocked, for longer than this gets its stack logged
+WATCHDOG_SLOW_THRESHOLD = float(os.getenv("WATCHDOG_SLOW_THRESHOLD", "0.5"))
+# Durations kept per handler for percentiles
+WATCHDOG_SAMPLES = int(os.getenv("WATCHDOG_SAMPLES", "512"))
+# How often the loop heartbeat runs
+LOOP_PROBE_INTERVAL = 0.1 if WATCHDOG_ENABLED else 1.0
+
+# Updated by the heartbeat task on the loop, read by /healthz and the stall detector thread
+loop_state = {"lag": 0.0, "max_lag": 0.0, "probe_at": None}
+
+handler_samples = {}  # handler name -> deque of recent durations in seconds
+handler_counts = {}  # handler name -> {"calls": n, "slow": n, "errors": n}
+active_handlers = {}  # asyncio.Task -> [handler name, started (perf_counter), reported]
+
+def timed(name):
+    """Decorator recording an async handler's duration; a no-op unless the watchdog is enabled"""
+    def decorator(func):
+        if not WATCHDOG_ENABLED:
+            return func
+        
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            task = asyncio.current_task()
+            started = time.perf_counter()
+            entry = [name, started, False]
+            # Nested timed calls run in the same task - only the outermost one is watched
+            outer = task not in active_handlers
+            if outer:
+                active_handlers[task] = entry
+            error = False
+            try:
+                return await func(*args, **kwargs)
+            except BaseException:
+                error = True
+                raise
+            finally:
+                if outer:
+                    active_handlers.pop(task, None)
+                record_duration(name, time.perf_counter() - started, error)
+        return wrapper
+    return decorator
+
+def record_duration(name, duration, error=False):
+    samples = handler_samples.get(name)
+    if samples is None:
+        samples = handler_samples[name] = deque(maxlen=WATCHDOG_SAMPLES)
+        handler_counts[name] = {"calls": 0, "slow": 0, "errors": 0}
+    samples.append(duration)
+    counts = handler_counts[name]
+    counts["calls"] += 1
+    if error:
+        counts["errors"] += 1
+    if duration > WATCHDOG_SLOW_THRESHOLD:
+        counts["slow"] += 1
+    HANDLER_LATENCY.observe(duration, handler=name)
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def get_handler_stats():
+    """p50/p95/p99/max (ms) over each handler's recent calls, plus lifetime counts"""
+    stats = {}
+    for name, samples in handler_samples.items():
+        ordered = sorted(samples)
+        if not ordered:
+            continue
+        stats[name] = {
+            **handler_counts[name],
+            "p50_ms": round(_percentile(ordered, 0.50) * 1000, 1),
+            "p95_ms": round(_percentile(ordered, 0.95) * 1000, 1),
+            "p99_ms": round(_percentile(ordered, 0.99) * 1000, 1),
+            "max_ms": round(ordered[-1] * 1000, 1),
+        }
+    return {
+        "enabled": WATCHDOG_ENABLED,
+        "slow_threshold_ms": WATCHDOG_SLOW_THRESHOLD * 1000,
+        "loop_lag_ms": round(loop_state["lag"] * 1000, 1),
+        "max_loop_lag_ms": round(loop_state["max_lag"] * 1000, 1),
+        "handlers": stats,
+    }
+
+def format_handler_stats():
+    """Handler timings as a short text table for Discord"""
+    stats = get_handler_stats()
+    if not stats["enabled"]:
+        return "⏱️ Watchdog is off - set `WATCHDOG_ENABLED=1` to record handler timings"
+    lines = [f"⏱️ Loop lag now {stats['loop_lag_ms']}ms, worst {stats['max_loop_lag_ms']}ms (slow threshold {stats['slow_threshold_ms']:.0f}ms)"]
+    for name, s in sorted(stats["handlers"].items()):
+        lines.append(f"• `{name}` - {s['calls']} calls, p50 {s['p50_ms']}ms, p95 {s['p95_ms']}ms, p99 {s['p99_ms']}ms, max {s['max_ms']}ms, {s['slow']} slow, {s['errors']} errors")
+    if not stats["handlers"]:
+        lines.append("No handler calls recorded yet")
+    return "\n".join(lines)
+
+def _report_slow_handlers(now):
+    """Log where each over-threshold handler is currently suspended (runs on the loop)"""
+    for task, entry in list(active_handlers.items()):
+        name, started, reported = entry
+        if reported or now - started <= WATCHDOG_SLOW_THRESHOLD:
+            continue
+        entry[2] = True
+        SLOW_CALLBACKS.inc(kind="handler", name=name)
+        stack = "".join(traceback.format_list([traceback.FrameSummary(f.f_code.co_filename, f.f_lineno, f.f_code.co_name) for f in task.get_stack()]))
+        logger.warning(f"🐌 {name} still running after {(now - started) * 1000:.0f}ms, waiting at:\n{stack}",
+                       extra={"event": "slow_handler", "handler": name, "latency_ms": round((now - started) * 1000, 1)})
+
+async def monitor_loop_lag():
+    """Measure how late the loop wakes up from a fixed sleep - a stuck loop shows up here first"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + LOOP_PROBE_INTERVAL
+        await asyncio.sleep(LOOP_PROBE_INTERVAL)
+        lag = max(0.0, loop.time() - expected)
+        loop_state["lag"] = lag
+        loop_state["max_lag"] = max(loop_state["max_lag"], lag)
+        loop_state["probe_at"] = time.monotonic()
+        EVENT_LOOP_LAG.observe(lag)
+        if active_handlers:
+            _report_slow_handlers(time.perf_counter())
+
+def _watch_for_stalls(loop_thread_id, stop):
+    """Background thread: if the heartbeat stops, dump what the loop thread is executing"""
+    reported_probe = None
+    while not stop.wait(WATCHDOG_SLOW_THRESHOLD / 2):
+        probe_at = loop_state["probe_at"]
+        if probe_at is None or probe_at == reported_probe:
+            continue
+        stalled = time.monotonic() - probe_at - LOOP_PROBE_INTERVAL
+        if stalled <= WATCHDOG_SLOW_THRESHOLD:
+            continue
+        frame = sys._current_frames().get(loop_thread_id)
+        if frame is None:
+            continue
+        # One report per stall; the next heartbeat re-arms it
+        reported_probe = probe_at
+        SLOW_CALLBACKS.inc(kind="loop_blocked", name="")
+        stack = "".join(traceback.format_stack(frame))
+        logger.warning(f"🧊 Event loop blocked for {stalled * 1000:.0f}ms, currently running:\n{stack}",
+                       extra={"event": "loop_blocked", "latency_ms": round(stalled * 1000, 1)})
+
+_stall_stop = None
+
+def start_watchdog():
+    """Start the loop heartbeat, plus the stall detector thread when the watchdog is enabled"""
+    global _stall_stop
+    task = asyncio.create_task(monitor_loop_lag())
+    if WATCHDOG_ENABLED and _stall_stop is None:
+        _stall_stop = threading.Event()
+        threading.Thread(target=_watch_for_stalls, args=(threading.get_ident(), _stall_stop), name="loop-watchdog", daemon=True).start()
+        logger.info(f"🐕 Watchdog enabled (slow threshold {WATCHDOG_SLOW_THRESHOLD * 1000:.0f}ms)", extra={"event": "watchdog_started"})
+    return task
+
+def stop_watchdog():
+    global _stall_stop
+    if _stall_stop is not None:
+        _stall_stop.set()
+        _stall_stop = None
@@ -0,0 +1,96 @@
+import logging
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+import pytz
+from .config import config, LONDON_TZ
+
+logger = logging.getLogger(__name__)
+
+# One London day's wish window and shame instant as UTC epoch seconds, so the handlers compare
+# numbers instead of formatting or re-parsing times per event. Computed once per day (and again
+# when set wishtime/shametime/buffer changes the config); the conversion goes through the tz
+# database, so the bounds stay right on the days the clocks change.
+#   wish_start..wish_end      the wish minute (a wish message must be posted in it)
+#   wish_start..reaction_end  the wish minute plus WISH_BUFFER_TIME (🌠 reactions count in it)
+DayClock = namedtuple("DayClock", ["date", "day_start", "day_end", "wish_start", "wish_end", "reaction_end", "shame_at"])
+
+# Where the current time comes from (the replay benchmark swaps in its virtual clock)
+wall_time = time.time
+
+_today = None
+
+def parse_clock_time(value):
+    """Parse HH:MM into (hour, minute), raising ValueError for anything else"""
+    hour, _, minute = value.partition(":")
+    if len(minute) != 2 or not hour.isdigit() or not minute.isdigit() or int(hour) > 23 or int(minute) > 59:
+        raise ValueError(f"'{value}' is not a HH:MM time")
+    return int(hour), int(minute)
+
+def london_epoch(day, hour, minute):
+    """UTC epoch seconds of a London wall-clock time on a given date"""
+    naive = datetime(day.year, day.month, day.day, hour, minute)
+    try:
+        local = LONDON_TZ.localize(naive, is_dst=None)
+    except pytz.AmbiguousTimeError:
+        # The hour repeated when the clocks go back - use its first (BST) occurrence
+        local = LONDON_TZ.localize(naive, is_dst=True)
+    except pytz.NonExistentTimeError:
+        # The hour skipped when the clocks go forward - same distance from midnight as on GMT
+        local = LONDON_TZ.localize(naive, is_dst=False)
+    return int(local.timestamp())
+
+def compute_day_clock(day):
+    """The wish window and shame instant for a London date"""
+    wish_start = london_epoch(day, *parse_clock_time(config.WISH_TIME))
+    return DayClock(
+        date=day.isoformat(),
+        day_start=london_epoch(day, 0, 0),
+        day_end=london_epoch(day + timedelta(days=1), 0, 0),
+        wish_start=wish_start,
+        wish_end=wish_start + 60,
+        reaction_end=wish_start + 60 + config.WISH_BUFFER_TIME,
+        shame_at=london_epoch(day, *parse_clock_time(config.SHAME_TIME)),
+    )
+
+def london_date(timestamp):
+    return datetime.fromtimestamp(timestamp, LONDON_TZ).date()
+
+def get_day_clock(timestamp=None):
+    """The clock of the London day containing `timestamp` (default now), cached for the current day"""
+    global _today
+    timestamp = wall_time() if timestamp is None else timestamp
+    clock = _today
+    if clock and clock.day_start <= timestamp < clock.day_end:
+        return clock
+
+    clock = compute_day_clock(london_date(timestamp))
+    if _today is None or timestamp >= _today.day_end:
+        # Day rollover (or first use) - older days, e.g. for an old message, are not kept
+        _today = clock
+        logger.debug("⏰ Wish clock for %s: wish %s (+%ss), shame %s", clock.date, config.WISH_TIME, config.WISH_BUFFER_TIME, config.SHAME_TIME)
+    return clock
+
+def reset_clock():
+    """Recompute on next use (after set wishtime/shametime/buffer)"""
+    global _today
+    _today = None
+
+def in_wish_minute(timestamp):
+    """Whether a timestamp (e.g. a message's creation) falls in its day's wish minute"""
+    clock = get_day_clock(timestamp)
+    return clock.wish_start <= timestamp < clock.wish_end
+
+def in_reaction_window(timestamp=None):
+    """Whether a timestamp (default now) falls in the wish minute plus the reaction buffer"""
+    timestamp = wall_time() if timestamp is None else timestamp
+    clock = get_day_clock(timestamp)
+    return clock.wish_start <= timestamp <= clock.reaction_end
+
+def next_shame_at(timestamp=None):
+    """Epoch seconds of the first shame time after `timestamp` (default now)"""
+    timestamp = wall_time() if timestamp is None else timestamp
+    clock = get_day_clock(timestamp)
+    if timestamp < clock.shame_at:
+        return clock.shame_at
+    return compute_day_clock(date.fromisoformat(clock.date) + timedelta(days=1)).shame_at
@@ -1,14 +1,25 @@
 import random
 import discord
 import asyncio
-from .config import config
+import logging
+import time
+from datetime import datetime
+from .config import config, LONDON_TZ
+from .metrics import BACKGROUND_TASKS_STARTED
+from .sharding import register_guild_state
+from . import journal
+
+logger = logging.getLogger(__name__)
 
 def get_server_tag(guild):
     """Get server name tag for logging"""
     return f"[{guild.name}]" if guild else "[Unknown]"
 
 # Track successful wishers per guild
-successful_wishers = {}  # guild_id -> {'users': set(), 'summary_scheduled': bool, 'channel': channel}
+successful_wishers = register_guild_state("wish_windows", {})  # guild_id -> {'users': set(), 'summary_scheduled': bool, 'channel': channel}
+
+# A wish window recovered from the journal after a restart still gets its summary, unless it is this late
+RECOVERED_SUMMARY_MAX_LATE = 600
 
 # Wish reactions with corresponding GIFs and messages
 WISH_REACTIONS = [
@@ -47,12 +58,12 @@ async def send_wish_reaction(channel, users):
     # Get random reaction
     reaction = get_random_wish_reaction()
     
-    # Format user mentions
+    # Format user mentions (by ID, so users recovered from the journal as bare IDs work too)
     if len(users) == 1:
-        user_list = f"{list(users)[0].mention}"
+        user_list = f"<@{list(users)[0].id}>"
         summary_text = f"🎉 **Congratulations, {user_list} wished in time and their wish is granted!**"
     else:
-        user_mentions = [user.mention for user in users]
+        user_mentions = [f"<@{user.id}>" for user in users]
         user_list = ", ".join(user_mentions)
         summary_text = f"🎉 **Congratulations, {user_list} wished in time and their wish is granted!**"
     
@@ -68,25 +79,34 @@ async def send_wish_reaction(channel, users):
     
     await channel.send(embed=embed)
 
-async def send_wish_summary(guild_id, channel):
+async def send_wish_summary(guild_id, channel, delay=None):
     """Send a summary of successful wishers after a delay"""
     # Wait for the summary delay (configurable)
-    await asyncio.sleep(config.WISH_SUMMARY_DELAY)
+    await asyncio.sleep(config.WISH_SUMMARY_DELAY if delay is None else delay)
     
     if guild_id not in successful_wishers or not successful_wishers[guild_id]['users']:
+        journal.append("window_closed", guild_id=guild_id, outcome="empty")
         return
     
-    users = successful_wishers[guild_id]['users']
+    # A window resumed from the journal may hold a bare discord.Object for a user who then wished
+    # again as a Member - the two are not equal, so dedupe by ID (keeping the Member)
+    by_id = {}
+    for user in successful_wishers[guild_id]['users']:
+        if user.id not in by_id or isinstance(by_id[user.id], discord.Object):
+            by_id[user.id] = user
+    users = list(by_id.values())
     server_tag = get_server_tag(channel.guild)
     
     # Only send summary if there are users who wished in time
     if len(users) > 0:
         try:
             await send_wish_reaction(channel, users)
-            print(f"{server_tag} 📋 Sent wish summary for {len(users)} users")
+            logger.info("%s 📋 Sent wish summary for %s users", server_tag, len(users))
+            journal.append("window_closed", guild_id=guild_id, outcome="sent")
             
         except Exception as e:
-            print(f"{server_tag} ❌ Failed to send wish summary: {e}")
+            logger.error("%s ❌ Failed to send wish summary: %s", server_tag, e)
+            journal.append("window_closed", guild_id=guild_id, outcome="failed")
     
     # Clean up the tracking data
     successful_wishers[guild_id] = {'users': set(), 'summary_scheduled': False, 'channel': None}
@@ -103,11 +123,36 @@ def track_successful_wish(guild, user, channel):
     if not successful_wishers[guild_id]['summary_scheduled']:
         successful_wishers[guild_id] = {'users': set(), 'summary_scheduled': True, 'channel': channel}
         server_tag = get_server_tag(guild)
-        print(f"{server_tag} ⏰ Scheduled wish summary to run in {config.WISH_SUMMARY_DELAY} seconds")
+        logger.info("%s ⏰ Scheduled wish summary to run in %s seconds", server_tag, config.WISH_SUMMARY_DELAY)
         asyncio.create_task(send_wish_summary(guild_id, channel))
+        BACKGROUND_TASKS_STARTED.inc(kind="wish_summary")
     
     # Add user to successful wishers
     successful_wishers[guild_id]['users'].add(user)
     successful_wishers[guild_id]['channel'] = channel
+    journal.append("wish", guild_id=guild_id, channel_id=channel.id, user_id=user.id, date=datetime.now(LONDON_TZ).strftime("%Y-%m-%d"))
+
+def resume_wish_windows(bot, windows):
+    """Re-open wish windows recovered from the journal and send their summaries when they were due"""
+    for guild_id, window in windows.items():
+        guild = bot.get_guild(guild_id)
+        channel = guild.get_channel(window["channel_id"]) if guild else None
+        if guild_id in successful_wishers and successful_wishers[guild_id]['summary_scheduled']:
+            continue  # A new window already opened after the restart
+        
+        # Summary due at the original time - or right away if that passed during the restart
+        delay = window["opened_at"] + config.WISH_SUMMARY_DELAY - time.time()
+        if not channel or delay < -RECOVERED_SUMMARY_MAX_LATE:
+            logger.info("%s ⏭️ Dropping wish window recovered from the journal (%s)", get_server_tag(guild), 'channel gone' if guild and not channel else 'guild gone' if not guild else f'{-delay:.0f}s overdue',
+                        extra={"event": "wish_window_expired", "guild_id": guild_id})
+            journal.append("window_closed", guild_id=guild_id, outcome="expired")
+            continue
+        
+        users = {guild.get_member(user_id) or discord.Object(id=user_id) for user_id in window["users"]}
+        successful_wishers[guild_id] = {'users': users, 'summary_scheduled': True, 'channel': channel}
+        logger.info("%s 📼 Resumed wish window with %s users from the journal, summary in %.0fs", get_server_tag(guild), len(users), max(delay, 0),
+                    extra={"event": "wish_window_resumed", "guild_id": guild_id, "count": len(users)})
+        asyncio.create_task(send_wish_summary(guild_id, channel, delay=max(delay, 0)))
+        BACKGROUND_TASKS_STARTED.inc(kind="wish_summary")
 
  
\ No newline at end of file
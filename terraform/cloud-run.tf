@@ -1,7 +1,13 @@
-# Cloud Run service for Discord bot (only deploy if token is provided)
+locals {
+  # Each service runs a contiguous range of shards (shard_count is a multiple of shard_processes,
+  # see variables.tf); with the defaults there is one unsharded service
+  shards_per_process = var.shard_count / var.shard_processes
+}
+
+# Cloud Run service(s) for Discord bot (only deploy if token is provided)
 resource "google_cloud_run_service" "discord_bot" {
-  count    = var.discord_bot_token != "" ? 1 : 0
-  name     = "discord-dr-shamer"
+  count    = var.discord_bot_token != "" ? var.shard_processes : 0
+  name     = count.index == 0 ? "discord-dr-shamer" : "discord-dr-shamer-${count.index}"
   location = var.region
   
   template {
@@ -21,6 +27,33 @@ resource "google_cloud_run_service" "discord_bot" {
           name  = "DISCORD_BOT_TOKEN"
           value = var.discord_bot_token
         }
+        
+        env {
+          name  = "LEAN_MEMBER_CACHE"
+          value = var.lean_member_cache ? "1" : "0"
+        }
+        
+        dynamic "env" {
+          for_each = var.shard_count > 1 ? {
+            SHARD_COUNT = tostring(var.shard_count)
+            SHARD_IDS   = "${count.index * local.shards_per_process}-${(count.index + 1) * local.shards_per_process - 1}"
+          } : {}
+          content {
+            name  = env.key
+            value = env.value
+          }
+        }
+        
+        # /healthz fails when the gateway is down or the event loop is stalled - restart the container
+        liveness_probe {
+          initial_delay_seconds = 60
+          period_seconds        = 30
+          timeout_seconds       = 5
+          failure_threshold     = 4
+          http_get {
+            path = "/healthz"
+          }
+        }
       }
       
       # Ensure the service stays running
@@ -29,6 +62,7 @@ resource "google_cloud_run_service" "discord_bot" {
     }
     
     metadata {
+      # Exactly one instance per service: a second one would open the same shards twice
       annotations = {
         "autoscaling.knative.dev/minScale" = "1"
         "autoscaling.knative.dev/maxScale" = "1"
@@ -50,10 +84,10 @@ resource "google_cloud_run_service" "discord_bot" {
 
 # IAM policy to allow the service to run
 resource "google_cloud_run_service_iam_policy" "discord_bot" {
-  count    = var.discord_bot_token != "" ? 1 : 0
-  location = google_cloud_run_service.discord_bot[0].location
-  project  = google_cloud_run_service.discord_bot[0].project
-  service  = google_cloud_run_service.discord_bot[0].name
+  count    = var.discord_bot_token != "" ? var.shard_processes : 0
+  location = google_cloud_run_service.discord_bot[count.index].location
+  project  = google_cloud_run_service.discord_bot[count.index].project
+  service  = google_cloud_run_service.discord_bot[count.index].name
 
   policy_data = data.google_iam_policy.noauth[0].policy_data
 }
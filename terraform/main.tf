@@ -1,4 +1,7 @@
 terraform {
+  # 1.9+ for variable validations that refer to other variables (shard_processes)
+  required_version = ">= 1.9"
+  
   backend "gcs" {
     bucket = "ldn-discord-dr-shamer-terraform-state"
     prefix = "terraform/state"
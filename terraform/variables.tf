@@ -21,4 +21,43 @@ variable "discord_bot_token" {
   type        = string
   sensitive   = true
   default     = ""
-} 
\ No newline at end of file
+} 
+variable "shard_count" {
+  description = "Total Discord gateway shards (1 = unsharded)"
+  type        = number
+  default     = 1
+
+  validation {
+    condition     = var.shard_count >= 1
+    error_message = "shard_count must be at least 1."
+  }
+}
+
+variable "shard_processes" {
+  description = "Cloud Run services to split the shards across - each runs a contiguous range of shards"
+  type        = number
+  default     = 1
+
+  validation {
+    condition     = var.shard_processes >= 1
+    error_message = "shard_processes must be at least 1."
+  }
+
+  # Otherwise a service gets an empty shard range (SHARD_IDS "4-3" fails to start), or with
+  # shard_count = 1 several unsharded services all connect to every guild
+  validation {
+    condition     = var.shard_processes <= var.shard_count
+    error_message = "shard_processes must not be more than shard_count."
+  }
+
+  validation {
+    condition     = var.shard_count % var.shard_processes == 0
+    error_message = "shard_count must be a multiple of shard_processes, so every service runs the same number of shards."
+  }
+}
+
+variable "lean_member_cache" {
+  description = "Cache only shame role holders instead of every member (opt in for large guilds that would not fit in 256Mi)"
+  type        = bool
+  default     = false
+}
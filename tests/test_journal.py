@@ -0,0 +1,58 @@
+"""Journal recovery: state rebuilt from the snapshot plus the events written after it"""
+import asyncio
+
+import pytest
+
+from src import journal, utils
+
+@pytest.fixture(autouse=True)
+def closed_journal():
+    yield
+    journal.close_journal()
+
+def restart(directory):
+    journal.close_journal()
+    return journal.recover_journal(str(directory))
+
+def test_unacked_records_and_open_windows(tmp_path):
+    journal.recover_journal(str(tmp_path))
+    journal.append("record", guild_id=1, date="2026-10-18", field="wished", user_id="10")
+    through = journal.journal_seq()
+    journal.append("record", guild_id=1, date="2026-10-18", field="shamed", user_id="11")
+    journal.ack(through)
+    journal.append("wish", guild_id=1, channel_id=5, user_id=10, date="2026-10-18")
+    journal.append("wish", guild_id=2, channel_id=6, user_id=12, date="2026-10-18")
+    journal.append("window_closed", guild_id=2, outcome="sent")
+
+    restart(tmp_path)
+    assert journal.get_unacked_records() == [(1, "2026-10-18", "shamed", "11")]
+    assert {guild_id: window["users"] for guild_id, window in journal.get_open_windows().items()} == {1: [10]}
+
+def test_roles_cleared_survive_restart(tmp_path, monkeypatch):
+    journal.recover_journal(str(tmp_path))
+    monkeypatch.setattr(utils, "roles_cleared_at", {})
+    utils.mark_roles_cleared(1, "remove", 3)
+    cleared_at = utils.roles_cleared_at[1]
+
+    restart(tmp_path)
+    monkeypatch.setattr(utils, "roles_cleared_at", {})
+    utils.restore_roles_cleared(journal.get_roles_cleared())
+    assert utils.roles_cleared_at[1] == pytest.approx(cleared_at, abs=1)
+
+    # A wish after the restart in the same window does not clear the roles again
+    clock = utils.get_day_clock()._replace(wish_start=int(cleared_at) - 30)
+    monkeypatch.setattr(utils, "get_day_clock", lambda: clock)
+    cleared = []
+
+    async def clear_shame_roles(guild, bot):
+        cleared.append(guild.id)
+
+    monkeypatch.setattr(utils, "clear_shame_roles", clear_shame_roles)
+    guild = type("Guild", (), {"id": 1})()
+    asyncio.run(utils.remove_shame_roles(guild, None))
+    assert cleared == []
+
+    # The next day's window clears them again
+    monkeypatch.setattr(utils, "get_day_clock", lambda: clock._replace(wish_start=clock.wish_start + 86400))
+    asyncio.run(utils.remove_shame_roles(guild, None))
+    assert cleared == [1]
@@ -0,0 +1,37 @@
+"""Records go through the queue handler to the JSON formatter the way they do in production"""
+import json
+import logging
+import queue
+
+from src.logging_config import JsonFormatter, _QueueHandler, parse_log_levels
+
+def emit(log_call):
+    """Log through a _QueueHandler and format what comes out of its queue -> JSON entry"""
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger("tests.logging_config")
+    logger.handlers[:] = [_QueueHandler(log_queue)]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    log_call(logger)
+    return json.loads(JsonFormatter().format(log_queue.get_nowait()))
+
+def test_exception_field():
+    def log_call(logger):
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            logger.exception("❌ Failed for guild %s", 1, extra={"event": "failed", "guild_id": 1})
+
+    entry = emit(log_call)
+    assert entry["message"] == "❌ Failed for guild 1"
+    assert entry["severity"] == "ERROR"
+    assert entry["event"] == "failed" and entry["guild_id"] == 1
+    assert entry["exception"].startswith("Traceback") and "ValueError: bad" in entry["exception"]
+
+def test_lazy_arguments_merged_before_queueing():
+    entry = emit(lambda logger: logger.info("%s 🎯 Wish at %02d:%02d (100%%)", "[Guild]", 11, 1))
+    assert entry["message"] == "[Guild] 🎯 Wish at 11:01 (100%)"
+    assert "exception" not in entry
+
+def test_parse_log_levels():
+    assert parse_log_levels("src.utils=warning, src.role_queue.members=ERROR,bogus") == {"src.utils": "WARNING", "src.role_queue.members": "ERROR"}
@@ -0,0 +1,74 @@
+"""Known cases for classify_wish_message (from notebooks/test_is_wish_message.ipynb), with WISH_TIME = 11:11"""
+import pytest
+
+from src.config import config
+from src.utils import classify_wish_message, classify_message, get_cached_classification
+
+WISHES = [
+    "make a wish",
+    "make a wish 🌠",
+    "wish 🌠",
+    "11:11 make a wish",
+    "11:11 Make a wish! 🌠",
+    "11:11 make a wish🌠 !",
+    "11:11 make a wish!!!",
+    "Make a wish everyone! 🌠",
+    "Quick! Make a wish 🌠",
+    "🌠 wish! 🌠",
+    "MAKE A WISH 🌠!!!",
+    "make a wish... 🌠",
+    "Hey everyone! 11:11 make a wish! 🌠",
+    "Hurry up and make a wish 🌠",
+    "Time to make a wish! 🌠✨",
+    "11:11 everyone make a wish NOW! 🌠",
+]
+
+NOT_WISHES = [
+    "I wish I could",
+    "wish you well",
+    "hello world",
+    "wishing you luck",
+    # Narrating a wish still contains "make a wish", and telling that apart from a call to wish
+    # would also reject real wishes like "Time to make a wish"
+    pytest.param("I tried to make a wish", marks=pytest.mark.xfail(strict=True, reason="any 'make a wish' counts as a wish")),
+]
+
+WRONG_TIMES = [
+    ("12:34 make a wish", "12:34"),
+    ("9:30 wish 🌠", "9:30"),
+    ("12:34 Make a wish! 🌠", "12:34"),
+    ("15:45 make a wish🌠 !", "15:45"),
+]
+
+@pytest.fixture(autouse=True)
+def wish_time(monkeypatch):
+    monkeypatch.setattr(config, "WISH_TIME", "11:11")
+
+@pytest.mark.parametrize("message", WISHES)
+def test_wish(message):
+    result = classify_wish_message(message)
+    assert result.is_wish
+    assert not result.wrong_time
+
+@pytest.mark.parametrize("message", NOT_WISHES)
+def test_not_a_wish(message):
+    assert not classify_wish_message(message).is_wish
+
+@pytest.mark.parametrize("message,used_time", WRONG_TIMES)
+def test_wrong_time(message, used_time):
+    assert classify_wish_message(message) == (True, used_time, True)
+
+def test_wish_time_changed_at_runtime(monkeypatch):
+    monkeypatch.setattr(config, "WISH_TIME", "12:34")
+    assert not classify_wish_message("12:34 make a wish").wrong_time
+    assert classify_wish_message("11:11 make a wish").wrong_time
+
+def test_stored_classification_follows_wish_time(monkeypatch):
+    classify_message(1, "11:11 make a wish")
+    classify_message(2, "12:34 make a wish")
+    classify_message(3, "make a wish 🌠")
+    monkeypatch.setattr(config, "WISH_TIME", "12:34")
+    assert get_cached_classification(1).wrong_time
+    assert not get_cached_classification(2).wrong_time
+    assert get_cached_classification(3) == (True, None, False)
+    assert get_cached_classification(4) is None
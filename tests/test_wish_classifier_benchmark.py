@@ -0,0 +1,126 @@
+"""Throughput of the wish checks on the hot paths, against what the handlers did before
+
+    python -m pytest tests/test_wish_classifier_benchmark.py --benchmark-group-by=group
+"""
+import random
+import re
+import time
+from datetime import datetime
+
+import pytest
+
+from src.config import config, LONDON_TZ
+from src.utils import classify_wish_message, classify_message, get_cached_classification
+from src.wish_clock import in_wish_minute, in_reaction_window
+
+pytest.importorskip("pytest_benchmark")
+
+CHAT_MESSAGES = [
+    "morning all",
+    "anyone up for lunch at 12:30?",
+    "lol that's hilarious 😂",
+    "I wish I could come tonight, stuck at work",
+    "see you at the pub",
+    "Did anyone watch the match last night? The keeper was unreal, three saves in the last ten minutes",
+    "ok",
+    "https://www.bbc.co.uk/news/uk-england-london",
+    "brb",
+    "Central line is down again 🙃",
+    "happy birthday!! 🎉🎉",
+    "can someone send me the notes from Tuesday",
+    "🌠",
+    "that's a wishful take tbh",
+]
+
+class WrongTimeException(Exception):
+    def __init__(self, used_time):
+        self.used_time = used_time
+        super().__init__(f"Wrong time used: {used_time}")
+
+def legacy_is_wish_message(message_content):
+    text = message_content.lower().strip()
+    has_make_wish = "make a wish" in text
+    has_wish_with_star = "wish" in text and "🌠" in message_content
+    if not (has_make_wish or has_wish_with_star):
+        return False
+    time_match = re.search(r'\b(\d{1,2}:\d{2})\b', text)
+    if time_match:
+        used_time = time_match.group(1)
+        if used_time != config.WISH_TIME:
+            raise WrongTimeException(used_time)
+    return True
+
+def legacy_handler_check(content):
+    """What on_message did per message: pre-check, then classify with exceptions"""
+    if "wish" not in content.lower():
+        return False
+    try:
+        return legacy_is_wish_message(content)
+    except WrongTimeException:
+        return True
+
+def legacy_message_on_time(created_at):
+    """What on_message did per wish: format the creation time in London and compare strings"""
+    return created_at.astimezone(LONDON_TZ).strftime('%H:%M') == config.WISH_TIME
+
+def legacy_reaction_on_time():
+    """What the reaction handler did per 🌠: parse WISH_TIME and build today's wish time"""
+    london_time = datetime.now(LONDON_TZ)
+    wish_hour, wish_minute = map(int, config.WISH_TIME.split(':'))
+    wish_time_today = london_time.replace(hour=wish_hour, minute=wish_minute, second=0, microsecond=0)
+    time_diff = (london_time - wish_time_today).total_seconds()
+    return 0 <= time_diff <= (60 + config.WISH_BUFFER_TIME)
+
+@pytest.fixture(autouse=True)
+def wish_time(monkeypatch):
+    monkeypatch.setattr(config, "WISH_TIME", "11:11")
+
+@pytest.fixture(scope="module")
+def chat_corpus():
+    rng = random.Random(1111)
+    return [rng.choice(CHAT_MESSAGES) for _ in range(10000)]
+
+@pytest.fixture(scope="module")
+def reactions():
+    """200 🌠 on each of 50 wish messages -> (wish contents by message ID, reacted-to message IDs)"""
+    rng = random.Random(1111)
+    wishes = {message_id: f"Hey everyone! 11:11 make a wish! 🌠 ({message_id})" for message_id in range(1000, 1050)}
+    return wishes, [rng.choice(list(wishes)) for _ in range(10000)]
+
+@pytest.mark.benchmark(group="chat messages")
+def test_legacy_handler_check(benchmark, chat_corpus):
+    assert not any(benchmark(lambda: [legacy_handler_check(message) for message in chat_corpus]))
+
+@pytest.mark.benchmark(group="chat messages")
+def test_classify_wish_message(benchmark, chat_corpus):
+    assert not any(wish.is_wish for wish in benchmark(lambda: [classify_wish_message(message) for message in chat_corpus]))
+
+@pytest.mark.benchmark(group="reactions")
+def test_reaction_classified_per_reaction(benchmark, reactions):
+    wishes, reacted = reactions
+    assert all(wish.is_wish for wish in benchmark(lambda: [classify_wish_message(wishes[message_id]) for message_id in reacted]))
+
+@pytest.mark.benchmark(group="reactions")
+def test_reaction_stored_per_message(benchmark, reactions):
+    wishes, reacted = reactions
+    for message_id, content in wishes.items():
+        classify_message(message_id, content)
+    assert all(wish.is_wish for wish in benchmark(lambda: [get_cached_classification(message_id) for message_id in reacted]))
+
+@pytest.mark.benchmark(group="wish time per message")
+def test_message_on_time_strftime(benchmark):
+    created = [datetime.now(LONDON_TZ)] * 10000
+    benchmark(lambda: [legacy_message_on_time(created_at) for created_at in created])
+
+@pytest.mark.benchmark(group="wish time per message")
+def test_message_on_time_wish_clock(benchmark):
+    created = [datetime.now(LONDON_TZ)] * 10000
+    benchmark(lambda: [in_wish_minute(created_at.timestamp()) for created_at in created])
+
+@pytest.mark.benchmark(group="wish time per reaction")
+def test_reaction_on_time_reparsed(benchmark):
+    benchmark(lambda: [legacy_reaction_on_time() for _ in range(10000)])
+
+@pytest.mark.benchmark(group="wish time per reaction")
+def test_reaction_on_time_wish_clock(benchmark):
+    benchmark(lambda: [in_reaction_window(time.time()) for _ in range(10000)])
@@ -0,0 +1,96 @@
+"""Wish clock bounds in UTC, including both days the clocks change in London (2026-03-29 and 2026-10-25)"""
+from datetime import date, datetime, timezone
+
+import pytest
+
+from src.config import config
+from src import wish_clock
+from src.wish_clock import (compute_day_clock, get_day_clock, in_wish_minute, in_reaction_window, next_shame_at,
+                            parse_clock_time, reset_clock)
+
+SPRING_FORWARD = date(2026, 3, 29)  # 01:00 GMT -> 02:00 BST, a 23-hour day
+AUTUMN_BACK = date(2026, 10, 25)  # 02:00 BST -> 01:00 GMT, a 25-hour day
+
+def utc(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+@pytest.fixture(autouse=True)
+def clock_config(monkeypatch):
+    monkeypatch.setattr(config, "WISH_TIME", "11:11")
+    monkeypatch.setattr(config, "SHAME_TIME", "22:22")
+    monkeypatch.setattr(config, "WISH_BUFFER_TIME", 15)
+    reset_clock()
+    yield
+    reset_clock()
+
+@pytest.mark.parametrize("day,wish_utc,shame_utc,hours", [
+    (date(2026, 1, 15), "2026-01-15 11:11:00", "2026-01-15 22:22:00", 24),
+    (SPRING_FORWARD, "2026-03-29 10:11:00", "2026-03-29 21:22:00", 23),
+    (date(2026, 7, 1), "2026-07-01 10:11:00", "2026-07-01 21:22:00", 24),
+    (AUTUMN_BACK, "2026-10-25 11:11:00", "2026-10-25 22:22:00", 25),
+])
+def test_day_bounds(day, wish_utc, shame_utc, hours):
+    clock = compute_day_clock(day)
+    assert utc(clock.wish_start) == wish_utc
+    assert utc(clock.shame_at) == shame_utc
+    assert clock.day_end - clock.day_start == hours * 3600
+    assert clock.wish_end - clock.wish_start == 60
+    assert clock.reaction_end - clock.wish_start == 75
+
+@pytest.mark.parametrize("day", [SPRING_FORWARD, AUTUMN_BACK])
+def test_window_edges(day):
+    start = compute_day_clock(day).wish_start
+    assert not in_wish_minute(start - 1)
+    assert in_wish_minute(start)
+    assert in_wish_minute(start + 59.999)
+    assert not in_wish_minute(start + 60)
+    assert in_reaction_window(start + 75)
+    assert not in_reaction_window(start + 76)
+    # The same wall-clock time on the other side of the change is not the wish minute
+    assert not in_wish_minute(start + 3600)
+    assert not in_wish_minute(start - 3600)
+
+def test_skipped_hour_on_spring_day(monkeypatch):
+    monkeypatch.setattr(config, "WISH_TIME", "01:30")
+    clock = compute_day_clock(SPRING_FORWARD)
+    # 01:30 does not exist that day - it is taken as the same distance from midnight as on GMT
+    assert utc(clock.wish_start) == "2026-03-29 01:30:00"
+    assert clock.wish_end - clock.wish_start == 60
+
+def test_repeated_hour_on_autumn_day(monkeypatch):
+    monkeypatch.setattr(config, "WISH_TIME", "01:30")
+    clock = compute_day_clock(AUTUMN_BACK)
+    # 01:30 happens twice that day - only the first (BST) one is the wish minute
+    assert utc(clock.wish_start) == "2026-10-25 00:30:00"
+    assert not in_wish_minute(clock.wish_start + 3600)
+
+@pytest.mark.parametrize("eve,hours", [(date(2026, 3, 28), 23), (date(2026, 10, 24), 25)])
+def test_next_shame_across_change(eve, hours):
+    shame_at = compute_day_clock(eve).shame_at
+    assert next_shame_at(shame_at - 1) == shame_at
+    assert next_shame_at(shame_at) - shame_at == hours * 3600
+
+def test_cached_per_day():
+    day = compute_day_clock(date(2026, 10, 24))
+    clock = get_day_clock(day.wish_start)
+    assert get_day_clock(day.day_end - 1) is clock
+    assert get_day_clock(day.day_end).date == "2026-10-25"
+    # An older timestamp (e.g. an old message) gets its own day without replacing today's
+    assert get_day_clock(day.wish_start).date == "2026-10-24"
+    assert wish_clock._today.date == "2026-10-25"
+
+def test_config_change_applies_after_reset(monkeypatch):
+    start = compute_day_clock(AUTUMN_BACK).wish_start
+    assert not in_reaction_window(start + 80)
+    monkeypatch.setattr(config, "WISH_BUFFER_TIME", 30)
+    reset_clock()
+    assert in_reaction_window(start + 80)
+
+@pytest.mark.parametrize("value,expected", [("11:11", (11, 11)), ("0:00", (0, 0)), ("09:05", (9, 5)), ("23:59", (23, 59))])
+def test_parse_clock_time(value, expected):
+    assert parse_clock_time(value) == expected
+
+@pytest.mark.parametrize("value", ["24:00", "11:60", "11:1", "1111", "ab:cd", ""])
+def test_parse_clock_time_rejects(value):
+    with pytest.raises(ValueError):
+        parse_clock_time(value)